@@ -5,8 +5,14 @@ Backfill DuckDB from D1 Database
 Exports auction data from Cloudflare D1 and imports it into the DuckDB database.
 This is used to recover historical data after the DuckDB database was corrupted/reset.
 
+The export streams: every day of the range is read in pages by keyset on
+(seen, id), several days at a time, and each page is staged in the database
+as soon as it arrives, together with a checkpoint of the day's last key. An
+interrupted backfill picks up from its checkpoints when run again; the staged
+rows are merged into the server tables once every day is complete.
+
 Usage:
-    python backfill_from_d1.py <database_path> [--days N]
+    python backfill_from_d1.py <database_path> [--days N] [--workers N] [--sqlite PATH]
 
 Example:
     python backfill_from_d1.py ../static/sb.duckdb.wasm --days 90
@@ -15,63 +21,255 @@ Example:
 import sys
 import os
 import json
+import time
+import queue
+import sqlite3
+import threading
 import subprocess
 import duckdb
 import multiprocessing
-from datetime import datetime, timedelta
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from update_incremental import (
+    OBSERVATION_ORDER,
+    ensure_schema,
+    insert_new_configs_query,
+    create_touched_days_query,
+    rollup_stats_query,
+    refresh_stats,
+    compact_database,
+    ensure_price_events,
+    create_lifecycle_table_query,
+    build_lifecycle,
+)
+
+# D1 has no CPU scores; enrichment on the next update fills them in
+BACKFILL_SOURCE = "(SELECT *, NULL::INTEGER AS cpu_score, NULL::INTEGER AS cpu_multicore_score FROM backfill_staging)"
+
+# Rows per D1 query
+PAGE_SIZE = 10000
+
+# Days fetched concurrently
+DEFAULT_WORKERS = 4
+
+# Pages fetched but not yet staged; bounds memory to this many pages
+QUEUE_PAGES = 8
+
+# One day's rows after the key (last_seen, last_id). seen is compared as text,
+# as D1 stores it.
+page_query = """
+SELECT * FROM auctions
+WHERE seen >= '{start}' AND seen < '{end}'
+    AND (seen > '{last_seen}' OR (seen = '{last_seen}' AND id > {last_id}))
+ORDER BY seen, id
+LIMIT {limit}
+"""
 
-# Schema must match update_incremental.py
-CREATE_TABLE_QUERY = """
-CREATE TABLE IF NOT EXISTS server (
+# Pages land here until every day is complete. A regular table, not a temp
+# one, so an interrupted backfill keeps what it fetched.
+create_staging_query = """
+CREATE TABLE IF NOT EXISTS backfill_staging (
     id UBIGINT,
     information VARCHAR[],
-
     datacenter VARCHAR,
     location VARCHAR,
-
     cpu_vendor VARCHAR,
     cpu VARCHAR,
     cpu_count INTEGER,
     is_highio BOOLEAN,
-
     ram VARCHAR,
     ram_size INTEGER,
     is_ecc BOOLEAN,
-
     hdd_arr VARCHAR[],
-
     nvme_count INTEGER,
     nvme_drives INTEGER[],
     nvme_size INTEGER,
-
     sata_count INTEGER,
     sata_drives INTEGER[],
     sata_size INTEGER,
-
     hdd_count INTEGER,
     hdd_drives INTEGER[],
     hdd_size INTEGER,
-
     with_inic BOOLEAN,
     with_hwr BOOLEAN,
     with_gpu BOOLEAN,
     with_rps BOOLEAN,
-
     traffic VARCHAR,
     bandwidth INTEGER,
-
     price INTEGER,
     fixed_price BOOLEAN,
-
     seen TIMESTAMP,
-
     server_type VARCHAR,
-
-    setup_price INTEGER DEFAULT 0,
+    setup_price INTEGER,
     cpu_cores INTEGER,
     cpu_threads INTEGER,
     cpu_generation VARCHAR
-);
+)
+"""
+
+# The D1 columns a page is staged from. The list columns arrive as JSON text
+# and the flags as 0/1; stage_page_query decodes them.
+D1_COLUMNS = (
+    'id', 'information', 'datacenter', 'location', 'cpu_vendor', 'cpu', 'cpu_count', 'is_highio',
+    'ram', 'ram_size', 'is_ecc', 'hdd_arr', 'nvme_count', 'nvme_drives', 'nvme_size',
+    'sata_count', 'sata_drives', 'sata_size', 'hdd_count', 'hdd_drives', 'hdd_size',
+    'with_inic', 'with_hwr', 'with_gpu', 'with_rps', 'traffic', 'bandwidth', 'price', 'fixed_price', 'seen',
+)
+
+
+def json_list(column: str, element: str) -> str:
+    """SQL decoding a JSON array column; text that is not valid JSON becomes NULL."""
+    return f"CASE WHEN json_valid({column}) THEN from_json({column}, '[\"{element}\"]') END"
+
+
+def flag(column: str) -> str:
+    """SQL reading a 0/1 column as a boolean, missing meaning false."""
+    return f"COALESCE({column}::BOOLEAN, false)"
+
+
+# Maps a registered page of raw D1 rows (backfill_page) to staging rows in one
+# pass. The CPU details D1 lacks are left NULL for enrichment.
+stage_page_query = f"""
+INSERT INTO backfill_staging
+SELECT
+    id::UBIGINT,
+    {json_list('information', 'VARCHAR')},
+    datacenter::VARCHAR,
+    location::VARCHAR,
+    cpu_vendor::VARCHAR,
+    cpu::VARCHAR,
+    cpu_count::INTEGER,
+    {flag('is_highio')},
+    ram::VARCHAR,
+    ram_size::INTEGER,
+    {flag('is_ecc')},
+    {json_list('hdd_arr', 'VARCHAR')},
+    nvme_count::INTEGER,
+    {json_list('nvme_drives', 'INTEGER')},
+    nvme_size::INTEGER,
+    sata_count::INTEGER,
+    {json_list('sata_drives', 'INTEGER')},
+    sata_size::INTEGER,
+    hdd_count::INTEGER,
+    {json_list('hdd_drives', 'INTEGER')},
+    hdd_size::INTEGER,
+    {flag('with_inic')},
+    {flag('with_hwr')},
+    {flag('with_gpu')},
+    {flag('with_rps')},
+    traffic::VARCHAR,
+    bandwidth::INTEGER,
+    price::INTEGER,
+    {flag('fixed_price')},
+    seen::TIMESTAMP,
+    'auction',
+    0,
+    NULL,
+    NULL,
+    NULL
+FROM backfill_page
+"""
+
+# The last key staged per day, written in the same transaction as its page
+create_checkpoint_query = """
+CREATE TABLE IF NOT EXISTS backfill_checkpoint (
+    day VARCHAR PRIMARY KEY,
+    last_seen VARCHAR,
+    last_id BIGINT,
+    done BOOLEAN,
+    rows BIGINT
+)
+"""
+
+# The staged rows to add: the latest per auction and day, for the (id, day)
+# partitions the history doesn't hold yet (stored rows are kept, the live feeds
+# recorded them first-hand). A hash anti-join on (id, day); the seen lower bound
+# is the first staged day and limits the history side to the staged range.
+# Both sides are unique per (id, day), so the result needs no deduplication.
+create_backfill_merge_query = """
+CREATE TEMP TABLE backfill_merge AS
+SELECT b.id, b.seen, b.price, b.fixed_price
+FROM (
+    SELECT id, seen, price, fixed_price, date_trunc('d', seen) AS seen_day
+    FROM backfill_staging
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id, date_trunc('d', seen) ORDER BY seen DESC) = 1
+) b
+ANTI JOIN (
+    SELECT id, date_trunc('d', seen) AS seen_day
+    FROM server_observation
+    WHERE seen >= ?
+) s ON s.id = b.id AND s.seen_day = b.seen_day
+"""
+
+backfill_insert_query = f"""
+INSERT INTO server_observation
+SELECT id, seen, price, fixed_price FROM backfill_merge
+ORDER BY {OBSERVATION_ORDER}
+"""
+
+# Rollup days the merge makes stale: the days it added rows to, and the 90
+# days after each, whose price index baseline looks back over them
+touch_backfilled_days_query = """
+INSERT INTO touched_days
+SELECT DISTINCT m.day + t.days_after::INTEGER
+FROM (SELECT DISTINCT seen::DATE AS day FROM backfill_merge) m, range(91) t(days_after)
+"""
+
+# The price changes the merged rows bring, at the history's one-row-per-day
+# resolution like the first run's seed: each merged row against the row before
+# it, and the first stored row after merged ones against the merged price. The
+# events the live runs logged up to that stored row start from the price they
+# knew (the old_price of the first, else the row's own), so that is what the
+# merged price changes into; the day's first run isn't stored, so the change
+# is dated at the start of the day.
+backfill_price_events_query = """
+INSERT INTO price_event
+WITH history AS (
+    SELECT
+        o.id,
+        o.seen,
+        o.price,
+        m.id IS NOT NULL AS merged,
+        LAG(o.seen) OVER w AS before_seen,
+        LAG(o.price) OVER w AS before_price,
+        LAG(m.id IS NOT NULL) OVER w AS after_merged
+    FROM server_observation o
+    LEFT JOIN backfill_merge m ON m.id = o.id AND m.seen = o.seen
+    WHERE o.id IN (SELECT id FROM backfill_merge)
+    WINDOW w AS (PARTITION BY o.id ORDER BY o.seen)
+),
+changes AS (
+    SELECT id, seen AS ts, before_price AS old_price, price AS new_price
+    FROM history
+    WHERE merged
+    UNION ALL
+    SELECT
+        h.id,
+        date_trunc('d', h.seen) AS ts,
+        h.before_price AS old_price,
+        COALESCE((
+            SELECT arg_min(e.old_price, e.ts) FROM price_event e
+            WHERE e.id = h.id AND e.ts > h.before_seen AND e.ts <= h.seen
+        ), h.price) AS new_price
+    FROM history h
+    WHERE NOT h.merged AND h.after_merged
+)
+SELECT * FROM changes
+WHERE old_price <> new_price
+ORDER BY ts, id
+"""
+
+# Merged rows newer than an auction's last known price (an id the live runs
+# never saw) become its last price
+backfill_last_price_query = """
+INSERT INTO server_last_price
+SELECT id, seen, price FROM backfill_merge
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY seen DESC) = 1
+ON CONFLICT (id) DO UPDATE
+SET seen = EXCLUDED.seen, price = EXCLUDED.price
+WHERE EXCLUDED.seen > server_last_price.seen
 """
 
 
@@ -111,258 +309,214 @@ def run_wrangler_query(query: str, cwd: str) -> list:
         raise e
 
 
-def parse_json_array(value):
-    """Parse a JSON array string into a Python list."""
-    if value is None:
-        return None
-    if isinstance(value, list):
-        return value
-    if isinstance(value, str):
-        try:
-            return json.loads(value)
-        except json.JSONDecodeError:
-            return None
-    return None
-
-
-def transform_row(row: dict) -> dict:
-    """Transform a D1 row to DuckDB format."""
-    return {
-        'id': row['id'],
-        'information': parse_json_array(row.get('information')),
-        'datacenter': row.get('datacenter'),
-        'location': row.get('location'),
-        'cpu_vendor': row.get('cpu_vendor'),
-        'cpu': row.get('cpu'),
-        'cpu_count': row.get('cpu_count'),
-        'is_highio': bool(row.get('is_highio')),
-        'ram': row.get('ram'),
-        'ram_size': row.get('ram_size'),
-        'is_ecc': bool(row.get('is_ecc')),
-        'hdd_arr': parse_json_array(row.get('hdd_arr')),
-        'nvme_count': row.get('nvme_count'),
-        'nvme_drives': parse_json_array(row.get('nvme_drives')),
-        'nvme_size': row.get('nvme_size'),
-        'sata_count': row.get('sata_count'),
-        'sata_drives': parse_json_array(row.get('sata_drives')),
-        'sata_size': row.get('sata_size'),
-        'hdd_count': row.get('hdd_count'),
-        'hdd_drives': parse_json_array(row.get('hdd_drives')),
-        'hdd_size': row.get('hdd_size'),
-        'with_inic': bool(row.get('with_inic')),
-        'with_hwr': bool(row.get('with_hwr')),
-        'with_gpu': bool(row.get('with_gpu')),
-        'with_rps': bool(row.get('with_rps')),
-        'traffic': row.get('traffic'),
-        'bandwidth': row.get('bandwidth'),
-        'price': row.get('price'),
-        'fixed_price': bool(row.get('fixed_price')),
-        'seen': row.get('seen'),
-        'server_type': 'auction',
-        'setup_price': 0,
-        'cpu_cores': None,
-        'cpu_threads': None,
-        'cpu_generation': None,
-    }
-
-
-def export_d1_data(worker_dir: str, days: int = 90) -> list:
-    """Export auction data from D1 in batches."""
-    cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-
-    # First, get total count
-    count_query = f"SELECT COUNT(*) as cnt FROM auctions WHERE seen >= '{cutoff_date}'"
-    count_result = run_wrangler_query(count_query, worker_dir)
-    total_count = count_result[0]['cnt'] if count_result else 0
-    print(f"Total records to export: {total_count}")
+def d1_source(worker_dir: str):
+    """Query function reading the remote D1 database through wrangler."""
+    return lambda query: run_wrangler_query(query, worker_dir)
 
-    if total_count == 0:
-        return []
-
-    # Export in batches
-    batch_size = 10000
-    all_rows = []
-    offset = 0
-
-    while offset < total_count:
-        print(f"Exporting batch {offset // batch_size + 1} ({offset}/{total_count})...")
-        query = f"""
-            SELECT * FROM auctions
-            WHERE seen >= '{cutoff_date}'
-            ORDER BY seen ASC
-            LIMIT {batch_size} OFFSET {offset}
-        """
-
-        rows = run_wrangler_query(query, worker_dir)
-        if not rows:
-            break
-
-        all_rows.extend(rows)
-        offset += batch_size
-        print(f"  Fetched {len(rows)} rows")
-
-    print(f"Total rows exported: {len(all_rows)}")
-    return all_rows
 
+def sqlite_source(path: str):
+    """Query function reading a local SQLite copy of D1 (same schema, same SQL)."""
+    def run_query(query: str) -> list:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(query)]
+        finally:
+            conn.close()
+    return run_query
+
+
+def backfill_days(days: int) -> list:
+    """The days to export, oldest first, as D1's text dates."""
+    today = date.today()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(days, -1, -1)]
+
+
+def fetch_day(run_query, day: str, last_seen: str, last_id: int, pages: queue.Queue, stop: threading.Event):
+    """Read one day page by page from the key (last_seen, last_id) on, queueing each page."""
+    end = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    while not stop.is_set():
+        rows = run_query(page_query.format(
+            start=day, end=end, last_seen=last_seen.replace("'", "''"), last_id=last_id, limit=PAGE_SIZE,
+        ))
+        if rows:
+            last_seen, last_id = rows[-1]['seen'], rows[-1]['id']
+        page = (day, rows, last_seen, last_id, len(rows) < PAGE_SIZE)
+        # A full queue blocks the fetch until the writer catches up
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=1)
+                break
+            except queue.Full:
+                continue
+        if page[-1]:
+            return
+
+
+def stage_page(conn, day: str, rows: list, last_seen: str, last_id: int, done: bool):
+    """Stage a page as one columnar insert and advance its day's checkpoint.
+
+    The rows go to DuckDB as they came from D1, one DataFrame column per D1
+    column, and stage_page_query does the JSON decoding and type casts.
+    """
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        if rows:
+            page = pd.DataFrame({column: [row.get(column) for row in rows] for column in D1_COLUMNS})
+            conn.register('backfill_page', page)
+            conn.execute(stage_page_query)
+            conn.unregister('backfill_page')
+        conn.execute(
+            "INSERT OR REPLACE INTO backfill_checkpoint VALUES (?, ?, ?, ?, "
+            "COALESCE((SELECT rows FROM backfill_checkpoint WHERE day = ?), 0) + ?)",
+            [day, last_seen, last_id, done, day, len(rows)],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
-def import_to_duckdb(db_path: str, rows: list):
-    """Import rows into DuckDB database."""
-    print(f"Opening database: {db_path}")
 
-    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
-    conn.execute("PRAGMA force_compression='dictionary'")
+def export_d1_data(conn, run_query, days: int = 90, workers: int = DEFAULT_WORKERS) -> int:
+    """Stage `days` of auctions from D1, resuming from the checkpoints; return the rows staged now."""
+    conn.execute(create_staging_query)
+    conn.execute(create_checkpoint_query)
+    checkpoints = {
+        day: (last_seen, last_id, done)
+        for day, last_seen, last_id, done in conn.execute(
+            "SELECT day, last_seen, last_id, done FROM backfill_checkpoint").fetchall()
+    }
 
+    pending = [day for day in backfill_days(days) if not checkpoints.get(day, (None, None, False))[2]]
+    resumed = sum(1 for day in pending if day in checkpoints)
+    print(f"Days to export: {len(pending)} ({resumed} resumed, "
+          f"{len(backfill_days(days)) - len(pending)} already staged)")
+    if not pending:
+        return 0
+
+    pages = queue.Queue(maxsize=QUEUE_PAGES)
+    stop = threading.Event()
+    staged = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetches = [
+            pool.submit(fetch_day, run_query, day, *checkpoints.get(day, (day, -1, False))[:2], pages, stop)
+            for day in pending
+        ]
+        try:
+            remaining = len(pending)
+            while remaining:
+                # A failed fetch never sends its last page
+                for fetch in fetches:
+                    if fetch.done() and fetch.exception():
+                        raise fetch.exception()
+                try:
+                    day, rows, last_seen, last_id, done = pages.get(timeout=1)
+                except queue.Empty:
+                    continue
+                stage_page(conn, day, rows, last_seen, last_id, done)
+                staged += len(rows)
+                if done:
+                    remaining -= 1
+                print(f"  {day}: +{len(rows)} rows{' (done)' if done else ''} - {staged} staged, "
+                      f"{staged / (time.perf_counter() - started):.0f} rows/s")
+        finally:
+            stop.set()
+
+    print(f"Total rows exported: {staged} in {time.perf_counter() - started:.1f}s")
+    return staged
+
+
+def import_to_duckdb(conn):
+    """Merge the staged rows into the server tables and drop the staging state.
+
+    Only the staged date range of the history is read, and only the rollup
+    days the new rows affect are recomputed. The state derived from the
+    history follows: the price events and last prices of the merged auctions,
+    and the lifecycles, rebuilt as --rebuild-lifecycle does.
+    """
     try:
         conn.execute("BEGIN TRANSACTION")
 
-        # Create table if not exists
-        conn.execute(CREATE_TABLE_QUERY)
-
-        # Add server_type column if missing (migration)
-        existing_columns = [row[0] for row in conn.execute(
-            "SELECT column_name FROM duckdb_columns() WHERE table_name = 'server'"
-        ).fetchall()]
-
-        if 'server_type' not in existing_columns:
-            print("Migrating: Adding server_type column...")
-            conn.execute("ALTER TABLE server ADD COLUMN server_type VARCHAR DEFAULT 'auction'")
-
-        # Get existing record count
-        before_count = conn.execute("SELECT COUNT(*) FROM server WHERE server_type = 'auction'").fetchone()[0]
-        print(f"Existing auction records: {before_count}")
-
-        # Transform and insert rows
-        print("Transforming and inserting rows...")
-        transformed = [transform_row(row) for row in rows]
-
-        # Create temp table and insert
-        conn.execute("""
-            CREATE TEMP TABLE backfill_incoming (
-                id UBIGINT,
-                information VARCHAR[],
-                datacenter VARCHAR,
-                location VARCHAR,
-                cpu_vendor VARCHAR,
-                cpu VARCHAR,
-                cpu_count INTEGER,
-                is_highio BOOLEAN,
-                ram VARCHAR,
-                ram_size INTEGER,
-                is_ecc BOOLEAN,
-                hdd_arr VARCHAR[],
-                nvme_count INTEGER,
-                nvme_drives INTEGER[],
-                nvme_size INTEGER,
-                sata_count INTEGER,
-                sata_drives INTEGER[],
-                sata_size INTEGER,
-                hdd_count INTEGER,
-                hdd_drives INTEGER[],
-                hdd_size INTEGER,
-                with_inic BOOLEAN,
-                with_hwr BOOLEAN,
-                with_gpu BOOLEAN,
-                with_rps BOOLEAN,
-                traffic VARCHAR,
-                bandwidth INTEGER,
-                price INTEGER,
-                fixed_price BOOLEAN,
-                seen TIMESTAMP,
-                server_type VARCHAR,
-                setup_price INTEGER,
-                cpu_cores INTEGER,
-                cpu_threads INTEGER,
-                cpu_generation VARCHAR
-            )
-        """)
-
-        # Insert in batches
-        batch_size = 5000
-        for i in range(0, len(transformed), batch_size):
-            batch = transformed[i:i+batch_size]
-            conn.executemany("""
-                INSERT INTO backfill_incoming VALUES (
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-                )
-            """, [
-                (
-                    r['id'], r['information'], r['datacenter'], r['location'],
-                    r['cpu_vendor'], r['cpu'], r['cpu_count'], r['is_highio'],
-                    r['ram'], r['ram_size'], r['is_ecc'], r['hdd_arr'],
-                    r['nvme_count'], r['nvme_drives'], r['nvme_size'],
-                    r['sata_count'], r['sata_drives'], r['sata_size'],
-                    r['hdd_count'], r['hdd_drives'], r['hdd_size'],
-                    r['with_inic'], r['with_hwr'], r['with_gpu'], r['with_rps'],
-                    r['traffic'], r['bandwidth'], r['price'], r['fixed_price'],
-                    r['seen'], r['server_type'], r['setup_price'],
-                    r['cpu_cores'], r['cpu_threads'], r['cpu_generation']
-                )
-                for r in batch
-            ])
-            print(f"  Inserted batch {i // batch_size + 1}")
-
-        # Merge: insert only new records (not already in server table)
-        print("Merging new data...")
-        conn.execute("""
-            INSERT INTO server
-            SELECT b.* FROM backfill_incoming b
-            WHERE NOT EXISTS (
-                SELECT 1 FROM server s
-                WHERE s.id = b.id
-                AND date_trunc('d', s.seen) = date_trunc('d', b.seen)
-            )
-        """)
-
-        # Deduplicate
-        print("Deduplicating...")
-        conn.execute("""
-            CREATE OR REPLACE TABLE server AS
-            WITH CTE AS (
-                SELECT
-                    *,
-                    ROW_NUMBER() OVER (PARTITION BY id, date_trunc('d', seen) ORDER BY seen DESC) as row_num
-                FROM server
-            )
-            SELECT * EXCLUDE row_num
-            FROM CTE
-            WHERE row_num = 1
-        """)
+        # A database without price events is seeded from the merged history below
+        events_seeded = conn.execute("""
+            SELECT COUNT(*) > 0 FROM duckdb_tables()
+            WHERE database_name = current_database() AND table_name = 'server_last_price'
+        """).fetchone()[0]
+
+        # Create the server tables (or migrate a legacy flat table)
+        ensure_schema(conn)
 
+        # Merge: insert only new (id, day) partitions. Configs are only added
+        # for unknown ids - the live feeds hold newer attributes than the
+        # history - and those ids have all their staged rows inserted, so no
+        # config is left orphaned.
+        print("Merging new data...")
+        conn.execute(insert_new_configs_query.format(source=BACKFILL_SOURCE))
+        first_day = conn.execute("SELECT MIN(seen)::DATE FROM backfill_staging").fetchone()[0]
+        conn.execute(create_backfill_merge_query, [first_day])
+        new_records = conn.execute(backfill_insert_query).fetchone()[0]
+
+        conn.execute(create_touched_days_query)
+        conn.execute(touch_backfilled_days_query)
+        refresh_stats(conn)
+
+        ensure_price_events(conn)
+        if events_seeded:
+            events = conn.execute(backfill_price_events_query).fetchone()[0]
+            conn.execute(backfill_last_price_query)
+            print(f"Price changes: {events}")
+        conn.execute(create_lifecycle_table_query)
+        build_lifecycle(conn)
+
+        conn.execute("DROP TABLE backfill_merge")
+        conn.execute("DROP TABLE backfill_staging")
+        conn.execute("DROP TABLE backfill_checkpoint")
         conn.execute("COMMIT")
 
-        # Final stats
-        final_count = conn.execute("SELECT COUNT(*) FROM server WHERE server_type = 'auction'").fetchone()[0]
-        new_records = final_count - before_count
+        # Final stats, from the rollups the merge just refreshed
+        stats = conn.execute(rollup_stats_query).fetchone()
         print(f"\nBackfill complete!")
         print(f"New records added: {new_records}")
-        print(f"Total auction records: {final_count}")
-
-        date_range = conn.execute("""
-            SELECT
-                MIN(seen)::DATE as earliest,
-                MAX(seen)::DATE as latest,
-                COUNT(DISTINCT date_trunc('d', seen)) as days
-            FROM server
-            WHERE server_type = 'auction'
-        """).fetchone()
-
-        if date_range[0]:
-            print(f"Date range: {date_range[0]} to {date_range[1]} ({date_range[2]} days)")
+        print(f"Total auction records: {stats[1]}")
+        if stats[3]:
+            print(f"Date range: {stats[3]} to {stats[4]} ({stats[5]} days)")
 
     except Exception as e:
         conn.execute("ROLLBACK")
         raise e
+
+
+def backfill(db_path: str, run_query, days: int = 90, workers: int = DEFAULT_WORKERS):
+    """Stage the export in the database, then merge it."""
+    print(f"Opening database: {db_path}")
+    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
+    try:
+        export_d1_data(conn, run_query, days, workers)
+        if conn.execute("SELECT COUNT(*) FROM backfill_staging").fetchone()[0] == 0:
+            print("No data to import")
+            conn.execute("DROP TABLE backfill_staging")
+            conn.execute("DROP TABLE backfill_checkpoint")
+            return
+        import_to_duckdb(conn)
     finally:
         conn.close()
 
+    # The staging table's blocks are free now
+    compact_database(db_path)
+
 
 def print_usage():
-    print("Usage: python backfill_from_d1.py <database_path> [--days N]")
+    print("Usage: python backfill_from_d1.py <database_path> [--days N] [--workers N] [--sqlite PATH]")
     print("")
     print("Arguments:")
     print("  database_path   Path to the DuckDB database file")
     print("  --days N        Number of days of history to import (default: 90)")
+    print(f"  --workers N     Days fetched concurrently (default: {DEFAULT_WORKERS})")
+    print("  --sqlite PATH   Read a local SQLite copy of the D1 database instead of D1")
+    print("")
+    print("An interrupted backfill resumes from its checkpoints when run again")
+    print("with the same database.")
     print("")
     print("Example:")
     print("  python backfill_from_d1.py ../static/sb.duckdb.wasm --days 90")
@@ -373,36 +527,36 @@ def main():
         print_usage()
         sys.exit(1)
 
-    db_path = sys.argv[1]
-    days = 90
-
-    # Parse --days argument
-    if '--days' in sys.argv:
-        idx = sys.argv.index('--days')
-        if idx + 1 < len(sys.argv):
-            days = int(sys.argv[idx + 1])
-
-    # Find worker directory (for wrangler)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    worker_dir = os.path.join(script_dir, '..', 'worker')
-
-    if not os.path.exists(os.path.join(worker_dir, 'wrangler.jsonc')):
-        print(f"Error: Could not find wrangler.jsonc in {worker_dir}")
-        sys.exit(1)
+    def option(flag):
+        if flag in sys.argv:
+            idx = sys.argv.index(flag)
+            if idx + 1 < len(sys.argv):
+                return sys.argv[idx + 1]
+        return None
 
-    print(f"Backfilling {days} days of data from D1 to {db_path}")
-    print(f"Using wrangler from: {worker_dir}")
+    db_path = sys.argv[1]
+    days = int(option('--days') or 90)
+    workers = int(option('--workers') or DEFAULT_WORKERS)
+    sqlite_path = option('--sqlite')
+
+    if sqlite_path:
+        run_query = sqlite_source(sqlite_path)
+        print(f"Backfilling {days} days of data from {sqlite_path} to {db_path}")
+    else:
+        # Find worker directory (for wrangler)
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        worker_dir = os.path.join(script_dir, '..', 'worker')
+
+        if not os.path.exists(os.path.join(worker_dir, 'wrangler.jsonc')):
+            print(f"Error: Could not find wrangler.jsonc in {worker_dir}")
+            sys.exit(1)
+
+        run_query = d1_source(worker_dir)
+        print(f"Backfilling {days} days of data from D1 to {db_path}")
+        print(f"Using wrangler from: {worker_dir}")
     print("")
 
-    # Export from D1
-    rows = export_d1_data(worker_dir, days)
-
-    if not rows:
-        print("No data to import")
-        sys.exit(0)
-
-    # Import to DuckDB
-    import_to_duckdb(db_path, rows)
+    backfill(db_path, run_query, days, workers)
 
 
 if __name__ == "__main__":
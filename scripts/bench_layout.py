@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark the physical layout of the published database
+
+Copies a database twice - once as-is and once flattened into a single server
+table in CLUSTER_ORDER - and times the frontend's canonical queries against
+both files, so a layout change can be judged by the queries the browser
+actually runs.
+
+Queries run single-threaded by default, like DuckDB-WASM in the browser;
+with more threads the comparison mostly measures row-group parallelism.
+
+Usage:
+    python bench_layout.py <database_path> [--repeat N] [--threads N]
+
+Example:
+    python bench_layout.py ../static/sb.duckdb.wasm --repeat 20
+"""
+
+import os
+import sys
+import shutil
+import statistics
+import tempfile
+import time
+import duckdb
+
+from update_incremental import CLUSTER_ORDER
+
+# Shapes of the queries filter.ts, stats.ts and console.ts send, with the
+# parameters the pages use most. $cpu is filled with the most listed CPU.
+CANONICAL_QUERIES = {
+    'recent listings': """
+        SELECT * FROM server
+        WHERE seen > (SELECT max(seen) FROM server) - INTERVAL '70 minutes'
+    """,
+    'recent configurations': """
+        SELECT
+            cpu, ram_size, is_ecc, hdd_arr::JSON AS hdd_arr,
+            nvme_drives::JSON AS nvme_drives, sata_drives::JSON AS sata_drives,
+            hdd_drives::JSON AS hdd_drives,
+            MAX(seen) AS last_seen, MIN(price) AS min_price, MAX_BY(price, seen) AS price
+        FROM server
+        WHERE server_type = 'auction' AND price BETWEEN 30 AND 150
+        GROUP BY cpu, ram_size, is_ecc, hdd_arr::JSON, nvme_drives::JSON,
+            sata_drives::JSON, hdd_drives::JSON
+        HAVING last_seen > (SELECT max(seen) FROM server) - INTERVAL '70 minutes'
+    """,
+    'cpu price history': """
+        SELECT date_trunc('d', seen) AS day, MIN(price), MEDIAN(price)
+        FROM server
+        WHERE cpu = $cpu AND server_type = 'auction'
+        GROUP BY day ORDER BY day
+    """,
+    'volume by datacenter': """
+        SELECT datacenter, date_trunc('d', seen) AS day, COUNT(DISTINCT id)
+        FROM server
+        WHERE server_type = 'auction' AND seen > (SELECT max(seen) FROM server) - INTERVAL '30 days'
+        GROUP BY ALL
+    """,
+    'observed days': """
+        SELECT DISTINCT date_trunc('d', seen) AS day FROM server ORDER BY day
+    """,
+    'last updated': """
+        SELECT extract('epoch' FROM seen)::int AS last_updated
+        FROM server ORDER BY last_updated DESC LIMIT 1
+    """,
+}
+
+
+def row_group_count(conn) -> int:
+    """Row groups over the tables backing `server` (a table, or the normalized pair)."""
+    tables = [row[0] for row in conn.execute("""
+        SELECT table_name FROM duckdb_tables()
+        WHERE table_name IN ('server', 'server_config', 'server_observation')
+    """).fetchall()]
+    return sum(
+        conn.execute(f"SELECT COUNT(DISTINCT row_group_id) FROM pragma_storage_info('{table}')").fetchone()[0]
+        for table in tables
+    )
+
+
+def time_queries(db_path: str, repeat: int, threads: int, cpu: str) -> dict:
+    """Median wall time per canonical query, in milliseconds."""
+    conn = duckdb.connect(db_path, read_only=True, config={'threads': threads})
+    try:
+        results = {}
+        for name, query in CANONICAL_QUERIES.items():
+            params = {'cpu': cpu} if '$cpu' in query else None
+            conn.execute(query, params).fetchall()  # warm-up
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(query, params).fetchall()
+                samples.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(samples)
+        results['row groups'] = row_group_count(conn)
+        return results
+    finally:
+        conn.close()
+
+
+def benchmark(db_path: str, repeat: int = 10, threads: int = 1):
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, 'before.duckdb')
+        after_path = os.path.join(tmp, 'after.duckdb')
+        shutil.copyfile(db_path, before_path)
+
+        # A fresh file (not a copy + rewrite) so free blocks don't skew the size
+        conn = duckdb.connect(after_path)
+        conn.execute(f"ATTACH '{before_path}' AS src (READ_ONLY)")
+        conn.execute(f"CREATE TABLE server AS SELECT * FROM src.server ORDER BY {CLUSTER_ORDER}")
+        cpu = conn.execute("""
+            SELECT cpu FROM server WHERE server_type = 'auction'
+            GROUP BY cpu ORDER BY COUNT(*) DESC LIMIT 1
+        """).fetchone()[0]
+        conn.close()
+
+        before = time_queries(before_path, repeat, threads, cpu)
+        after = time_queries(after_path, repeat, threads, cpu)
+        before['file size (MiB)'] = os.path.getsize(before_path) / (1024 * 1024)
+        after['file size (MiB)'] = os.path.getsize(after_path) / (1024 * 1024)
+
+    print(f"Layout benchmark for {db_path} (median of {repeat} runs, {threads} thread(s), ms)")
+    print(f"Flat copy clustered by: {CLUSTER_ORDER}")
+    print("")
+    print(f"{'':<24}{'as-is':>12}{'flat':>12}{'change':>10}")
+    for name in before:
+        change = (after[name] - before[name]) / before[name] * 100 if before[name] else 0
+        print(f"{name:<24}{before[name]:>12.2f}{after[name]:>12.2f}{change:>9.0f}%")
+
+
+def print_usage():
+    print("Usage: python bench_layout.py <database_path> [--repeat N] [--threads N]")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print_usage()
+        sys.exit(1)
+
+    repeat = 10
+    if '--repeat' in sys.argv:
+        idx = sys.argv.index('--repeat')
+        if idx + 1 < len(sys.argv):
+            repeat = int(sys.argv[idx + 1])
+
+    threads = 1
+    if '--threads' in sys.argv:
+        idx = sys.argv.index('--threads')
+        if idx + 1 < len(sys.argv):
+            threads = int(sys.argv[idx + 1])
+
+    benchmark(sys.argv[1], repeat, threads)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Check and benchmark the feed transforms
+
+The update flattens the auction and standard-server feeds in SQL: the body is
+spooled to disk as downloaded, cut down to its array of records, and
+auction_feed_query / standard_feed_query parse and map the whole array in one
+pass. The per-record transforms in update_incremental.py
+(transform_auction_server, transform_standard_server) are the reference that
+mapping has to match. This loads recorded feeds both ways, runs the import
+queries on each and fails unless server_incoming comes out identical.
+
+It then times both paths, from the raw feed body to server_incoming, on the
+recorded feeds and on copies replicated N times with fresh ids.
+
+tests/test_transform.py runs the same comparison on the sample feeds in
+tests/fixtures.
+
+Usage:
+    python bench_transform.py <auction_feed.json> <standard_feed.json> [--scale N,M] [--repeat N] [--check]
+
+Options:
+    --scale N,M   Feed size multiples to benchmark (default: 1,10,100)
+    --repeat N    Timing runs per path and size (default: 3)
+    --check       Only check the two mappings agree, exit 1 if they don't
+
+Examples:
+    python bench_transform.py tests/fixtures/live_data_sb.json tests/fixtures/live_data_en_EUR.json --check
+    curl -so /tmp/sb.json https://www.hetzner.com/_resources/app/data/app/live_data_sb.json
+    curl -so /tmp/std.json https://www.hetzner.com/_resources/app/data/app/live_data_en_EUR.json
+    python bench_transform.py /tmp/sb.json /tmp/std.json
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+import tempfile
+import duckdb
+import pandas as pd
+
+from update_incremental import (
+    FEED_CHUNK_SIZE,
+    AUCTION_FEED_REQUIRED,
+    STANDARD_FEED_REQUIRED,
+    auction_feed_query,
+    standard_feed_query,
+    create_temp_table_query,
+    import_auction_query,
+    import_standard_query,
+    spool_feed,
+    load_feed,
+    transform_auction_server,
+    transform_standard_server,
+)
+
+# Feed -> (temp table / DataFrame name, reference transform, SQL mapping,
+# required columns, import query)
+FEEDS = {
+    'auction': ('auction_feed', transform_auction_server, auction_feed_query,
+                AUCTION_FEED_REQUIRED, import_auction_query),
+    'standard': ('standard_feed', transform_standard_server, standard_feed_query,
+                 STANDARD_FEED_REQUIRED, import_standard_query),
+}
+
+# Rows of each side shown when the check fails
+MISMATCH_SAMPLE = 3
+
+
+def read_chunks(path: str):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(FEED_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def read_records(path: str) -> list:
+    """The records of a feed document, decoded in Python."""
+    with open(path) as f:
+        document = json.load(f)
+    return document['server'] if isinstance(document, dict) else document
+
+
+def import_reference(conn, feed: str, path: str) -> int:
+    """Load a feed into server_incoming the per-record way; return the record count."""
+    table, transform, _, _, import_query = FEEDS[feed]
+    columns = {}
+    count = 0
+    for record in read_records(path):
+        for name, value in transform(record).items():
+            columns.setdefault(name, []).append(value)
+        count += 1
+    conn.execute(create_temp_table_query)
+    conn.register(table, pd.DataFrame(columns))
+    conn.execute(import_query)
+    conn.unregister(table)
+    return count
+
+
+def import_batch(conn, feed: str, path: str, spool_path: str) -> int:
+    """Load a feed into server_incoming the way the update does; return the record count."""
+    table, _, query, required, import_query = FEEDS[feed]
+    spool_feed(read_chunks(path), spool_path)
+    conn.execute(create_temp_table_query)
+    count = load_feed(conn, table, query, spool_path, required)
+    conn.execute(import_query)
+    conn.execute(f"DROP TABLE {table}")
+    return count
+
+
+def check(feed_paths: dict, tmp: str) -> bool:
+    """Import each recorded feed both ways and compare the resulting rows."""
+    conn = duckdb.connect()
+    ok = True
+    try:
+        # One transaction, so NOW() (the standard servers' seen) is the same
+        conn.execute("BEGIN TRANSACTION")
+        for feed, path in feed_paths.items():
+            records = import_reference(conn, feed, path)
+            conn.execute("CREATE OR REPLACE TEMP TABLE reference_incoming AS SELECT * FROM server_incoming")
+            import_batch(conn, feed, path, os.path.join(tmp, f"{feed}-spool.json"))
+
+            rows = conn.execute("SELECT COUNT(*) FROM server_incoming").fetchone()[0]
+            only_reference = conn.execute(
+                "SELECT * FROM reference_incoming EXCEPT ALL SELECT * FROM server_incoming"
+            ).fetchall()
+            only_batch = conn.execute(
+                "SELECT * FROM server_incoming EXCEPT ALL SELECT * FROM reference_incoming"
+            ).fetchall()
+
+            if only_reference or only_batch:
+                ok = False
+                print(f"{feed}: MISMATCH - {len(only_reference)} rows only from the reference transform, "
+                      f"{len(only_batch)} only from the SQL mapping ({records} records)")
+                for row in only_reference[:MISMATCH_SAMPLE]:
+                    print(f"  reference: {row}")
+                for row in only_batch[:MISMATCH_SAMPLE]:
+                    print(f"  sql:       {row}")
+            else:
+                print(f"{feed}: {records} records, {rows} rows identical")
+        conn.execute("ROLLBACK")
+    finally:
+        conn.close()
+    return ok
+
+
+def scale_feed(feed: str, path: str, factor: int, out_path: str):
+    """Write the feed replicated `factor` times, each copy under fresh ids."""
+    scaled = []
+    for copy in range(factor):
+        for record in read_records(path):
+            record = dict(record)
+            if feed == 'auction':
+                record['Id'] = record['Id'] + copy * 10**9
+            elif copy:
+                record['product'] = dict(record['product'], id=f"{record['product']['id']}-{copy}")
+            scaled.append(record)
+
+    with open(out_path, 'w') as f:
+        json.dump({'server': scaled}, f)
+
+
+def time_import(feed: str, path: str, spool_path: str, batch: bool) -> float:
+    """Seconds from the raw feed body to a filled server_incoming."""
+    conn = duckdb.connect()
+    try:
+        started = time.perf_counter()
+        if batch:
+            import_batch(conn, feed, path, spool_path)
+        else:
+            import_reference(conn, feed, path)
+        return time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def bench(feed_paths: dict, scales: list, repeat: int, tmp: str):
+    print("")
+    print(f"Feed to server_incoming in ms (median of {repeat})")
+    print(f"  {'':<22}{'records':>10}{'per record':>14}{'sql':>14}{'speedup':>10}")
+    for feed, path in feed_paths.items():
+        for factor in scales:
+            scaled_path = os.path.join(tmp, f"{feed}-x{factor}.json")
+            scale_feed(feed, path, factor, scaled_path)
+            spool_path = os.path.join(tmp, f"{feed}-spool.json")
+
+            records = len(read_records(scaled_path))
+            reference = statistics.median(time_import(feed, scaled_path, spool_path, False) for _ in range(repeat))
+            batch = statistics.median(time_import(feed, scaled_path, spool_path, True) for _ in range(repeat))
+            print(f"  {f'{feed} x{factor}':<22}{records:>10}{reference * 1000:>14.1f}{batch * 1000:>14.1f}"
+                  f"{reference / batch:>9.1f}x")
+            os.remove(scaled_path)
+
+
+def print_usage():
+    print("Usage: python bench_transform.py <auction_feed.json> <standard_feed.json> "
+          "[--scale N,M] [--repeat N] [--check]")
+
+
+if __name__ == "__main__":
+    def option(flag):
+        if flag in sys.argv:
+            idx = sys.argv.index(flag)
+            if idx + 1 < len(sys.argv):
+                return sys.argv[idx + 1]
+        return None
+
+    scale = option('--scale')
+    repeat = option('--repeat')
+    args = [a for a in sys.argv[1:] if not a.startswith('--') and a not in (scale, repeat)]
+    if len(args) < 2:
+        print_usage()
+        sys.exit(1)
+
+    feed_paths = {'auction': args[0], 'standard': args[1]}
+    scales = [int(factor) for factor in scale.split(',')] if scale else [1, 10, 100]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not check(feed_paths, tmp):
+            sys.exit(1)
+        if '--check' not in sys.argv:
+            bench(feed_paths, scales, int(repeat) if repeat else 3, tmp)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Replay recorded feeds through the update pipeline and benchmark it
+
+A recording is a directory of captured snapshots, one subdirectory per capture
+(replayed in name order), each holding the feeds under the names they are
+served as:
+
+    <recording>/20261017T120000Z/live_data_sb.json
+    <recording>/20261017T120000Z/live_data_en_EUR.json
+
+A snapshot may lack the standard feed, which then stays as it was. --capture
+records one snapshot from the live API; update_incremental.py --feed-dir
+replays a single snapshot.
+
+The benchmark simulates N days of ticks every few minutes, ending now. Each
+tick takes the next snapshot (cycling), shifts its auction timers so the
+records are seen at the tick's time, and runs the same update_tick() a
+scheduled update runs: pre-flight validation, fetch (from disk, or a local
+HTTP stand-in with --http), update_database(), compaction, post-update
+validation and the current-listings export. The full dedup and re-enrichment maintenance passes
+run once at the end. Every tick imports the auction feed, since its
+timestamps move; the standard feed only when the snapshot changes it.
+
+Reports per-stage wall time, with the update broken down into the stages
+update_database() records in its RunMetrics, auction rows per second through
+the update, peak RSS and the final file sizes.
+
+Usage:
+    python bench_update.py <recording_dir> [--days N] [--interval MIN] [--db SEED]
+                           [--retention DAYS] [--http] [--out PATH] [--json PATH] [--verbose]
+    python bench_update.py --capture <recording_dir>
+
+Options:
+    --days N          Simulated days (default: 1; fractions allowed)
+    --interval MIN    Minutes between ticks (default: 5)
+    --db SEED         Start from a copy of this database instead of an empty one
+    --retention DAYS  Retention passed to update_database() (default: 90)
+    --http            Serve the tick's feeds over local HTTP and fetch them
+                      with fetch_hetzner_data() instead of reading the files
+    --out PATH        Keep the final database at PATH
+    --json PATH       Also write the report as JSON to PATH
+    --verbose         Show the pipeline's own output
+    --capture DIR     Record the live feeds as a new snapshot in DIR and exit
+
+Example:
+    python bench_update.py ../recordings --days 2 --db ../static/sb.duckdb.wasm
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import statistics
+import contextlib
+from datetime import datetime, timezone
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from update_incremental import (
+    HETZNER_AUCTION_API_URL,
+    HETZNER_LIVE_API_URL,
+    AUCTION_FEED_FILE,
+    STANDARD_FEED_FILE,
+    create_http_session,
+    update_tick,
+    current_database_path,
+    deduplicate_database,
+    reenrich_database,
+    peak_rss_mb,
+    RunMetrics,
+)
+
+
+# Report order: the stages of a scheduled run, then the maintenance passes
+STAGES = (
+    'pre-flight validation',
+    'fetch',
+    'update',
+    'compact',
+    'post-update validation',
+    'publish',
+    'dedup (full)',
+    'reenrich (full)',
+)
+
+
+class FeedHandler(SimpleHTTPRequestHandler):
+    # Ticks can follow each other within Last-Modified's one-second resolution,
+    # which would turn a rewritten feed into a 304
+    def send_header(self, keyword, value):
+        if keyword != 'Last-Modified':
+            super().send_header(keyword, value)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def capture(recording_dir: str) -> str:
+    """Download both live feeds, unmodified, into a new snapshot directory."""
+    snapshot = os.path.join(recording_dir, datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+    os.makedirs(snapshot)
+    session = create_http_session()
+    for url, name in ((HETZNER_AUCTION_API_URL, AUCTION_FEED_FILE), (HETZNER_LIVE_API_URL, STANDARD_FEED_FILE)):
+        with session.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with open(os.path.join(snapshot, name), 'wb') as f:
+                for chunk in response.iter_content(1024 * 1024):
+                    f.write(chunk)
+        print(f"Captured {name}: {os.path.getsize(os.path.join(snapshot, name)) / 1024:.0f} KiB")
+    session.close()
+    print(f"Snapshot written to {snapshot}")
+    return snapshot
+
+
+def load_recording(recording_dir: str) -> list:
+    """[(auction records, reference epoch, standard feed bytes or None)] per snapshot."""
+    snapshots = []
+    for name in sorted(os.listdir(recording_dir)):
+        path = os.path.join(recording_dir, name)
+        if not os.path.isfile(os.path.join(path, AUCTION_FEED_FILE)):
+            continue
+        with open(os.path.join(path, AUCTION_FEED_FILE)) as f:
+            document = json.load(f)
+        records = document['server'] if isinstance(document, dict) else document
+
+        # The capture time, as update_incremental derives seen from the timer
+        seen = [
+            r['Timer']['ReduceNextTimestamp'] - r['Timer'].get('ReduceNext', 0)
+            for r in records if r.get('Timer') and 'ReduceNextTimestamp' in r['Timer']
+        ]
+        standard = None
+        if os.path.isfile(os.path.join(path, STANDARD_FEED_FILE)):
+            with open(os.path.join(path, STANDARD_FEED_FILE), 'rb') as f:
+                standard = f.read()
+        snapshots.append((records, max(seen) if seen else 0, standard))
+    return snapshots
+
+
+def write_tick(feed_dir: str, snapshot: tuple, tick_epoch: int) -> int:
+    """Write a snapshot's feeds as seen at tick_epoch; return the auction count."""
+    records, reference, standard = snapshot
+    shift = tick_epoch - reference
+    shifted = []
+    for record in records:
+        timer = record.get('Timer')
+        if timer and 'ReduceNextTimestamp' in timer:
+            record = dict(record, Timer=dict(timer, ReduceNextTimestamp=timer['ReduceNextTimestamp'] + shift))
+        shifted.append(record)
+
+    with open(os.path.join(feed_dir, AUCTION_FEED_FILE), 'w') as f:
+        json.dump({'server': shifted}, f)
+    if standard is not None:
+        with open(os.path.join(feed_dir, STANDARD_FEED_FILE), 'wb') as f:
+            f.write(standard)
+    return len(records)
+
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        'count': len(samples),
+        'total': sum(samples),
+        'mean': statistics.mean(samples),
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1],
+    }
+
+
+def bench(recording_dir: str, days: float = 1, interval: int = 5, seed_db: str | None = None,
+          retention_days: int = 90, http: bool = False, out_path: str | None = None,
+          verbose: bool = False) -> dict:
+    snapshots = load_recording(recording_dir)
+    if not snapshots:
+        raise ValueError(f"No snapshots with {AUCTION_FEED_FILE} in {recording_dir}")
+
+    ticks = max(1, int(days * 24 * 60 / interval))
+    end = int(time.time()) // (interval * 60) * (interval * 60)
+    start = end - (ticks - 1) * interval * 60
+    print(f"Replaying {ticks} ticks every {interval} min from {len(snapshots)} snapshots "
+          f"({datetime.fromtimestamp(start, timezone.utc):%Y-%m-%d %H:%M} to "
+          f"{datetime.fromtimestamp(end, timezone.utc):%Y-%m-%d %H:%M} UTC)")
+
+    stages = {stage: [] for stage in STAGES}
+    auction_rows = 0
+    rows = {}
+
+    def timed(stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        if verbose:
+            result = fn(*args, **kwargs)
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = fn(*args, **kwargs)
+        stages.setdefault(stage, []).append(time.perf_counter() - started)
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'sb.duckdb')
+        if seed_db:
+            shutil.copyfile(seed_db, db_path)
+        feed_dir = os.path.join(tmp, 'feeds')
+        os.makedirs(feed_dir)
+
+        server = None
+        session = None
+        feed_urls = None
+        if http:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FeedHandler, directory=feed_dir))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            feed_urls = (f"{base_url}/{AUCTION_FEED_FILE}", f"{base_url}/{STANDARD_FEED_FILE}")
+            session = create_http_session()
+
+        started = time.perf_counter()
+        try:
+            for tick in range(ticks):
+                write_tick(feed_dir, snapshots[tick % len(snapshots)], start + tick * interval * 60)
+
+                # The scheduled run's own tick, fed from the replay directory or its HTTP server
+                metrics = RunMetrics()
+                if http:
+                    tick_run = partial(update_tick, feed_urls=feed_urls, session=session)
+                else:
+                    tick_run = partial(update_tick, feed_dir=feed_dir)
+                if verbose:
+                    status = tick_run(db_path, metrics, retention_days, skip_threshold_check=True)
+                else:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        status = tick_run(db_path, metrics, retention_days, skip_threshold_check=True)
+                if status == 'invalid':
+                    raise RuntimeError(f"Validation failed after tick {tick + 1}")
+
+                auction_rows += metrics.rows.get('auction records', 0)
+                for stage, seconds in metrics.stages.items():
+                    stages.setdefault(stage, []).append(seconds)
+                for name, count in metrics.rows.items():
+                    rows[name] = rows.get(name, 0) + count
+
+                if (tick + 1) % 50 == 0 or tick + 1 == ticks:
+                    print(f"  tick {tick + 1}/{ticks} ({time.perf_counter() - started:.0f}s)")
+
+            timed('dedup (full)', deduplicate_database, db_path)
+            timed('reenrich (full)', reenrich_database, db_path)
+        finally:
+            if server:
+                session.close()
+                server.shutdown()
+                server.server_close()
+
+        elapsed = time.perf_counter() - started
+        file_size = os.path.getsize(db_path)
+        current_size = os.path.getsize(current_database_path(db_path))
+        if out_path:
+            shutil.copyfile(db_path, out_path)
+
+    # The update's own stages right below it
+    order = []
+    for stage in stages:
+        if '/' not in stage:
+            order.append(stage)
+            order += [sub for sub in stages if sub.startswith(f"{stage}/")]
+
+    update_seconds = sum(stages['update'])
+    return {
+        'ticks': ticks,
+        'interval_minutes': interval,
+        'snapshots': len(snapshots),
+        'seconds': elapsed,
+        'stages': {stage: summarize(stages[stage]) for stage in order if stages[stage]},
+        'auction_rows': auction_rows,
+        'rows': rows,
+        'rows_per_second': auction_rows / update_seconds if update_seconds else 0,
+        'peak_rss_mb': peak_rss_mb(),
+        'file_size': file_size,
+        'current_file_size': current_size,
+    }
+
+
+def print_report(report: dict):
+    print("")
+    print(f"{report['ticks']} ticks in {report['seconds']:.1f}s")
+    print(f"  {'stage':<26}{'runs':>6}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, s in report['stages'].items():
+        print(f"  {stage:<26}{s['count']:>6}{s['total']:>10.2f}{s['mean'] * 1000:>10.1f}"
+              f"{s['p50'] * 1000:>10.1f}{s['p95'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}")
+    print("")
+    print(f"Auction rows through update: {report['auction_rows']} ({report['rows_per_second']:.0f} rows/s)")
+    print(f"Peak RSS: {report['peak_rss_mb']:.0f} MiB")
+    print(f"Final size: {report['file_size'] / (1024 * 1024):.1f} MiB, "
+          f"current listings {report['current_file_size'] / (1024 * 1024):.1f} MiB")
+
+
+def print_usage():
+    print("Usage: python bench_update.py <recording_dir> [--days N] [--interval MIN] [--db SEED]")
+    print("                              [--retention DAYS] [--http] [--out PATH] [--json PATH] [--verbose]")
+    print("       python bench_update.py --capture <recording_dir>")
+
+
+if __name__ == "__main__":
+    def option(flag):
+        if flag in sys.argv:
+            idx = sys.argv.index(flag)
+            if idx + 1 < len(sys.argv):
+                return sys.argv[idx + 1]
+        return None
+
+    capture_dir = option('--capture')
+    if capture_dir:
+        capture(capture_dir)
+        sys.exit(0)
+
+    days = option('--days')
+    interval = option('--interval')
+    seed_db = option('--db')
+    retention = option('--retention')
+    out_path = option('--out')
+    json_path = option('--json')
+    values = (days, interval, seed_db, retention, out_path, json_path)
+    args = [a for a in sys.argv[1:] if not a.startswith('--') and a not in values]
+    if len(args) < 1:
+        print_usage()
+        sys.exit(1)
+
+    report = bench(
+        args[0],
+        days=float(days) if days else 1,
+        interval=int(interval) if interval else 5,
+        seed_db=seed_db,
+        retention_days=int(retention) if retention else 90,
+        http='--http' in sys.argv,
+        out_path=out_path,
+        verbose='--verbose' in sys.argv,
+    )
+    print_report(report)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=1)
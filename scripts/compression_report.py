@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Compare compression profiles for the server table
+
+Rebuilds a database's server table under each profile - in CLUSTER_ORDER, as
+update_incremental.py publishes it - and reports the file size, the bytes and
+codec of every column, and the timings of the frontend's canonical queries
+(see bench_layout.py). File size is what every browser visitor downloads.
+
+Profiles:
+    dictionary   PRAGMA force_compression='dictionary' (what the scripts used to run)
+    automatic    DuckDB analyses every segment and keeps the smallest codec
+    cardinality  Per-column USING COMPRESSION picked from measured cardinality:
+                 dictionary for low-cardinality strings, FSST for the rest,
+                 bitpacking (FOR/delta) for integers and timestamps
+
+Usage:
+    python compression_report.py <database_path> [--repeat N] [--storage-version V]
+
+Options:
+    --repeat N            Timing runs per query (default: 5)
+    --storage-version V   Storage format to write, e.g. v1.3.0 (default: DuckDB's
+                          default, which older DuckDB-WASM builds can read)
+
+Example:
+    python compression_report.py ../static/sb.duckdb.wasm
+"""
+
+import os
+import sys
+import tempfile
+import duckdb
+
+from bench_layout import time_queries
+from update_incremental import CLUSTER_ORDER
+
+# Strings with fewer distinct values than this share of the rows get dictionary
+# encoding in the cardinality profile
+DICTIONARY_MAX_CARDINALITY = 0.01
+
+# From storage version v1.3.0 on, DuckDB writes dictionaries as DICT_FSST and
+# only reads the old dictionary codec
+DICT_FSST_STORAGE_VERSION = (1, 3)
+
+BITPACKING_TYPES = ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'UBIGINT', 'TIMESTAMP')
+
+# Sizes of persisted segments: each runs up to the next segment in its block
+# (or the block end), plus any further blocks it spills into
+column_bytes_query = """
+WITH segments AS (
+    SELECT
+        column_name,
+        block_id,
+        block_offset,
+        len(additional_block_ids) AS extra_blocks,
+        LEAD(block_offset) OVER (PARTITION BY block_id ORDER BY block_offset) AS next_offset
+    FROM pragma_storage_info('server')
+    WHERE persistent AND block_id >= 0
+)
+SELECT
+    column_name,
+    SUM(COALESCE(next_offset, ?) - block_offset + extra_blocks * ?) AS bytes
+FROM segments
+GROUP BY column_name
+"""
+
+column_codecs_query = """
+SELECT column_name, string_agg(DISTINCT compression, '+' ORDER BY compression) AS codecs
+FROM pragma_storage_info('server')
+WHERE segment_type <> 'VALIDITY'
+GROUP BY column_name
+"""
+
+
+def cardinality_profile(conn, dictionary_codec: str = 'dictionary') -> dict:
+    """Column name -> codec for the cardinality profile (None = automatic)."""
+    columns = conn.execute("""
+        SELECT column_name, data_type FROM duckdb_columns()
+        WHERE table_name = 'server' ORDER BY column_index
+    """).fetchall()
+    rows = conn.execute("SELECT COUNT(*) FROM server").fetchone()[0]
+
+    profile = {}
+    for name, data_type in columns:
+        if data_type == 'VARCHAR':
+            distinct = conn.execute(f"SELECT approx_count_distinct({name}) FROM server").fetchone()[0]
+            profile[name] = dictionary_codec if distinct < DICTIONARY_MAX_CARDINALITY * rows else 'fsst'
+        elif data_type in BITPACKING_TYPES:
+            profile[name] = 'bitpacking'
+        else:
+            profile[name] = None
+    return profile
+
+
+def dictionary_codec(storage_version: str | None) -> str:
+    if storage_version:
+        version = tuple(int(part) for part in storage_version.lstrip('v').split('.')[:2])
+        if version >= DICT_FSST_STORAGE_VERSION:
+            return 'dict_fsst'
+    return 'dictionary'
+
+
+def build(src_path: str, dst_path: str, profile: str, storage_version: str | None) -> dict:
+    """Rebuild the server table into dst_path under a profile; return its sizes and codecs."""
+    conn = duckdb.connect()
+    try:
+        options = f" (STORAGE_VERSION '{storage_version}')" if storage_version else ""
+        conn.execute(f"ATTACH '{dst_path}' AS dst{options}")
+        conn.execute(f"ATTACH '{src_path}' AS src (READ_ONLY)")
+        conn.execute("USE dst")
+
+        if profile == 'dictionary':
+            conn.execute("PRAGMA force_compression='dictionary'")
+
+        if profile == 'cardinality':
+            conn.execute("USE src")
+            codecs = cardinality_profile(conn, dictionary_codec(storage_version))
+            conn.execute("USE dst")
+            types = dict(conn.execute("""
+                SELECT column_name, data_type FROM duckdb_columns()
+                WHERE database_name = 'src' AND table_name = 'server'
+            """).fetchall())
+            definitions = ", ".join(
+                f"{name} {types[name]}" + (f" USING COMPRESSION {codec}" if codec else "")
+                for name, codec in codecs.items()
+            )
+            conn.execute(f"CREATE TABLE server ({definitions})")
+            conn.execute(f"INSERT INTO server SELECT * FROM src.server ORDER BY {CLUSTER_ORDER}")
+        else:
+            conn.execute(f"CREATE TABLE server AS SELECT * FROM src.server ORDER BY {CLUSTER_ORDER}")
+        conn.execute("CHECKPOINT dst")
+
+        block_size = conn.execute("SELECT block_size FROM pragma_database_size() WHERE database_name = 'dst'").fetchone()[0]
+        columns = dict(conn.execute(column_bytes_query, [block_size, block_size]).fetchall())
+        codecs = dict(conn.execute(column_codecs_query).fetchall())
+        used_blocks = conn.execute("SELECT used_blocks FROM pragma_database_size() WHERE database_name = 'dst'").fetchone()[0]
+    finally:
+        conn.close()
+
+    return {
+        'used bytes': used_blocks * block_size,
+        'columns': columns,
+        'codecs': codecs,
+    }
+
+
+def report(db_path: str, repeat: int = 5, storage_version: str | None = None):
+    profiles = ['dictionary', 'automatic', 'cardinality']
+
+    conn = duckdb.connect(db_path, read_only=True)
+    cpu = conn.execute("""
+        SELECT cpu FROM server WHERE server_type = 'auction'
+        GROUP BY cpu ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone()[0]
+    rows = conn.execute("SELECT COUNT(*) FROM server").fetchone()[0]
+    conn.close()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in profiles:
+            path = os.path.join(tmp, f"{profile}.duckdb")
+            results[profile] = build(db_path, path, profile, storage_version)
+            results[profile]['file size'] = os.path.getsize(path)
+            results[profile]['timings'] = time_queries(path, repeat, 1, cpu)
+
+    print(f"Compression report for {db_path} ({rows} records, "
+          f"storage version {storage_version or 'default'})")
+    print("")
+    print(f"{'':<24}" + "".join(f"{p:>14}" for p in profiles))
+    for label in ('file size', 'used bytes'):
+        print(f"{label + ' (KiB)':<24}" + "".join(f"{results[p][label] / 1024:>14.0f}" for p in profiles))
+
+    print("")
+    print("Column size in KiB, validity included (codec)")
+    print(f"  {'':<22}" + "".join(f"{p:<30}" for p in profiles).rstrip())
+    columns = sorted(results['automatic']['columns'], key=lambda c: -results['automatic']['columns'][c])
+    for column in columns:
+        cells = []
+        for p in profiles:
+            size = results[p]['columns'].get(column, 0) / 1024
+            cells.append(f"{size:>8.0f} {results[p]['codecs'].get(column, '-'):<21}")
+        print(f"  {column:<22}" + "".join(cells).rstrip())
+
+    print("")
+    print(f"Query time in ms (median of {repeat}, single thread)")
+    for name in results['automatic']['timings']:
+        if name == 'row groups':
+            continue
+        print(f"  {name:<22}" + "".join(f"{results[p]['timings'][name]:>14.2f}" for p in profiles))
+
+
+def print_usage():
+    print("Usage: python compression_report.py <database_path> [--repeat N] [--storage-version V]")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print_usage()
+        sys.exit(1)
+
+    repeat = 5
+    if '--repeat' in sys.argv:
+        idx = sys.argv.index('--repeat')
+        if idx + 1 < len(sys.argv):
+            repeat = int(sys.argv[idx + 1])
+
+    storage_version = None
+    if '--storage-version' in sys.argv:
+        idx = sys.argv.index('--storage-version')
+        if idx + 1 < len(sys.argv):
+            storage_version = sys.argv[idx + 1]
+
+    report(sys.argv[1], repeat, storage_version)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Export auction history as day-partitioned Parquet
+
+Writes one Parquet file per day of auction data into a Hive-style layout
+(seen_date=YYYY-MM-DD/part-0.parquet) plus a manifest.json listing every
+partition with its row count, size and value ranges, so clients and analytics
+jobs can range-read just the days they need over HTTP.
+
+Exports are incremental: each partition's fingerprint is kept in the manifest,
+and only days whose rows changed since the last export are rewritten. The
+days and their record counts come from the stats_daily_volume rollup. After an
+update, only the days it touched are fingerprinted (update_database() returns
+them), along with any day whose count no longer matches the manifest; run
+from the command line, every day is. On a regular 5-minute tick that is
+today's partition; days that fell out of the database's retention window are
+removed.
+
+Usage:
+    python export_parquet.py <database_path> <output_dir> [--full]
+
+Options:
+    --full    Rewrite every partition, ignoring the previous manifest
+
+Example:
+    python export_parquet.py ../static/sb.duckdb.wasm ../static/parquet
+"""
+
+import os
+import sys
+import json
+import shutil
+import duckdb
+from datetime import datetime, timezone
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+# ZSTD on top of DuckDB's default dictionary/RLE page encoding; low-cardinality
+# columns (cpu, datacenter, location, ...) end up dictionary-encoded regardless.
+PARQUET_COMPRESSION = "zstd"
+
+# A day holds a few thousand auctions. Rows are sorted by cpu within a day, so
+# row groups this size carry narrow cpu min/max statistics that let per-CPU
+# reads skip most of a file, without making the footer noticeably larger.
+PARQUET_ROW_GROUP_SIZE = 4096
+
+# Auction records per day, from the rollup the update keeps current
+partition_rows_query = """
+SELECT day AS seen_date, SUM(records) AS rows
+FROM stats_daily_volume
+WHERE server_type = 'auction'
+GROUP BY seen_date
+ORDER BY seen_date
+"""
+
+# Databases without the rollup count the server table
+partition_rows_fallback_query = """
+SELECT seen::DATE AS seen_date, COUNT(*) AS rows
+FROM server
+WHERE server_type = 'auction'
+GROUP BY seen_date
+ORDER BY seen_date
+"""
+
+# One row per listed day: the fingerprint detects any change to that day's rows
+# (new observations, replaced snapshots, re-enrichment). MD5 of each row's JSON
+# rather than hash(), whose values may change between DuckDB versions and would
+# rewrite every partition after an upgrade.
+partition_fingerprints_query = """
+SELECT
+    seen::DATE AS seen_date,
+    bit_xor(md5_number_lower(to_json(s))) AS fingerprint
+FROM server s
+WHERE server_type = 'auction' AND seen::DATE IN (SELECT UNNEST(?::DATE[]))
+GROUP BY seen_date
+"""
+
+export_partition_query = """
+COPY (
+    SELECT * FROM server
+    WHERE server_type = 'auction' AND seen::DATE = '{seen_date}'
+    ORDER BY cpu, seen
+) TO '{path}' (
+    FORMAT parquet,
+    COMPRESSION {compression},
+    ROW_GROUP_SIZE {row_group_size}
+)
+"""
+
+partition_stats_query = """
+SELECT
+    COUNT(*) AS rows,
+    COUNT(DISTINCT id) AS ids,
+    MIN(seen) AS min_seen,
+    MAX(seen) AS max_seen,
+    MIN(price) AS min_price,
+    MAX(price) AS max_price
+FROM read_parquet(?)
+"""
+
+
+def partition_dir(seen_date) -> str:
+    return f"seen_date={seen_date.isoformat()}"
+
+
+def load_manifest(output_dir: str) -> dict:
+    """Previous manifest keyed by date, or empty if there is none (or it is unreadable)."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return {p['seen_date']: p for p in manifest.get('partitions', [])}
+
+
+def write_partition(conn, output_dir: str, seen_date) -> dict:
+    """Write one day to Parquet (via a temporary file) and return its manifest entry."""
+    directory = os.path.join(output_dir, partition_dir(seen_date))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "part-0.parquet")
+    tmp_path = path + '.tmp'
+
+    conn.execute(export_partition_query.format(
+        seen_date=seen_date.isoformat(),
+        path=tmp_path,
+        compression=PARQUET_COMPRESSION,
+        row_group_size=PARQUET_ROW_GROUP_SIZE,
+    ))
+    os.replace(tmp_path, path)
+
+    rows, ids, min_seen, max_seen, min_price, max_price = conn.execute(
+        partition_stats_query, [path]
+    ).fetchone()
+    return {
+        'seen_date': seen_date.isoformat(),
+        'path': f"{partition_dir(seen_date)}/part-0.parquet",
+        'bytes': os.path.getsize(path),
+        'rows': rows,
+        'ids': ids,
+        'min_seen': min_seen.isoformat(),
+        'max_seen': max_seen.isoformat(),
+        'min_price': min_price,
+        'max_price': max_price,
+    }
+
+
+def export_parquet(db_path: str, output_dir: str, full: bool = False, days: list = None) -> dict:
+    """
+    Bring the Parquet partitions in output_dir up to date with the database.
+
+    `days` are the dates whose rows may have changed since the last export;
+    the other days are only checked against their manifest row count. None
+    checks every day.
+
+    Returns:
+        dict: counts of written, unchanged and removed partitions, bytes written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous = {} if full else load_manifest(output_dir)
+
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        has_rollup = conn.execute("""
+            SELECT COUNT(*) > 0 FROM duckdb_columns()
+            WHERE database_name = current_database() AND table_name = 'stats_daily_volume'
+                AND column_name = 'records'
+        """).fetchone()[0]
+        listed = conn.execute(partition_rows_query if has_rollup else partition_rows_fallback_query).fetchall()
+
+        # Days the manifest can't vouch for: changed, new, recounted or missing on disk
+        touched = None if days is None else {str(day) for day in days}
+        checked = []
+        for seen_date, rows in listed:
+            entry = previous.get(seen_date.isoformat())
+            if (touched is None or seen_date.isoformat() in touched or not entry or entry['rows'] != rows
+                    or not os.path.exists(os.path.join(output_dir, entry['path']))):
+                checked.append(seen_date)
+        fingerprints = dict(conn.execute(partition_fingerprints_query, [checked]).fetchall()) if checked else {}
+
+        partitions = []
+        written = 0
+        bytes_written = 0
+        for seen_date, rows in listed:
+            entry = previous.get(seen_date.isoformat())
+            if seen_date not in checked:
+                partitions.append(entry)
+                continue
+            # JSON numbers lose precision past 2**53, so the digest is kept as a string
+            fingerprint = str(fingerprints.get(seen_date))
+            if (entry and entry.get('fingerprint') == fingerprint
+                    and os.path.exists(os.path.join(output_dir, entry['path']))):
+                partitions.append(entry)
+                continue
+
+            entry = write_partition(conn, output_dir, seen_date)
+            entry['fingerprint'] = fingerprint
+            partitions.append(entry)
+            written += 1
+            bytes_written += entry['bytes']
+            print(f"  Wrote {entry['path']}: {rows} records, {entry['bytes'] / 1024:.0f} KiB")
+    finally:
+        conn.close()
+
+    # Days that aged out of the database (retention) or vanished entirely
+    current = {p['seen_date'] for p in partitions}
+    removed = 0
+    for name in os.listdir(output_dir):
+        if name.startswith('seen_date=') and name.split('=', 1)[1] not in current:
+            shutil.rmtree(os.path.join(output_dir, name))
+            removed += 1
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'compression': PARQUET_COMPRESSION,
+        'row_group_size': PARQUET_ROW_GROUP_SIZE,
+        'rows': sum(p['rows'] for p in partitions),
+        'bytes': sum(p['bytes'] for p in partitions),
+        'partitions': partitions,
+    }
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    print(f"Parquet export: {written} partition(s) written ({bytes_written / 1024:.0f} KiB), "
+          f"{len(partitions) - written} unchanged, {removed} removed; "
+          f"{manifest['rows']} records in {len(partitions)} days, "
+          f"{manifest['bytes'] / (1024 * 1024):.1f} MiB")
+
+    return {
+        'written': written,
+        'unchanged': len(partitions) - written,
+        'removed': removed,
+        'bytes_written': bytes_written,
+    }
+
+
+def print_usage():
+    print("Usage: python export_parquet.py <database_path> <output_dir> [--full]")
+    print("")
+    print("Options:")
+    print("  --full    Rewrite every partition, ignoring the previous manifest")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if len(args) < 2:
+        print_usage()
+        sys.exit(1)
+
+    if not os.path.exists(args[0]):
+        print(f"No database at {args[0]}")
+        sys.exit(1)
+
+    export_parquet(args[0], args[1], full='--full' in sys.argv)
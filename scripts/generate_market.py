@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic auction market for load tests
+
+Simulates the Serverbörse: a pool of hardware configurations built from the
+CPUs in data/hetzner-cpus.json, auctions listed and sold at a steady churn,
+and prices that drop by a fixed step on a fixed cadence until they reach
+their floor and turn fixed. From that market it writes either
+
+  - feed snapshots in the live_data_sb.json shape, as a recording that
+    bench_update.py replays and update_incremental.py --feed-dir imports, or
+  - a database holding years of history, built through the same import and
+    merge queries the update runs, so dedup, the update and the published
+    file's query latency (bench_layout.py) can be measured at volumes the
+    live feed does not reach yet.
+
+Auctions list at volume x churn per day and live an exponentially distributed
+time averaging 1 / churn days, so the market holds about --volume auctions at
+any time. Configurations are drawn with skewed popularity, so a few are
+common and most are rare, as in the live feed. The database holds each
+auction once per day, at the last tick of the day it was listed, as the
+update's same-day dedup leaves it. Only auctions are generated; the standard
+servers are a small snapshot without history.
+
+Load the database with a retention of at least its span, e.g.
+`update_incremental.py <db> 800` for two years, or the first update purges it.
+
+Usage:
+    python generate_market.py <database_path> [--years Y] [market options]
+    python generate_market.py --feeds <recording_dir> [--snapshots N] [--interval MIN] [market options]
+
+Options:
+    --years Y          Years of history in the database (default: 2; fractions allowed)
+    --feeds DIR        Write feed snapshots into DIR instead of a database
+    --snapshots N      Snapshots to write (default: 12)
+    --interval MIN     Minutes between snapshots, and between the database's
+                       update ticks (default: 5)
+
+Market options:
+    --volume N         Auctions listed at any time (default: 2000)
+    --churn F          Share of the listed auctions sold per day (default: 0.1)
+    --configs N        Distinct hardware configurations (default: 1500)
+    --cpu-mix P=W,...  Weight of CPUs whose name contains P; the first matching
+                       pattern counts, others weigh 1 (default: all equal)
+    --datacenters L=W,...
+                       Weight of each location (default: FSN1=5,NBG1=2,HEL1=3)
+    --reduce-hours H   Hours between price reductions (default: 24)
+    --reduce-step P    Price reduction per step in percent (default: 3)
+    --floor P          Lowest price in percent of the start price (default: 60)
+    --seed N           Random seed (default: 1)
+
+Examples:
+    python generate_market.py /tmp/market.duckdb --years 3 --volume 20000
+    python generate_market.py --feeds /tmp/recording --volume 200000 --cpu-mix EPYC=4,Xeon=2
+    python bench_update.py /tmp/recording --db /tmp/market.duckdb --retention 1100
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import multiprocessing
+from datetime import datetime, timezone
+import duckdb
+import numpy as np
+import pandas as pd
+
+from update_incremental import (
+    AUCTION_FEED_FILE,
+    create_temp_table_query,
+    create_touched_days_query,
+    import_auction_query,
+    ensure_schema,
+    merge_incoming,
+    load_cpu_specs,
+    enrich_cpu_data,
+    refresh_stats,
+    ensure_price_events,
+    ensure_lifecycle,
+    compact_database,
+    validate_database,
+)
+
+CPUS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'hetzner-cpus.json')
+
+DAY = 86400
+
+# Rooms per location; datacenters are named like FSN1-DC14
+DATACENTER_ROOMS = {'FSN1': 18, 'NBG1': 4, 'HEL1': 9}
+DEFAULT_ROOMS = 4
+
+# Name fragments of the server-class CPUs: more RAM, ECC, a higher base price
+SERVER_CPUS = ('XEON', 'EPYC', 'THREADRIPPER')
+
+# CPUs that ship with DDR5
+DDR5_CPUS = ('7700', '7950X3D', '8700GE', '9454P', '12500', '12900K', '13500', '13900',
+             'Ultra', '5412U', '6438Y+', '4410Y')
+
+RAM_SIZES = {'desktop': [32, 64, 64, 128], 'server': [64, 128, 128, 256, 512]}
+
+# Drive kind -> (Information label, Disks label, [(count, size in GB)])
+DISK_GROUPS = {
+    'nvme': ('SSD M.2 NVMe', 'NVMe SSD', [(2, 512), (2, 1024), (2, 1920), (2, 3840), (4, 3840)]),
+    'sata': ('SSD SATA', 'SATA SSD', [(2, 240), (2, 480), (2, 960), (4, 960)]),
+    'hdd': ('HDD SATA', 'HDD', [(2, 2000), (2, 4000), (4, 4000), (2, 8000), (4, 16000), (10, 16000)]),
+}
+DISK_KIND_WEIGHTS = {'nvme': 5, 'sata': 2, 'hdd': 3}
+
+# Share of configs with a second drive group (an HDD array next to the SSDs)
+SECOND_DISK_GROUP = 0.3
+
+# Chance of each special; HWR only comes with HDDs, GPUs only in desktops
+SPECIALS = {'iNIC': 0.1, 'HWR': 0.3, 'GPU': 0.03, 'RPS': 0.05, 'HighIO': 0.02}
+
+# Zipf exponent of config popularity
+CONFIG_SKEW = 0.8
+
+# Log-normal spread of a config's price around the hardware price, and of a
+# listing's start price around its config's
+CONFIG_PRICE_SPREAD = 0.1
+LISTING_PRICE_SPREAD = 0.05
+
+# Ids per second of listing time; far above the live feed's ids
+ID_SLOTS = 100
+
+# Observations generated and merged per batch when building a database
+DATABASE_CHUNK_DAYS = 30
+
+# Market hardware, one row per config; lists are joined onto every observation
+create_market_config_query = """
+CREATE OR REPLACE TEMP TABLE market_config (
+    config INTEGER,
+    information VARCHAR[],
+    cpu VARCHAR,
+    cpu_count INTEGER,
+    ram_size INTEGER,
+    is_ecc BOOLEAN,
+    hdd_arr VARCHAR[],
+    nvme INTEGER[],
+    sata INTEGER[],
+    hdd INTEGER[],
+    general INTEGER[],
+    specials VARCHAR[]
+)
+"""
+
+# One auction_feed row per listing per day of the chunk [{start}, {end}), seen
+# at the day's last tick the listing was up - what the update keeps after its
+# same-day dedup. The columns are those of auction_feed_query, so
+# import_auction_query reads them unchanged.
+market_auction_feed_query = """
+CREATE OR REPLACE TEMP TABLE auction_feed AS
+WITH listed_days AS (
+    SELECT
+        l.*,
+        unnest(range(greatest(l.listed_at, {start}) // {day}, (least(l.sold_at, {end}) - 1) // {day} + 1)) AS day
+    FROM market_listing l
+    WHERE l.listed_at < {end} AND l.sold_at > {start}
+), seen AS (
+    SELECT *, (least((day + 1) * {day}, sold_at, {end}) - 1) // {tick} * {tick} AS seen_at
+    FROM listed_days
+), priced AS (
+    SELECT
+        *,
+        start_price * pow(1 - {step}, (seen_at - listed_at) // {cadence}) AS reduced,
+        listed_at + ((seen_at - listed_at) // {cadence} + 1) * {cadence} AS next_reduction
+    FROM seen
+    WHERE seen_at >= listed_at
+)
+SELECT
+    p.id,
+    c.information,
+    c.cpu,
+    c.cpu_count,
+    list_contains(c.specials, 'HighIO') AS is_highio,
+    'unlimited' AS traffic,
+    1000 AS bandwidth,
+    list_filter(c.information, line -> contains(line, 'RAM')) AS ram,
+    c.ram_size,
+    c.is_ecc,
+    greatest(p.floor_price, round(p.reduced, 1)) AS price,
+    c.hdd_arr,
+    {{'nvme': c.nvme, 'sata': c.sata, 'hdd': c.hdd, 'general': c.general}} AS "serverDiskData",
+    p.datacenter,
+    c.specials,
+    p.reduced <= p.floor_price AS fixed_price,
+    CASE WHEN p.reduced <= p.floor_price THEN p.seen_at ELSE p.next_reduction END AS next_reduce_timestamp,
+    CASE WHEN p.reduced <= p.floor_price THEN 0 ELSE p.next_reduction - p.seen_at END AS next_reduce
+FROM priced p
+JOIN market_config c USING (config)
+"""
+
+
+def parse_weights(spec: str) -> dict:
+    """'A=3,B=1' -> {'A': 3.0, 'B': 1.0}"""
+    weights = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight) if weight else 1.0
+    return weights
+
+
+def load_cpus() -> list:
+    with open(CPUS_PATH) as f:
+        return json.load(f)
+
+
+def disk_label(size: int) -> str:
+    return f"{size / 1000:g} TB" if size >= 1000 else f"{size} GB"
+
+
+def make_config(rnd: random.Random, cpu: str) -> dict:
+    """One hardware configuration: the Hardware part of a feed record plus its
+    Information lines, Specials and a monthly base price."""
+    server = any(token in cpu.upper() for token in SERVER_CPUS)
+    sockets = 2 if cpu.startswith('2x ') else 1
+
+    ram_size = rnd.choice(RAM_SIZES['server' if server else 'desktop']) * sockets
+    ecc = server or rnd.random() < 0.3
+    modules = rnd.choice([m for m in (2, 4, 8) if ram_size // m >= 8])
+    ddr = 'DDR5' if any(token in cpu for token in DDR5_CPUS) else 'DDR4'
+    information = [f"{modules}x RAM {ram_size * 1024 // modules} MB {ddr}{' ECC' if ecc else ''}"]
+
+    kinds = list(DISK_KIND_WEIGHTS)
+    groups = [rnd.choices(kinds, weights=list(DISK_KIND_WEIGHTS.values()))[0]]
+    if groups[0] != 'hdd' and rnd.random() < SECOND_DISK_GROUP:
+        groups.append('hdd')
+
+    disks = []
+    details = {'nvme': [], 'sata': [], 'hdd': [], 'general': []}
+    for kind in groups:
+        info_label, disk_kind, sizes = DISK_GROUPS[kind]
+        count, size = rnd.choice(sizes)
+        information.append(f"{count}x {info_label} {size} GB")
+        disks.append(f"{count}x {disk_label(size)} {disk_kind}")
+        details[kind] += [size] * count
+        details['general'] += [size] * count
+
+    specials = []
+    for special, chance in SPECIALS.items():
+        if special == 'HWR' and not details['hdd']:
+            continue
+        if special == 'GPU' and server:
+            continue
+        if rnd.random() < chance:
+            specials.append(special)
+
+    storage_tb = sum(details['general']) / 1000
+    price = 25 + ram_size * 0.15 + storage_tb * 2.5
+    if server:
+        price += 20
+    if 'GPU' in specials:
+        price += 40
+    price *= sockets ** 0.7
+    price *= math.exp(rnd.gauss(0, CONFIG_PRICE_SPREAD))
+
+    return {
+        'hardware': {
+            'CPU': {'Name': cpu, 'CoreCount': sockets},
+            'RAM': {'Size': ram_size, 'ecc': ecc},
+            'Storage': {'Disks': disks, 'Details': details},
+        },
+        'information': information,
+        'specials': specials,
+        'price': price,
+    }
+
+
+def make_configs(market: dict) -> list:
+    """The market's config pool, each CPU weighted by the first --cpu-mix pattern it contains."""
+    rnd = random.Random(market['seed'])
+    cpus = load_cpus()
+    weights = []
+    for cpu in cpus:
+        weight = next((w for pattern, w in market['cpu_mix'].items() if pattern.lower() in cpu.lower()), 1.0)
+        weights.append(weight)
+    if not any(weights):
+        raise ValueError("--cpu-mix leaves no CPU with a positive weight")
+    return [make_config(rnd, cpu) for cpu in rnd.choices(cpus, weights=weights, k=market['configs'])]
+
+
+def datacenters(market: dict) -> tuple[list, np.ndarray]:
+    """Every datacenter room and its share: a location's weight split over its rooms."""
+    names, weights = [], []
+    for location, weight in market['datacenters'].items():
+        rooms = DATACENTER_ROOMS.get(location, DEFAULT_ROOMS)
+        for room in range(1, rooms + 1):
+            names.append(f"{location}-DC{room}")
+            weights.append(weight / rooms)
+    weights = np.array(weights)
+    return names, weights / weights.sum()
+
+
+def make_listings(market: dict, configs: list, start: int, end: int) -> pd.DataFrame:
+    """Every auction listed during [start, end), plus those already listed at start.
+
+    Ids ascend with the listing time, as Hetzner's do, and are derived from
+    it, so a recording and a database generated separately rarely share one.
+    """
+    rng = np.random.default_rng(market['seed'])
+    lifetime = DAY / market['churn']
+
+    # The market is in its steady state at start: ages and remaining lives of
+    # the listed auctions are both exponential
+    listed = np.concatenate([
+        start - rng.exponential(lifetime, market['volume']),
+        rng.uniform(start, end, rng.poisson(market['volume'] * market['churn'] * (end - start) / DAY)),
+    ])
+    listed = np.sort(listed).astype(np.int64)
+    count = len(listed)
+    ids = listed * ID_SLOTS + np.arange(count) - np.searchsorted(listed, listed)
+    sold = np.where(listed < start, start, listed) + rng.exponential(lifetime, count)
+
+    popularity = 1 / np.arange(1, len(configs) + 1) ** CONFIG_SKEW
+    config = rng.permutation(len(configs))[rng.choice(len(configs), count, p=popularity / popularity.sum())]
+    base = np.array([c['price'] for c in configs])[config]
+    start_price = np.round(base * rng.lognormal(0, LISTING_PRICE_SPREAD, count), 1)
+
+    names, shares = datacenters(market)
+    return pd.DataFrame({
+        'id': ids,
+        'config': config.astype(np.int32),
+        'datacenter': np.array(names)[rng.choice(len(names), count, p=shares)],
+        'listed_at': listed,
+        'sold_at': sold.astype(np.int64),
+        'start_price': start_price,
+        'floor_price': np.round(start_price * market['floor'], 1),
+    })
+
+
+def price_at(market: dict, listing, t: int) -> tuple[float, bool, int]:
+    """(price, fixed, next reduction timestamp) of a listing at t."""
+    cadence = int(market['reduce_hours'] * 3600)
+    steps = (t - listing.listed_at) // cadence
+    reduced = listing.start_price * (1 - market['reduce_step']) ** steps
+    if reduced <= listing.floor_price:
+        return listing.floor_price, True, t
+    return round(reduced, 1), False, listing.listed_at + (steps + 1) * cadence
+
+
+def snapshot_records(market: dict, configs: list, listings: pd.DataFrame, t: int) -> list:
+    """The auction feed's records at t."""
+    records = []
+    listed = listings[(listings.listed_at <= t) & (listings.sold_at > t)]
+    for listing in listed.itertuples(index=False):
+        config = configs[listing.config]
+        price, fixed, next_reduction = price_at(market, listing, t)
+        records.append({
+            'Id': int(listing.id),
+            'Hardware': config['hardware'],
+            'Prices': {'monthly': {'EUR': float(price)}, 'fixed': fixed},
+            'Details': {
+                'Information': config['information'],
+                'Specials': config['specials'],
+                'Traffic': 'unlimited',
+                'Bandwidth': 1000,
+                'Datacenter': {'Name': listing.datacenter},
+            },
+            # update_incremental.py derives seen as ReduceNextTimestamp - ReduceNext
+            'Timer': {'ReduceNext': int(next_reduction - t), 'ReduceNextTimestamp': int(next_reduction)},
+        })
+    return records
+
+
+def write_feeds(recording_dir: str, market: dict, snapshots: int = 12, interval: int = 5):
+    """Write `snapshots` auction feeds, `interval` minutes apart and ending now, as a recording."""
+    tick = interval * 60
+    end = int(time.time()) // tick * tick
+    times = [end - (snapshots - 1 - i) * tick for i in range(snapshots)]
+
+    configs = make_configs(market)
+    listings = make_listings(market, configs, times[0], times[-1] + 1)
+
+    os.makedirs(recording_dir, exist_ok=True)
+    for t in times:
+        records = snapshot_records(market, configs, listings, t)
+        name = datetime.fromtimestamp(t, timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(recording_dir, name)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, AUCTION_FEED_FILE), 'w') as f:
+            json.dump({'server': records}, f)
+        print(f"{name}: {len(records)} auctions")
+
+
+def build_database(db_path: str, market: dict, years: float = 2, interval: int = 5):
+    """Build a database holding `years` of the market's history, ending now."""
+    if os.path.exists(db_path):
+        print(f"Error: {db_path} already exists")
+        sys.exit(1)
+
+    tick = interval * 60
+    end = int(time.time()) // tick * tick + 1
+    start = (end - int(years * 365 * DAY)) // DAY * DAY
+
+    started = time.perf_counter()
+    configs = make_configs(market)
+    listings = make_listings(market, configs, start, end)
+    print(f"Generated {len(configs)} configs and {len(listings)} auctions "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
+    try:
+        ensure_schema(conn)
+        conn.execute(create_market_config_query)
+        conn.executemany("INSERT INTO market_config VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (
+                i, c['information'], c['hardware']['CPU']['Name'], c['hardware']['CPU']['CoreCount'],
+                c['hardware']['RAM']['Size'], c['hardware']['RAM']['ecc'], c['hardware']['Storage']['Disks'],
+                *(c['hardware']['Storage']['Details'][kind] for kind in ('nvme', 'sata', 'hdd', 'general')),
+                c['specials'],
+            )
+            for i, c in enumerate(configs)
+        ])
+        conn.register('market_listing_df', listings)
+        conn.execute("CREATE TEMP TABLE market_listing AS SELECT * FROM market_listing_df")
+        conn.unregister('market_listing_df')
+
+        # One transaction per chunk, like one per update: reading back a
+        # single transaction's worth of years of uncommitted rows is slow
+        for chunk_start in range(start, end, DATABASE_CHUNK_DAYS * DAY):
+            chunk_end = min(chunk_start + DATABASE_CHUNK_DAYS * DAY, end)
+            conn.execute("BEGIN TRANSACTION")
+            conn.execute(create_touched_days_query)
+            conn.execute(market_auction_feed_query.format(
+                start=chunk_start, end=chunk_end, day=DAY, tick=tick,
+                cadence=int(market['reduce_hours'] * 3600), step=market['reduce_step'],
+            ))
+            conn.execute(create_temp_table_query)
+            conn.execute(import_auction_query)
+            conn.execute("DROP TABLE auction_feed")
+            rows = conn.execute("SELECT COUNT(*) FROM server_incoming").fetchone()[0]
+            merge_incoming(conn)
+            conn.execute("COMMIT")
+            day = datetime.fromtimestamp(chunk_start, timezone.utc).date()
+            print(f"{day}: {rows} observations ({time.perf_counter() - started:.1f}s)")
+
+        conn.execute("BEGIN TRANSACTION")
+        enrich_cpu_data(conn, load_cpu_specs())
+        refresh_stats(conn, full=True)
+        ensure_price_events(conn)
+        ensure_lifecycle(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        # Half a history is no load test; start over
+        conn.close()
+        for partial in (db_path, db_path + '.wal'):
+            if os.path.exists(partial):
+                os.remove(partial)
+        raise
+    finally:
+        conn.close()
+
+    compact_database(db_path)
+    is_valid, error, stats = validate_database(db_path)
+    if not is_valid:
+        print(f"Error: {error}")
+        sys.exit(1)
+    print(f"Built {db_path} in {time.perf_counter() - started:.1f}s: "
+          f"{stats['auctions']} auction observations over {stats['days']} days, "
+          f"{os.path.getsize(db_path) / (1024 * 1024):.1f} MiB")
+
+
+def print_usage():
+    print("Usage: python generate_market.py <database_path> [--years Y] [market options]")
+    print("       python generate_market.py --feeds <recording_dir> [--snapshots N] [--interval MIN] [market options]")
+    print("")
+    print("Options:")
+    print("  --years Y          Years of history in the database (default: 2)")
+    print("  --feeds DIR        Write feed snapshots into DIR instead of a database")
+    print("  --snapshots N      Snapshots to write (default: 12)")
+    print("  --interval MIN     Minutes between snapshots and update ticks (default: 5)")
+    print("")
+    print("Market options:")
+    print("  --volume N         Auctions listed at any time (default: 2000)")
+    print("  --churn F          Share of the listed auctions sold per day (default: 0.1)")
+    print("  --configs N        Distinct hardware configurations (default: 1500)")
+    print("  --cpu-mix P=W,...  Weight of CPUs whose name contains P (default: all equal)")
+    print("  --datacenters L=W,...  Weight of each location (default: FSN1=5,NBG1=2,HEL1=3)")
+    print("  --reduce-hours H   Hours between price reductions (default: 24)")
+    print("  --reduce-step P    Price reduction per step in percent (default: 3)")
+    print("  --floor P          Lowest price in percent of the start price (default: 60)")
+    print("  --seed N           Random seed (default: 1)")
+    print("")
+    print("Examples:")
+    print("  python generate_market.py /tmp/market.duckdb --years 3 --volume 20000")
+    print("  python generate_market.py --feeds /tmp/recording --volume 200000 --cpu-mix EPYC=4,Xeon=2")
+
+
+if __name__ == "__main__":
+    def option(flag, default=None):
+        if flag in sys.argv:
+            idx = sys.argv.index(flag)
+            if idx + 1 < len(sys.argv):
+                return sys.argv[idx + 1]
+        return default
+
+    flags = ('--years', '--feeds', '--snapshots', '--interval', '--volume', '--churn', '--configs',
+             '--cpu-mix', '--datacenters', '--reduce-hours', '--reduce-step', '--floor', '--seed')
+    values = {option(flag) for flag in flags}
+    args = [a for a in sys.argv[1:] if not a.startswith('--') and a not in values]
+    feeds = option('--feeds')
+    if not feeds and not args:
+        print_usage()
+        sys.exit(1)
+
+    market = {
+        'volume': int(option('--volume', 2000)),
+        'churn': float(option('--churn', 0.1)),
+        'configs': int(option('--configs', 1500)),
+        'cpu_mix': parse_weights(option('--cpu-mix')) if option('--cpu-mix') else {},
+        'datacenters': parse_weights(option('--datacenters', 'FSN1=5,NBG1=2,HEL1=3')),
+        'reduce_hours': float(option('--reduce-hours', 24)),
+        'reduce_step': float(option('--reduce-step', 3)) / 100,
+        'floor': float(option('--floor', 60)) / 100,
+        'seed': int(option('--seed', 1)),
+    }
+    interval = int(option('--interval', 5))
+
+    if feeds:
+        write_feeds(feeds, market, int(option('--snapshots', 12)), interval)
+    else:
+        build_database(args[0], market, float(option('--years', 2)), interval)
@@ -1,6 +1,66 @@
+"""
+Import an archive of gzipped auction snapshots into a DuckDB database
+
+By default every snapshot under <folder> is read at once into a flat server
+table, deduplicated to the latest record per auction per day.
+
+--rebuild instead builds a database in the current update_incremental.py
+schema (server_config and server_observation behind the server view, CPU
+enrichment, statistics rollups, price events and lifecycles), i.e. a working
+database for update_incremental.py. The snapshots are read in date-ordered
+chunks of files. While one chunk merges, worker cursors read and flatten the
+next ones into in-memory staging tables; the merges themselves run one at a
+time, in date order. Every chunk is merged like an update run, so each
+(id, day) keeps its latest record as the import goes. A chunk's merge and the
+checkpoint of its files commit together and roll back together on an error;
+an interrupted rebuild continues with the remaining files when run again.
+
+A folder of hourly Parquet files written by update_incremental.py
+--archive-dir (see snapshot_archive.py) is rebuilt the same way, a day of hour
+files per chunk, without parsing any JSON.
+
+Usage:
+    python import.py <folder> <database_name> [--rebuild] [--chunk-files N] [--memory-limit SIZE]
+"""
+
+import os
 import sys
+import glob
+import time
 import duckdb
 import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from update_incremental import (
+    RunMetrics,
+    create_temp_table_query,
+    create_touched_days_query,
+    import_auction_query,
+    ensure_schema,
+    merge_incoming,
+    load_cpu_specs,
+    enrich_cpu_data,
+    refresh_stats,
+    ensure_price_events,
+    ensure_lifecycle,
+    compact_database,
+    validate_database,
+)
+from snapshot_archive import archive_files, read_archive_query, sql_list
+
+# Snapshot files per rebuild chunk: a day of 5-minute snapshots
+DEFAULT_CHUNK_FILES = 288
+
+# Archive files per rebuild chunk: a day of hours
+DEFAULT_ARCHIVE_CHUNK_FILES = 24
+
+# Chunks read and flattened ahead of the one being merged, at most one per
+# core the merge leaves free
+PREFETCH_CHUNKS = 2
+
+# Where read-ahead chunks wait for their merge: in memory, so they never take
+# blocks in the database file
+STAGING_DATABASE = 'import_staging'
 
 create_table_query = """
 CREATE TEMP TABLE server_raw (
@@ -134,12 +194,68 @@ FROM CTE
 WHERE row_num = 1
 """
 
+# One chunk of snapshot files as the auction_feed table import_auction_query
+# reads. ram is read as JSON, so it is stored as the JSON text of the RAM
+# lines like the live feed's.
+read_snapshots_query = """
+CREATE OR REPLACE TEMP TABLE auction_feed AS
+  select *
+  from read_json(%s, format = 'auto', columns = {
+    id: 'UBIGINT',
+    information: 'VARCHAR[]',
+    cpu: 'VARCHAR',
+    cpu_count: 'INTEGER',
+    is_highio: 'BOOLEAN',
+    traffic: 'VARCHAR',
+    bandwidth: 'INTEGER',
+    ram: 'JSON',
+    ram_size: 'INTEGER',
+    price: 'DOUBLE',
+    hdd_arr: 'VARCHAR[]',
+    serverDiskData: 'STRUCT(nvme INTEGER[], sata INTEGER[], hdd INTEGER[], general INTEGER[])',
+    is_ecc: 'BOOLEAN',
+    datacenter: 'VARCHAR',
+    specials: 'VARCHAR[]',
+    fixed_price: 'BOOLEAN',
+    next_reduce_timestamp: 'INTEGER',
+    next_reduce: 'INTEGER'
+  })
+"""
+
+# One chunk of archive hour files as the auction_feed table. Only the latest
+# row per auction and day (the seen import_auction_query derives) can survive
+# the merge, so the others are dropped right away.
+read_archive_chunk_query = """
+CREATE OR REPLACE TEMP TABLE auction_feed AS
+SELECT * EXCLUDE (snapshot) FROM ({archived})
+QUALIFY ROW_NUMBER() OVER (
+    PARTITION BY id, date_trunc('d', TO_TIMESTAMP(next_reduce_timestamp - next_reduce)::TIMESTAMP)
+    ORDER BY next_reduce_timestamp - next_reduce DESC
+) = 1
+"""
+
+# Snapshot files already merged by an interrupted rebuild
+create_checkpoint_query = """
+CREATE TABLE IF NOT EXISTS import_checkpoint (
+    file VARCHAR PRIMARY KEY
+)
+"""
+
+
 def print_usage():
-    print("Usage: python import_to_duckdb.py <folder> <database_name>")
+    print("Usage: python import.py <folder> <database_name> [--rebuild] [--chunk-files N] [--memory-limit SIZE]")
+    print("")
+    print("Options:")
+    print("  --rebuild          Build a database in the current schema, chunk by chunk")
+    print(f"  --chunk-files N    Files merged per chunk (default: {DEFAULT_CHUNK_FILES} snapshots,")
+    print(f"                     {DEFAULT_ARCHIVE_CHUNK_FILES} archive hours)")
+    print("  --memory-limit S   DuckDB memory limit, e.g. 4GB; larger chunks spill to disk")
+    print("")
+    print("An interrupted rebuild resumes from its checkpoint when run again")
+    print("with the same database.")
 
 def import_json_files(folder, db_name):
     conn = duckdb.connect(db_name, config = {'threads': multiprocessing.cpu_count()})
-    conn.execute("PRAGMA force_compression='dictionary'")
     conn.execute("begin transaction")
     conn.execute(create_table_query)
     print("importing data")
@@ -152,8 +268,154 @@ def import_json_files(folder, db_name):
     print(conn.sql("select count(*) as num_records from server"))
     conn.close()
 
+
+def snapshot_files(folder: str) -> list:
+    """The archive's snapshot files in date order (their paths are timestamps)."""
+    return sorted(glob.glob(os.path.join(folder, '**', '*.json.gz'), recursive=True))
+
+
+def stage_chunk(cursor, table: str, chunk: list, archive: bool) -> int:
+    """Read and flatten a chunk of files into the staging table `table`; return its record count.
+
+    Runs on a worker cursor of its own, so its auction_feed and
+    server_incoming temp tables don't meet the merging connection's.
+    """
+    try:
+        if archive:
+            cursor.execute(read_archive_chunk_query.format(archived=read_archive_query.format(files=sql_list(chunk))))
+        else:
+            cursor.execute(read_snapshots_query % sql_list(chunk))
+        cursor.execute(create_temp_table_query)
+        records = cursor.execute(import_auction_query).fetchone()[0]
+        cursor.execute(f"CREATE TABLE {STAGING_DATABASE}.{table} AS FROM server_incoming")
+        return records
+    finally:
+        cursor.close()
+
+
+def rebuild_database(folder: str, db_name: str, chunk_files: int = None, memory_limit: str = None):
+    """Build a current-schema database from snapshots or a snapshot archive, one chunk of files per transaction.
+
+    Up to PREFETCH_CHUNKS chunks are staged ahead by stage_chunk() while the
+    current one merges (none on a single core, where they would only compete).
+    Merges and checkpoints commit strictly in date order; a failed chunk is
+    rolled back with its checkpoint rows, and the staging of later chunks is
+    abandoned, before the error propagates.
+    """
+    config = {'threads': multiprocessing.cpu_count()}
+    if memory_limit:
+        config['memory_limit'] = memory_limit
+
+    archive = archive_files(folder)
+    files = archive or snapshot_files(folder)
+    if not files:
+        print(f"Error: no *.json.gz snapshots or archive files under {folder}")
+        sys.exit(1)
+    chunk_files = chunk_files or (DEFAULT_ARCHIVE_CHUNK_FILES if archive else DEFAULT_CHUNK_FILES)
+
+    started = time.perf_counter()
+    conn = duckdb.connect(db_name, config=config)
+    try:
+        resuming = conn.execute("""
+            SELECT COUNT(*) > 0 FROM duckdb_tables()
+            WHERE database_name = current_database() AND table_name = 'import_checkpoint'
+        """).fetchone()[0]
+        if not resuming and conn.execute("""
+            SELECT COUNT(*) > 0 FROM duckdb_tables() WHERE database_name = current_database()
+        """).fetchone()[0]:
+            print(f"Error: {db_name} already holds data; --rebuild builds a new database")
+            sys.exit(1)
+
+        ensure_schema(conn)
+        conn.execute(create_checkpoint_query)
+        done = {file for file, in conn.execute("SELECT file FROM import_checkpoint").fetchall()}
+        pending = [file for file in files if file not in done]
+        print(f"{'Archive' if archive else 'Snapshot'} files: {len(files)} "
+              f"({len(done)} already imported, {len(pending)} to go)")
+
+        # A transaction writes to one database only: staging tables are
+        # created by the workers and dropped after their chunk commits
+        conn.execute(f"ATTACH ':memory:' AS {STAGING_DATABASE}")
+        chunks = [pending[offset:offset + chunk_files] for offset in range(0, len(pending), chunk_files)]
+        prefetch = min(PREFETCH_CHUNKS, multiprocessing.cpu_count() - 1)
+        staged = []
+        imported = 0
+        with ThreadPoolExecutor(max_workers=max(1, prefetch)) as pool:
+            try:
+                for index, chunk in enumerate(chunks):
+                    # Keep the next chunks staging while this one merges
+                    for ahead in range(len(staged), min(index + prefetch + 1, len(chunks))):
+                        staged.append(pool.submit(stage_chunk, conn.cursor(), f"chunk_{ahead}", chunks[ahead], archive))
+                    records = staged[index].result()
+
+                    metrics = RunMetrics()
+                    conn.execute("BEGIN TRANSACTION")
+                    try:
+                        conn.execute(create_touched_days_query)
+                        # merge_incoming reads the staged rows in place
+                        conn.execute(f"CREATE OR REPLACE TEMP VIEW server_incoming AS "
+                                     f"FROM {STAGING_DATABASE}.chunk_{index}")
+                        merge_incoming(conn, metrics)
+                        conn.execute("INSERT INTO import_checkpoint SELECT unnest(?::VARCHAR[])", [chunk])
+                        conn.execute("COMMIT")
+                    except Exception as e:
+                        conn.execute("ROLLBACK")
+                        raise e
+                    conn.execute(f"DROP TABLE {STAGING_DATABASE}.chunk_{index}")
+
+                    imported += len(chunk)
+                    elapsed = time.perf_counter() - started
+                    print(f"  [{len(done) + imported}/{len(files)}] {os.path.relpath(chunk[0], folder)} .. "
+                          f"{os.path.relpath(chunk[-1], folder)}: {records} records, "
+                          f"{metrics.rows.get('inserted', 0)} new observations "
+                          f"({elapsed:.1f}s, {imported / elapsed:.1f} files/s)")
+            finally:
+                # Chunks not started yet are dropped; running ones finish before the pool closes
+                for future in staged:
+                    future.cancel()
+        conn.execute("DROP VIEW IF EXISTS server_incoming")
+        conn.execute(f"DETACH {STAGING_DATABASE}")
+
+        print("Enriching, computing statistics, price events and lifecycles...")
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            enrich_cpu_data(conn, load_cpu_specs())
+            refresh_stats(conn, full=True)
+            ensure_price_events(conn)
+            ensure_lifecycle(conn)
+            conn.execute("DROP TABLE import_checkpoint")
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            raise e
+    finally:
+        conn.close()
+
+    compact_database(db_name)
+    is_valid, error, stats = validate_database(db_name)
+    if not is_valid:
+        print(f"Error: {error}")
+        sys.exit(1)
+    print(f"Rebuilt {db_name} in {time.perf_counter() - started:.1f}s: "
+          f"{stats['auctions']} auction observations over {stats['days']} days")
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
+    def option(flag):
+        if flag in sys.argv:
+            idx = sys.argv.index(flag)
+            if idx + 1 < len(sys.argv):
+                return sys.argv[idx + 1]
+        return None
+
+    chunk_files = option('--chunk-files')
+    memory_limit = option('--memory-limit')
+    args = [a for a in sys.argv[1:] if not a.startswith('--') and a not in (chunk_files, memory_limit)]
+    if len(args) != 2:
         print_usage()
+        sys.exit(1)
+
+    if '--rebuild' in sys.argv:
+        rebuild_database(args[0], args[1], int(chunk_files) if chunk_files else None, memory_limit)
     else:
-        import_json_files(sys.argv[1], sys.argv[2])
+        import_json_files(args[0], args[1])
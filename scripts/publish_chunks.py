@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Publish a database as content-addressed chunks
+
+Splits a file into content-defined chunks and stores each chunk under its
+SHA-256 next to a manifest listing the chunks in order. Publishing diffs
+against the previous manifest and only writes chunks the store does not hold
+yet, so only the parts of the file a tick changed are transferred.
+
+Chunk boundaries fall where a rolling hash over the last CHUNK_WINDOW bytes
+matches, so they follow the content rather than file offsets: data that
+moved (as it does when compact_database() rewrites the file) still cuts into
+the same chunks. Fixed, block-aligned chunks only match while every block
+stays where it was.
+
+The store is a plain directory standing in for the bucket:
+
+    <store>/chunks/<sha256>
+    <store>/manifests/<name>.json
+
+Usage:
+    python publish_chunks.py <file> <store_dir> [--name NAME]
+    python publish_chunks.py <file> <store_dir> --restore <output_file> [--name NAME]
+    python publish_chunks.py <store_dir> --gc
+
+Options:
+    --name NAME        Manifest name (default: the file name)
+    --restore OUTPUT   Reassemble the published file into OUTPUT and verify it
+    --gc               Delete chunks no manifest references any more
+
+Example:
+    python publish_chunks.py ../static/sb.duckdb.wasm /tmp/bucket
+"""
+
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Average, smallest and largest chunk. The average is a power of two: a
+# boundary is where the low bits of the window hash are all zero.
+CHUNK_AVERAGE = 16 * 1024
+CHUNK_MIN = 4 * 1024
+CHUNK_MAX = 64 * 1024
+CHUNK_WINDOW = 64
+MANIFEST_VERSION = 2
+
+# Bytes hashed per numpy pass, to bound the temporary arrays
+HASH_SEGMENT = 1024 * 1024
+
+# Random value per byte, summed over the window. Derived from SHA-256 so the
+# boundaries never change with the numpy version.
+GEAR = np.array(
+    [int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], 'little') for value in range(256)],
+    dtype=np.uint64,
+)
+
+
+def chunk_path(store_dir: str, digest: str) -> str:
+    return os.path.join(store_dir, 'chunks', digest)
+
+
+def manifest_path(store_dir: str, name: str) -> str:
+    return os.path.join(store_dir, 'manifests', f"{name}.json")
+
+
+def load_manifest(store_dir: str, name: str) -> dict | None:
+    try:
+        with open(manifest_path(store_dir, name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def candidate_cuts(data: bytes):
+    """Yield the offsets right after every window whose hash marks a boundary."""
+    mask = np.uint64(CHUNK_AVERAGE - 1)
+    for start in range(CHUNK_WINDOW, len(data), HASH_SEGMENT):
+        end = min(len(data), start + HASH_SEGMENT)
+        # Sums over uint64 wrap around, so window sums are differences of the running sum
+        window = np.frombuffer(data, np.uint8, count=end - start + CHUNK_WINDOW, offset=start - CHUNK_WINDOW)
+        running = np.cumsum(GEAR[window], dtype=np.uint64)
+        hashes = running[CHUNK_WINDOW:] - running[:-CHUNK_WINDOW]
+        yield from (np.flatnonzero((hashes & mask) == 0) + start + 1).tolist()
+
+
+def iter_chunks(path: str):
+    """Yield (digest, data) for each content-defined chunk of a file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    start = 0
+    for cut in [*candidate_cuts(data), len(data)]:
+        while cut - start > CHUNK_MAX:
+            chunk = data[start:start + CHUNK_MAX]
+            yield hashlib.sha256(chunk).hexdigest(), chunk
+            start += CHUNK_MAX
+        if cut - start >= CHUNK_MIN or (cut == len(data) and cut > start):
+            chunk = data[start:cut]
+            yield hashlib.sha256(chunk).hexdigest(), chunk
+            start = cut
+
+
+def write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def publish(path: str, store_dir: str, name: str | None = None) -> dict:
+    """
+    Publish a file into the chunk store, writing only chunks it doesn't hold.
+
+    The manifest is written last, so readers never see a manifest whose chunks
+    are missing.
+
+    Returns:
+        dict: chunk and byte counts of the file and of what was written
+    """
+    name = name or os.path.basename(path)
+    previous = load_manifest(store_dir, name)
+    previous_chunks = set(previous['chunks']) if previous else set()
+
+    chunks = []
+    file_hash = hashlib.sha256()
+    written_chunks = 0
+    written_bytes = 0
+    size = 0
+    for digest, data in iter_chunks(path):
+        chunks.append(digest)
+        file_hash.update(data)
+        size += len(data)
+        # The previous manifest answers most lookups without touching the store
+        if digest in previous_chunks or os.path.exists(chunk_path(store_dir, digest)):
+            continue
+        write_atomic(chunk_path(store_dir, digest), data)
+        written_chunks += 1
+        written_bytes += len(data)
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'name': name,
+        'published_at': datetime.now(timezone.utc).isoformat(),
+        'size': size,
+        'sha256': file_hash.hexdigest(),
+        'chunking': {'average': CHUNK_AVERAGE, 'min': CHUNK_MIN, 'max': CHUNK_MAX, 'window': CHUNK_WINDOW},
+        'chunks': chunks,
+    }
+    write_atomic(manifest_path(store_dir, name), (json.dumps(manifest, indent=1) + "\n").encode())
+
+    # Chunks of the new file that the previous version did not have, including
+    # ones another manifest had already stored
+    changed_chunks = sum(1 for digest in set(chunks) if digest not in previous_chunks)
+    print(f"Published {name}: {size / (1024 * 1024):.1f} MiB in {len(chunks)} chunks")
+    print(f"  Changed since previous version: {changed_chunks} chunks")
+    print(f"  Written to store: {written_chunks} chunks, {written_bytes / 1024:.0f} KiB "
+          f"({written_bytes / size if size else 0:.1%} of the file)")
+
+    return {
+        'size': size,
+        'chunks': len(chunks),
+        'changed_chunks': changed_chunks,
+        'written_chunks': written_chunks,
+        'written_bytes': written_bytes,
+    }
+
+
+def restore(store_dir: str, name: str, output_path: str):
+    """Reassemble a published file from its manifest and verify every hash."""
+    manifest = load_manifest(store_dir, name)
+    if manifest is None:
+        raise ValueError(f"No manifest for {name} in {store_dir}")
+
+    file_hash = hashlib.sha256()
+    with open(output_path + '.tmp', 'wb') as out:
+        for digest in manifest['chunks']:
+            with open(chunk_path(store_dir, digest), 'rb') as f:
+                data = f.read()
+            if hashlib.sha256(data).hexdigest() != digest:
+                raise ValueError(f"Chunk {digest} is corrupt")
+            file_hash.update(data)
+            out.write(data)
+
+    if file_hash.hexdigest() != manifest['sha256']:
+        os.remove(output_path + '.tmp')
+        raise ValueError(f"Restored {name} does not match its manifest checksum")
+    os.replace(output_path + '.tmp', output_path)
+    print(f"Restored {name} to {output_path} ({manifest['size']} bytes, checksum OK)")
+
+
+def collect_garbage(store_dir: str) -> int:
+    """Delete chunks that no manifest references. Returns the number removed."""
+    referenced = set()
+    manifests_dir = os.path.join(store_dir, 'manifests')
+    for entry in os.listdir(manifests_dir):
+        if entry.endswith('.json'):
+            referenced.update(load_manifest(store_dir, entry[:-len('.json')])['chunks'])
+
+    removed = 0
+    freed = 0
+    chunks_dir = os.path.join(store_dir, 'chunks')
+    for digest in os.listdir(chunks_dir):
+        if digest not in referenced:
+            path = os.path.join(chunks_dir, digest)
+            freed += os.path.getsize(path)
+            os.remove(path)
+            removed += 1
+    print(f"Removed {removed} unreferenced chunks ({freed / 1024:.0f} KiB)")
+    return removed
+
+
+def print_usage():
+    print("Usage: python publish_chunks.py <file> <store_dir> [--name NAME]")
+    print("       python publish_chunks.py <file> <store_dir> --restore <output_file> [--name NAME]")
+    print("       python publish_chunks.py <store_dir> --gc")
+
+
+if __name__ == "__main__":
+    def option(flag):
+        if flag in sys.argv:
+            idx = sys.argv.index(flag)
+            if idx + 1 < len(sys.argv):
+                return sys.argv[idx + 1]
+        return None
+
+    name = option('--name')
+    output = option('--restore')
+    args = [a for a in sys.argv[1:] if not a.startswith('--') and a not in (name, output)]
+
+    if '--gc' in sys.argv:
+        if len(args) < 1:
+            print_usage()
+            sys.exit(1)
+        collect_garbage(args[0])
+        sys.exit(0)
+
+    if len(args) < 2:
+        print_usage()
+        sys.exit(1)
+
+    if output:
+        restore(args[1], name or os.path.basename(args[0]), output)
+    else:
+        publish(args[0], args[1], name)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Archive the fetched auction feeds as hourly Parquet
+
+The database keeps one record per auction per day, so the snapshots behind it
+are lost once merged. With --archive-dir, update_incremental.py appends each
+auction feed it imports to an archive of one Parquet file per hour
+(YYYYMMDD/HH.parquet, ZSTD), holding the flattened feed - the auction_feed
+table import_auction_query maps - of every snapshot in that hour.
+
+Snapshots are stored as changes. Each one lists all of its auctions with the
+timer columns, which move on every snapshot, but the other columns only where
+they differ from the auction's previous row in the same file; they are NULL
+otherwise, and `since` names the snapshot whose row holds them (a row stored
+in full has since = snapshot). The first snapshot of an hour is stored in
+full, so every file can be read on its own. read_archive_query restores the full rows, and
+import.py --rebuild builds a database from an archive. The date directories
+are the ones purge.py expires.
+
+Usage:
+    python snapshot_archive.py <archive_dir>
+
+Prints the archive's hours, snapshots, rows and size.
+"""
+
+import os
+import sys
+import glob
+import duckdb
+
+ARCHIVE_COMPRESSION = "zstd"
+
+# Stored for every auction of every snapshot; the rest only when it changed
+KEY_COLUMNS = ('id', 'next_reduce_timestamp', 'next_reduce')
+
+# A snapshot's time: the latest seen its records carry (see import_auction_query)
+snapshot_time_query = """
+SELECT MAX(TO_TIMESTAMP(next_reduce_timestamp - next_reduce))::TIMESTAMP FROM {table}
+"""
+
+# The archived rows of `files` as auction_feed rows plus their snapshot: the
+# rows stored in full as they are, the others with the columns of the full row
+# they point to. Snapshots are unique across files, so (id, since) identifies
+# that row. The files are scanned twice, which is cheaper than buffering them.
+read_archive_query = """
+WITH archived AS NOT MATERIALIZED (
+    SELECT * FROM read_parquet({files}, union_by_name = true)
+),
+stored AS (
+    SELECT * FROM archived WHERE snapshot = since
+)
+SELECT * EXCLUDE (since) FROM stored
+UNION ALL BY NAME
+SELECT
+    a.snapshot,
+    a.id,
+    a.next_reduce_timestamp,
+    a.next_reduce,
+    c.* EXCLUDE (snapshot, since, id, next_reduce_timestamp, next_reduce)
+FROM archived a
+JOIN stored c ON c.id = a.id AND c.snapshot = a.since
+WHERE a.snapshot <> a.since
+"""
+
+archive_summary_query = """
+SELECT
+    COUNT(DISTINCT filename) AS hours,
+    COUNT(DISTINCT snapshot) AS snapshots,
+    COUNT(*) AS rows,
+    COUNT(*) FILTER (WHERE snapshot = since) AS changed,
+    MIN(snapshot) AS first,
+    MAX(snapshot) AS last
+FROM read_parquet({files}, union_by_name = true, filename = true)
+"""
+
+
+def sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def sql_list(values: list) -> str:
+    return "[" + ", ".join(sql_string(value) for value in values) + "]"
+
+
+def archive_path(archive_dir: str, snapshot) -> str:
+    return os.path.join(archive_dir, snapshot.strftime('%Y%m%d'), snapshot.strftime('%H') + '.parquet')
+
+
+def archive_files(archive_dir: str) -> list:
+    """The archive's hour files in date order."""
+    return sorted(glob.glob(os.path.join(archive_dir, '*', '*.parquet')))
+
+
+def archive_snapshot(conn, archive_dir: str, table: str = 'auction_feed') -> int:
+    """Append the flattened feed in `table` to its hour's archive file.
+
+    The file is rewritten through a temporary file, so it is always either the
+    previous or the new version. Returns the rows stored in full (auctions new
+    to the hour or changed); 0 as well when the snapshot is archived already.
+    """
+    snapshot = conn.execute(snapshot_time_query.format(table=table)).fetchone()[0]
+    if snapshot is None:
+        return 0
+    path = archive_path(archive_dir, snapshot)
+    stored = sql_string(path)
+    columns = [name for name, in conn.execute(f"SELECT column_name FROM (DESCRIBE {table})").fetchall()]
+    content = [name for name in columns if name not in KEY_COLUMNS]
+
+    previous = None
+    if os.path.exists(path):
+        if conn.execute(f"SELECT COUNT(*) > 0 FROM read_parquet({stored}) "
+                        f"WHERE snapshot = TIMESTAMP '{snapshot}'").fetchone()[0]:
+            return 0
+        archived = {name for name, in conn.execute(
+            f"SELECT column_name FROM (DESCRIBE SELECT * FROM read_parquet({stored}))").fetchall()}
+        # A reshaped feed is stored in full until the next hour
+        if set(content) <= archived:
+            previous = f"""
+                SELECT * FROM read_parquet({stored}) WHERE snapshot = since
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY snapshot DESC) = 1
+            """
+
+    # The snapshot each auction's columns are stored with: this one when new or
+    # changed, else the one holding its previous full row
+    if previous:
+        since = ("CASE WHEN p.id IS NULL OR (" + ", ".join(f'f."{name}"' for name in content) + ") "
+                 "IS DISTINCT FROM (" + ", ".join(f'p."{name}"' for name in content) + ") "
+                 f"THEN TIMESTAMP '{snapshot}' ELSE p.snapshot END")
+        source = f"{table} f LEFT JOIN ({previous}) p ON p.id = f.id"
+    else:
+        since = f"TIMESTAMP '{snapshot}'"
+        source = f"{table} f"
+
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE archive_snapshot AS
+        SELECT
+            snapshot,
+            since,
+            {", ".join(f'"{name}"' for name in KEY_COLUMNS)},
+            {", ".join(f'CASE WHEN since = snapshot THEN "{name}" END AS "{name}"' for name in content)}
+        FROM (SELECT TIMESTAMP '{snapshot}' AS snapshot, {since} AS since, f.* FROM {source})
+    """)
+    rows = conn.execute("SELECT COUNT(*) FILTER (WHERE since = snapshot) FROM archive_snapshot").fetchone()[0]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    existing = f"SELECT * FROM read_parquet({stored}) UNION ALL BY NAME " if os.path.exists(path) else ""
+    conn.execute(f"""
+        COPY (
+            SELECT * FROM ({existing}SELECT * FROM archive_snapshot)
+            ORDER BY snapshot, id
+        ) TO {sql_string(tmp_path)} (FORMAT parquet, COMPRESSION {ARCHIVE_COMPRESSION})
+    """)
+    os.replace(tmp_path, path)
+    conn.execute("DROP TABLE archive_snapshot")
+    return rows
+
+
+def print_usage():
+    print("Usage: python snapshot_archive.py <archive_dir>")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print_usage()
+        sys.exit(1)
+
+    files = archive_files(sys.argv[1])
+    if not files:
+        print(f"No archive files under {sys.argv[1]}")
+        sys.exit(1)
+
+    hours, snapshots, rows, changed, first, last = duckdb.connect().execute(
+        archive_summary_query.format(files=sql_list(files))).fetchone()
+    size = sum(os.path.getsize(path) for path in files)
+    print(f"{hours} hours, {snapshots} snapshots from {first} to {last}")
+    print(f"{rows} auction rows, {changed} stored in full ({changed / rows:.1%})")
+    print(f"{size / (1024 * 1024):.1f} MiB, {size / snapshots / 1024:.1f} KiB per snapshot")
@@ -0,0 +1,98 @@
+"""Backfills from a local SQLite copy of D1 into a database the fixtures updated."""
+
+import sqlite3
+from datetime import date, timedelta
+
+import duckdb
+
+from backfill_from_d1 import D1_COLUMNS, backfill, sqlite_source
+from test_update import run_tick
+
+
+def write_d1(path: str, rows: list):
+    """A D1 auctions table holding `rows`, given as {column: value} over D1_COLUMNS."""
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE auctions ({', '.join(D1_COLUMNS)})")
+    conn.executemany(
+        f"INSERT INTO auctions VALUES ({', '.join('?' for _ in D1_COLUMNS)})",
+        [[row.get(column) for column in D1_COLUMNS] for row in rows],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_backfill_extends_price_events(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+
+    conn = duckdb.connect(db_path)
+    (auction_id, seen, price), (dropped_id, _, dropped_price) = conn.execute("""
+        SELECT id, seen, price FROM server WHERE server_type = 'auction' ORDER BY id LIMIT 2
+    """).fetchall()
+    # A live run saw this one drop earlier on the stored day
+    conn.execute("INSERT INTO price_event VALUES (?, ?, ?, ?)",
+                 [dropped_id, seen - timedelta(hours=1), dropped_price + 3, dropped_price])
+    conn.close()
+
+    # Two earlier days of a stored auction, one of the other, and an auction only D1 knows
+    def d1_row(id, days_before, price):
+        return {
+            'id': id, 'cpu': 'Intel Core i7-6700', 'ram_size': 64, 'price': price,
+            'seen': f"{seen.date() - timedelta(days=days_before)} 12:00:00",
+        }
+    d1_path = str(tmp_path / 'd1.sqlite')
+    write_d1(d1_path, [
+        d1_row(auction_id, 2, price + 10),
+        d1_row(auction_id, 1, price + 5),
+        d1_row(dropped_id, 1, dropped_price + 7),
+        d1_row(1, 1, 40),
+    ])
+
+    backfill(db_path, sqlite_source(d1_path), days=(date.today() - seen.date()).days + 3, workers=1)
+
+    conn = duckdb.connect(db_path)
+    day = seen.replace(hour=0, minute=0, second=0)
+    assert conn.execute("SELECT ts, old_price, new_price FROM price_event WHERE id = ? ORDER BY ts",
+                        [auction_id]).fetchall() == [
+        (day - timedelta(hours=12), price + 10, price + 5),
+        (day, price + 5, price),
+    ]
+    # The merged price leads into the one the live events start from
+    assert conn.execute("SELECT ts, old_price, new_price FROM price_event WHERE id = ? ORDER BY ts",
+                        [dropped_id]).fetchall() == [
+        (day, dropped_price + 7, dropped_price + 3),
+        (seen - timedelta(hours=1), dropped_price + 3, dropped_price),
+    ]
+    assert conn.execute("SELECT seen, price FROM server_last_price WHERE id = ?", [auction_id]).fetchone() \
+        == (seen, price)
+    assert conn.execute("SELECT price FROM server_last_price WHERE id = 1").fetchone() == (40,)
+    conn.close()
+
+
+def test_backfill_rebuilds_lifecycles(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+
+    conn = duckdb.connect(db_path)
+    auction_id, seen, price = conn.execute("""
+        SELECT id, seen, price FROM server WHERE server_type = 'auction' ORDER BY id LIMIT 1
+    """).fetchone()
+    conn.close()
+
+    earlier = seen.date() - timedelta(days=1)
+    d1_path = str(tmp_path / 'd1.sqlite')
+    write_d1(d1_path, [
+        {'id': auction_id, 'price': price + 5, 'seen': f"{earlier} 12:00:00"},
+        {'id': 1, 'price': 40, 'seen': f"{earlier} 12:00:00"},
+    ])
+    backfill(db_path, sqlite_source(d1_path), days=(date.today() - seen.date()).days + 2, workers=1)
+
+    conn = duckdb.connect(db_path)
+    listed_at = seen.replace(hour=0, minute=0, second=0) - timedelta(hours=12)
+    assert conn.execute("""
+        SELECT first_seen, first_price, last_seen, observations, gone_at FROM server_lifecycle WHERE id = ?
+    """, [auction_id]).fetchone() == (listed_at, price + 5, seen, 2, None)
+    # An auction only the history has is gone since the next run
+    assert conn.execute("SELECT first_seen, gone_at FROM server_lifecycle WHERE id = 1").fetchone() \
+        == (listed_at, seen)
+    conn.close()
@@ -0,0 +1,45 @@
+"""Re-enrichment of the CPU columns after the specs change."""
+
+import duckdb
+
+import update_incremental
+from test_update import run_tick
+from update_incremental import reenrich_database
+
+SPECS = {
+    'AMD Ryzen 5 3600': {'cores': 6, 'threads': 12, 'score': 100, 'multicore_score': 600, 'family': 'Zen 2'},
+    'Intel Core i5-13500': {'cores': 99, 'threads': 99, 'score': 200, 'multicore_score': 900, 'family': 'Raptor Lake'},
+}
+
+
+def cpu_columns(db_path: str, where: str) -> list:
+    conn = duckdb.connect(db_path, read_only=True)
+    rows = conn.execute(f"""
+        SELECT DISTINCT cpu_cores, cpu_threads, cpu_generation, cpu_score FROM server_config WHERE {where}
+    """).fetchall()
+    conn.close()
+    return rows
+
+
+def test_reenrich_starts_over_from_the_feed_values(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+
+    # A standard product the feed sent without CPU details, enriched from an
+    # outdated spec
+    conn = duckdb.connect(db_path)
+    conn.execute("""
+        UPDATE server_config SET
+            cpu_feed = struct_pack(cores := NULL::INTEGER, threads := NULL::INTEGER, generation := NULL::VARCHAR),
+            cpu_cores = 4, cpu_threads = 8, cpu_generation = 'outdated'
+        WHERE server_type = 'standard' AND cpu LIKE '%3600'
+    """)
+    conn.close()
+
+    monkeypatch.setattr(update_incremental, 'load_cpu_specs', lambda: SPECS)
+    reenrich_database(db_path)
+
+    assert cpu_columns(db_path, "server_type = 'standard' AND cpu LIKE '%3600'") == [(6, 12, 'Zen 2', 100)]
+    assert cpu_columns(db_path, "server_type = 'auction' AND cpu LIKE '%3600'") == [(6, 12, 'Zen 2', 100)]
+    # Values the feed provided win over the specs
+    assert cpu_columns(db_path, "server_type = 'standard' AND cpu LIKE '%13500'") == [(14, 20, 'Raptor Lake', 200)]
@@ -0,0 +1,37 @@
+"""Incremental Parquet export of a database updated from the sample feeds."""
+
+import datetime
+
+import duckdb
+
+from export_parquet import export_parquet
+from test_update import run_tick
+from update_incremental import refresh_stats
+
+
+def test_only_touched_days_are_fingerprinted(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    output_dir = str(tmp_path / 'parquet')
+    run_tick(db_path)
+
+    first = export_parquet(db_path, output_dir)
+    assert first['written'] > 0
+    assert export_parquet(db_path, output_dir) == {
+        'written': 0, 'unchanged': first['written'], 'removed': 0, 'bytes_written': 0,
+    }
+
+    # A price change keeps the day's count, so only listing the day finds it
+    conn = duckdb.connect(db_path)
+    day = conn.execute("SELECT seen::DATE FROM server WHERE id = 2793451").fetchone()[0]
+    conn.execute("UPDATE server_observation SET price = price + 1 WHERE id = 2793451")
+    conn.close()
+    assert export_parquet(db_path, output_dir, days=[])['written'] == 0
+    assert export_parquet(db_path, output_dir, days=[day - datetime.timedelta(days=1)])['written'] == 0
+    assert export_parquet(db_path, output_dir, days=[day])['written'] == 1
+
+    # A day whose record count moved is rewritten without being listed
+    conn = duckdb.connect(db_path)
+    conn.execute("DELETE FROM server_observation WHERE id = 2793451")
+    refresh_stats(conn, full=True)
+    conn.close()
+    assert export_parquet(db_path, output_dir, days=[])['written'] == 1
@@ -0,0 +1,65 @@
+"""Retries of fetch_hetzner_data() against a local stand-in for the API."""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import update_incremental
+from conftest import FIXTURES
+from update_incremental import AUCTION_FEED_FILE, fetch_hetzner_data
+
+with open(os.path.join(FIXTURES, AUCTION_FEED_FILE), 'rb') as f:
+    FEED = f.read()
+
+
+def serve(responses: list):
+    """Serve `responses` in turn: (status, body, announced length) per request."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body, length = responses[min(len(requests_seen), len(responses) - 1)]
+            requests_seen.append(self.path)
+            self.send_response(status)
+            self.send_header('Content-Length', str(length))
+            self.end_headers()
+            self.wfile.write(body)
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/{AUCTION_FEED_FILE}", requests_seen
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(update_incremental, 'FETCH_BACKOFF', 0)
+
+
+def test_truncated_body_is_retried():
+    server, url, seen = serve([(200, FEED[:36], 5000), (200, FEED, len(FEED))])
+    try:
+        spool_path, validators = fetch_hetzner_data(url, "auction servers")
+    finally:
+        server.shutdown()
+        server.server_close()
+    os.remove(spool_path)
+    assert len(seen) == 2
+    assert validators['content_hash']
+
+
+def test_client_error_is_not_retried():
+    server, url, seen = serve([(404, b'', 0)])
+    try:
+        with pytest.raises(requests.HTTPError):
+            fetch_hetzner_data(url, "auction servers")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(seen) == 1
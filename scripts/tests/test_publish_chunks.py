@@ -0,0 +1,24 @@
+"""Content-defined chunk publishing against a local directory store."""
+
+import random
+
+from publish_chunks import CHUNK_MAX, publish, restore
+
+
+def test_shifted_content_reuses_chunks(tmp_path):
+    store = str(tmp_path / 'store')
+    path = tmp_path / 'sb.duckdb'
+    data = random.Random(7).randbytes(2 * 1024 * 1024)
+    path.write_bytes(data)
+    first = publish(str(path), store)
+    assert first['written_bytes'] == len(data)
+
+    # Bytes inserted near the start move everything after them
+    path.write_bytes(data[:1000] + b'inserted' + data[1000:])
+    second = publish(str(path), store)
+    assert second['written_chunks'] <= 2
+    assert second['written_bytes'] <= 2 * CHUNK_MAX
+
+    restored = tmp_path / 'restored.duckdb'
+    restore(store, 'sb.duckdb', str(restored))
+    assert restored.read_bytes() == path.read_bytes()
@@ -0,0 +1,56 @@
+"""The SQL feed mappings against the per-record reference transforms.
+
+The fixtures are small feeds in the live shape (live_data_sb.json and
+live_data_en_EUR.json), with the optional keys, empty values and odd names
+the mappings have to agree on.
+"""
+
+import os
+
+import duckdb
+import pytest
+
+from bench_transform import import_batch, import_reference
+from conftest import FIXTURES
+from update_incremental import (
+    AUCTION_FEED_FILE, AUCTION_FEED_REQUIRED, STANDARD_FEED_FILE, auction_feed_query, load_feed,
+    spool_feed,
+)
+
+
+@pytest.mark.parametrize('feed, name', [('auction', AUCTION_FEED_FILE), ('standard', STANDARD_FEED_FILE)])
+def test_sql_mapping_matches_reference(feed, name, tmp_path):
+    path = os.path.join(FIXTURES, name)
+    conn = duckdb.connect()
+    # One transaction, so NOW() (the standard servers' seen) is the same
+    conn.execute("BEGIN TRANSACTION")
+
+    records = import_reference(conn, feed, path)
+    conn.execute("CREATE TEMP TABLE reference_incoming AS SELECT * FROM server_incoming")
+    assert import_batch(conn, feed, path, str(tmp_path / 'spool.json')) == records
+
+    reference = conn.execute("SELECT COUNT(*) FROM reference_incoming").fetchone()[0]
+    only_reference = conn.execute(
+        "SELECT * FROM reference_incoming EXCEPT ALL SELECT * FROM server_incoming").fetchall()
+    only_batch = conn.execute(
+        "SELECT * FROM server_incoming EXCEPT ALL SELECT * FROM reference_incoming").fetchall()
+    conn.close()
+
+    assert reference >= records > 0
+    assert only_reference == []
+    assert only_batch == []
+
+
+def test_empty_feed_is_refused(tmp_path):
+    path = str(tmp_path / 'spool.json')
+    spool_feed([b'{"server": [', b']}\n'], path)
+    conn = duckdb.connect()
+    with pytest.raises(ValueError, match='empty feed'):
+        load_feed(conn, 'auction_feed', auction_feed_query, path, AUCTION_FEED_REQUIRED)
+    conn.close()
+
+
+def test_spool_refuses_other_documents(tmp_path):
+    path = str(tmp_path / 'spool.json')
+    with pytest.raises(ValueError, match='Malformed feed'):
+        spool_feed([b'{"meta": {}, "server": []}'], path)
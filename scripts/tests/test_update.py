@@ -0,0 +1,164 @@
+"""Update runs against the sample feeds in tests/fixtures."""
+
+import os
+
+import duckdb
+
+from conftest import FIXTURES
+from update_incremental import (
+    AUCTION_FEED_FILE,
+    FILE_HEADER_SIZE,
+    STANDARD_FEED_FILE,
+    RunMetrics,
+    read_feed_file,
+    run_update,
+    update_database,
+    validate_database,
+)
+
+
+def run_tick(db_path: str, auction: bool = True, standard: bool = True):
+    """One update from the fixture feeds; a feed left out counts as unchanged."""
+    feeds = []
+    for enabled, name, label in ((auction, AUCTION_FEED_FILE, "auction servers"),
+                                 (standard, STANDARD_FEED_FILE, "standard servers")):
+        feeds.append(read_feed_file(os.path.join(FIXTURES, name), label)[0] if enabled else None)
+    try:
+        # The fixtures are dated, so nothing is purged
+        update_database(db_path, *feeds, retention_days=0)
+    finally:
+        for spool_path in feeds:
+            if spool_path is not None:
+                os.remove(spool_path)
+
+
+def test_rollups_count_every_record(tmp_path, capsys):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+    # A tick where only the auctions changed refreshes the standard servers' seen
+    run_tick(db_path, standard=False)
+
+    conn = duckdb.connect(db_path, read_only=True)
+    observations = conn.execute("SELECT COUNT(*) FROM server_observation").fetchone()[0]
+    mismatched = conn.execute("""
+        SELECT * FROM (
+            SELECT day, server_type, location, datacenter, records FROM stats_daily_volume
+            EXCEPT ALL
+            SELECT seen::DATE, server_type, location, datacenter, COUNT(*) FROM server GROUP BY ALL
+        )
+    """).fetchall()
+    # The fixture lists one standard product twice in a datacenter
+    duplicated = conn.execute("""
+        SELECT COUNT(*) FROM (SELECT id FROM server_observation GROUP BY id, seen::DATE HAVING COUNT(*) > 1)
+    """).fetchone()[0]
+    conn.close()
+
+    assert duplicated > 0
+    assert mismatched == []
+
+    capsys.readouterr()
+    is_valid, error, stats = validate_database(db_path)
+    assert is_valid, error
+    assert stats['total'] == observations
+    assert "validating with a full scan" not in capsys.readouterr().out
+
+
+def test_config_columns_migrate_together(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+    conn = duckdb.connect(db_path)
+    conn.execute("ALTER TABLE server_config DROP COLUMN config_key")
+    conn.execute("ALTER TABLE server_config DROP COLUMN cpu_feed")
+    conn.close()
+
+    # Both columns come back in the same transaction as the merge
+    run_tick(db_path)
+
+    conn = duckdb.connect(db_path, read_only=True)
+    missing = conn.execute("""
+        SELECT COUNT(*) FILTER (WHERE config_key IS NULL),
+            COUNT(*) FILTER (WHERE server_type = 'standard' AND cpu_feed IS NULL)
+        FROM server_config
+    """).fetchone()
+    conn.close()
+    assert missing == (0, 0)
+
+def test_purge_drops_orphaned_configs(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+    # Only the auction without a timer (seen at the epoch) is old enough
+    update_database(db_path, retention_days=1)
+
+    conn = duckdb.connect(db_path, read_only=True)
+    configs = {row[0] for row in conn.execute("SELECT id FROM server_config").fetchall()}
+    observed = {row[0] for row in conn.execute("SELECT id FROM server_observation").fetchall()}
+    conn.close()
+    assert 2830178 not in configs
+    assert configs == observed
+
+
+def table_types(db_path: str) -> dict:
+    conn = duckdb.connect(db_path, read_only=True)
+    tables = dict(conn.execute("SELECT table_name, table_type FROM information_schema.tables").fetchall())
+    conn.close()
+    return tables
+
+
+def test_update_runs_in_place(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_update(db_path, RunMetrics(), 0, skip_threshold_check=True, force=False, feed_dir=FIXTURES)
+
+    # The uploaded file is the one updated, with the normalized tables behind the view
+    assert sorted(os.listdir(tmp_path)) == ['sb-current.duckdb', 'sb.duckdb']
+    tables = table_types(db_path)
+    assert tables['server'] == 'VIEW'
+    assert {'server_config', 'server_observation', 'stats_daily_volume'} <= set(tables)
+    stats = validate_database(db_path)[2]
+
+    # A flat server table, as earlier layouts published it, is split again
+    conn = duckdb.connect(db_path)
+    conn.execute("CREATE TABLE server_flat AS SELECT * FROM server")
+    conn.execute("DROP VIEW server")
+    conn.execute("DROP TABLE server_observation")
+    conn.execute("DROP TABLE server_config")
+    conn.execute("ALTER TABLE server_flat RENAME TO server")
+    conn.close()
+    run_update(db_path, RunMetrics(), 0, skip_threshold_check=True, force=True, feed_dir=FIXTURES)
+    assert table_types(db_path)['server'] == 'VIEW'
+    assert validate_database(db_path)[2]['total'] == stats['total']
+
+
+def test_validation_rejects_truncated_file(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+    assert validate_database(db_path)[0]
+
+    # Cut into the last block that holds data
+    with open(db_path, 'r+b') as f:
+        f.truncate(os.path.getsize(db_path) - 1024)
+    is_valid, error, _ = validate_database(db_path)
+    assert not is_valid
+    assert "truncated" in error
+
+
+def test_validation_rejects_corrupt_block(tmp_path):
+    db_path = str(tmp_path / 'sb.duckdb')
+    run_tick(db_path)
+
+    conn = duckdb.connect(db_path, read_only=True)
+    block_size = conn.execute("SELECT block_size FROM pragma_database_size()").fetchone()[0]
+    block_id, offset = conn.execute("""
+        SELECT block_id, block_offset FROM pragma_storage_info('server_observation')
+        WHERE persistent AND column_name = 'price' LIMIT 1
+    """).fetchone()
+    conn.close()
+
+    # Flip a byte of the price segment, as a bad disk or a botched upload would
+    with open(db_path, 'r+b') as f:
+        f.seek(FILE_HEADER_SIZE + block_id * block_size + offset + 16)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    is_valid, error, _ = validate_database(db_path, deep=True)
+    assert not is_valid
+    assert "checksum" in error
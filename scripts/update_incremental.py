@@ -7,6 +7,13 @@ This eliminates the need for the data branch by directly updating the database.
 
 Usage:
     python update_incremental.py <database_path>
+    python update_incremental.py <database_path> --dedup-full
+    python update_incremental.py <database_path> --reenrich
+    python update_incremental.py <database_path> --rebuild-lifecycle
+    python update_incremental.py <database_path> --parquet-dir <output_dir>
+    python update_incremental.py <database_path> --feed-dir <snapshot_dir>
+    python update_incremental.py <database_path> --archive-dir <archive_dir>
+    python update_incremental.py <database_path> --metrics <metrics.jsonl>
 
 Example:
     python update_incremental.py ../static/sb.duckdb.wasm
@@ -14,20 +21,36 @@ Example:
 
 import sys
 import os
+import time
+import contextlib
+import resource
 import duckdb
 import multiprocessing
-import urllib.request
+import hashlib
 import json
-import gzip
-from datetime import datetime
+import re
+import tempfile
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from datetime import datetime, timezone
+
+from export_parquet import export_parquet
+from snapshot_archive import archive_snapshot
 
 # Hetzner retired the per-currency flat auction feeds (live_data_sb_EUR.json,
 # which 404s since 2026-08-04) and now serves a single nested document that
-# their own frontend flattens client-side. transform_auction_server() below
-# mirrors that mapping, so everything downstream keeps its historic field names.
+# their own frontend flattens client-side. auction_feed_query below mirrors that
+# mapping, so everything downstream keeps its historic field names.
 HETZNER_AUCTION_API_URL = "https://www.hetzner.com/_resources/app/data/app/live_data_sb.json"
 HETZNER_LIVE_API_URL = "https://www.hetzner.com/_resources/app/data/app/live_data_en_EUR.json"
 
+# A captured snapshot (see --feed-dir) is a directory holding the feeds under
+# the file names they are served as
+AUCTION_FEED_FILE = os.path.basename(HETZNER_AUCTION_API_URL)
+STANDARD_FEED_FILE = os.path.basename(HETZNER_LIVE_API_URL)
+
 # Minimum expected records to prevent uploading a corrupted/empty database.
 # This is a corruption/emptiness guard, NOT a market-health assertion: a wiped
 # or corrupt DB has ~0 records. Hetzner auction volume varies wildly (dropped
@@ -36,7 +59,81 @@ HETZNER_LIVE_API_URL = "https://www.hetzner.com/_resources/app/data/app/live_dat
 MIN_AUCTION_RECORDS = 5000
 MIN_DAYS_OF_DATA = 30  # At least 30 days of data expected
 
-# Schema for the server table (new columns at end for backwards compat)
+# Read size for streaming the feeds to their spool files
+FEED_CHUNK_SIZE = 64 * 1024
+
+# What may precede the records array of a feed document: nothing, or the
+# opening of the {"server": [...]} object both feeds come in
+FEED_WRAPPER = re.compile(rb'\s*(\{\s*"server"\s*:\s*)?')
+
+# Fetch budget per feed. Each attempt gets the connect/read timeouts; retries back
+# off exponentially from FETCH_BACKOFF seconds but never past FETCH_DEADLINE.
+FETCH_CONNECT_TIMEOUT = 10
+FETCH_READ_TIMEOUT = 30
+FETCH_DEADLINE = 90
+FETCH_ATTEMPTS = 3
+FETCH_BACKOFF = 2
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Exit code when neither feed changed since the last run (2 = validation failure).
+# The workflow skips the backup and upload on this code.
+EXIT_UNCHANGED = 3
+
+# DuckDB's file header and its two alternating database headers, ahead of the blocks
+FILE_HEADER_SIZE = 3 * 4096
+
+# Share of free blocks at which compact_database() rewrites the database
+COMPACT_FREE_RATIO = 0.2
+
+# Physical row order of flat copies of the server view (the current-listings
+# database, benchmarks). The browser filters on server_type, seen and cpu;
+# clustered this way, DuckDB's per-row-group min/max zone maps let "last 70
+# minutes" and per-CPU queries skip most of the file.
+CLUSTER_ORDER = "server_type, seen, cpu"
+
+# Row order of the normalized tables behind the server view. Observations are
+# filtered by time; configurations by type and CPU before being joined by id.
+OBSERVATION_ORDER = "seen, id"
+CONFIG_ORDER = "server_type, cpu, id"
+
+# server_config columns besides id: what an auction or product is (fixed per
+# id), and the CPU enrichment derived from it. server_observation holds the rest.
+HARDWARE_COLUMNS = """
+    information, datacenter, location, cpu_vendor, cpu, cpu_count, is_highio,
+    ram, ram_size, is_ecc, hdd_arr,
+    nvme_count, nvme_drives, nvme_size, sata_count, sata_drives, sata_size,
+    hdd_count, hdd_drives, hdd_size,
+    with_inic, with_hwr, with_gpu, with_rps, traffic, bandwidth,
+    server_type, setup_price
+"""
+ENRICHMENT_COLUMNS = "cpu_cores, cpu_threads, cpu_generation, cpu_score, cpu_multicore_score"
+
+# The CPU columns as the feed provided them (the standard feed does, the
+# auction feed doesn't), kept so a re-enrichment can start over from them
+FEED_CPU = "struct_pack(cores := cpu_cores, threads := cpu_threads, generation := cpu_generation)"
+
+# The hardware tuple the frontend groups configurations by (sizes and counts
+# follow from the drive lists but are kept so the key matches those GROUP BYs).
+# config_key hashes its JSON serialization with MD5 rather than hash(), whose
+# values may change between DuckDB versions: keys stored in older runs must
+# keep matching the ones computed today.
+CONFIG_KEY_COLUMNS = """
+    cpu, ram_size, is_ecc, hdd_arr,
+    nvme_size, nvme_drives, sata_size, sata_drives, hdd_size, hdd_drives,
+    with_gpu, with_inic, with_hwr, with_rps,
+    nvme_count, sata_count, hdd_count
+"""
+CONFIG_KEY = f"md5_number_lower(to_json(struct_pack({CONFIG_KEY_COLUMNS})))"
+
+# Codecs are left to DuckDB's per-segment analysis, which already keeps
+# dictionaries for the low-cardinality strings (compare with compression_report.py).
+
+# Window of the "recently seen" snapshot the frontend queries (see filter-query.ts)
+CURRENT_WINDOW = "70 minutes"
+
+# Flat schema of the server view (new columns at end for backwards compat).
+# Also the table of the current-listings database, and of databases from before
+# the split into server_config and server_observation (see ensure_schema).
 create_table_query = """
 CREATE TABLE IF NOT EXISTS server (
     id UBIGINT,
@@ -91,13 +188,125 @@ CREATE TABLE IF NOT EXISTS server (
 
     -- CPU benchmark data (from Geekbench via cpu-specs.json)
     cpu_score INTEGER,
-    cpu_multicore_score INTEGER
+    cpu_multicore_score INTEGER,
+
+    -- Hash of the hardware tuple (see CONFIG_KEY_COLUMNS)
+    config_key UBIGINT
 );
 """
 
-# Temp table for incoming data (matches main table schema)
+# One row per auction or standard product: its latest hardware description
+# and CPU enrichment. Every observation of the id shares it.
+create_config_table_query = """
+CREATE TABLE IF NOT EXISTS server_config (
+    id UBIGINT,
+    information VARCHAR[],
+
+    datacenter VARCHAR,
+    location VARCHAR,
+
+    cpu_vendor VARCHAR,
+    cpu VARCHAR,
+    cpu_count INTEGER,
+    is_highio BOOLEAN,
+
+    ram VARCHAR,
+    ram_size INTEGER,
+    is_ecc BOOLEAN,
+
+    hdd_arr VARCHAR[],
+
+    nvme_count INTEGER,
+    nvme_drives INTEGER[],
+    nvme_size INTEGER,
+
+    sata_count INTEGER,
+    sata_drives INTEGER[],
+    sata_size INTEGER,
+
+    hdd_count INTEGER,
+    hdd_drives INTEGER[],
+    hdd_size INTEGER,
+
+    with_inic BOOLEAN,
+    with_hwr BOOLEAN,
+    with_gpu BOOLEAN,
+    with_rps BOOLEAN,
+
+    traffic VARCHAR,
+    bandwidth INTEGER,
+
+    server_type VARCHAR,
+    setup_price INTEGER DEFAULT 0,
+
+    cpu_cores INTEGER,
+    cpu_threads INTEGER,
+    cpu_generation VARCHAR,
+    cpu_score INTEGER,
+    cpu_multicore_score INTEGER,
+
+    config_key UBIGINT,
+    -- cpu_cores, cpu_threads and cpu_generation before enrichment (see FEED_CPU)
+    cpu_feed STRUCT(cores INTEGER, threads INTEGER, generation VARCHAR)
+);
+"""
+
+# One row per auction per day (per run for standard servers): what changes
+create_observation_table_query = """
+CREATE TABLE IF NOT EXISTS server_observation (
+    id UBIGINT,
+    seen TIMESTAMP,
+    price INTEGER,
+    fixed_price BOOLEAN
+);
+"""
+
+# The historic flat table as a view, so the frontend's SQL runs unchanged
+create_server_view_query = """
+CREATE OR REPLACE VIEW server AS
+SELECT
+    c.id, c.information,
+    c.datacenter, c.location,
+    c.cpu_vendor, c.cpu, c.cpu_count, c.is_highio,
+    c.ram, c.ram_size, c.is_ecc,
+    c.hdd_arr,
+    c.nvme_count, c.nvme_drives, c.nvme_size,
+    c.sata_count, c.sata_drives, c.sata_size,
+    c.hdd_count, c.hdd_drives, c.hdd_size,
+    c.with_inic, c.with_hwr, c.with_gpu, c.with_rps,
+    c.traffic, c.bandwidth,
+    o.price, o.fixed_price,
+    o.seen,
+    c.server_type,
+    c.setup_price, c.cpu_cores, c.cpu_threads, c.cpu_generation,
+    c.cpu_score, c.cpu_multicore_score,
+    c.config_key
+FROM server_observation o
+JOIN server_config c ON c.id = o.id
+"""
+
+# Migration of a flat server table: each id's latest row becomes its config.
+# Its CPU columns are already enriched; only standard servers had feed values.
+normalize_config_query = f"""
+INSERT INTO server_config
+SELECT
+    id, {HARDWARE_COLUMNS}, {ENRICHMENT_COLUMNS}, {CONFIG_KEY} AS config_key,
+    CASE WHEN server_type = 'standard' THEN {FEED_CPU} END AS cpu_feed
+FROM server
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY seen DESC) = 1
+ORDER BY {CONFIG_ORDER}
+"""
+
+normalize_observation_query = f"""
+INSERT INTO server_observation
+SELECT id, seen, price, fixed_price
+FROM server
+ORDER BY {OBSERVATION_ORDER}
+"""
+
+# Temp table for incoming data (the flat server schema, less the derived config_key)
 create_temp_table_query = """
-CREATE TEMP TABLE server_incoming (
+CREATE OR REPLACE TEMP TABLE server_incoming (
     id UBIGINT,
     information VARCHAR[],
 
@@ -152,7 +361,68 @@ CREATE TEMP TABLE server_incoming (
 );
 """
 
-# Transform and insert auction data from JSON
+# HTTP validators and a content hash of the last imported body of each feed.
+# Kept inside the database so they can never describe data it does not hold.
+create_feed_state_query = """
+CREATE TABLE IF NOT EXISTS feed_state (
+    feed VARCHAR PRIMARY KEY,
+    etag VARCHAR,
+    last_modified VARCHAR,
+    content_hash VARCHAR,
+    fetched_at TIMESTAMP
+);
+"""
+
+# Flatten the spooled auction records (a JSON array, see spool_feed) in
+# one pass, into the columns transform_auction_server() builds per record.
+# Missing keys read as NULL and get the transform's defaults.
+auction_feed_query = """
+CREATE OR REPLACE TEMP TABLE auction_feed AS
+SELECT
+    "Id" AS id,
+    COALESCE("Details"."Information", []) AS information,
+    "Hardware"."CPU"."Name" AS cpu,
+    "Hardware"."CPU"."CoreCount" AS cpu_count,
+    list_contains(COALESCE("Details"."Specials", []), 'HighIO') AS is_highio,
+    "Details"."Traffic" AS traffic,
+    "Details"."Bandwidth" AS bandwidth,
+    list_filter(COALESCE("Details"."Information", []), line -> contains(line, 'RAM')) AS ram,
+    "Hardware"."RAM"."Size" AS ram_size,
+    COALESCE("Hardware"."RAM".ecc, false) AS is_ecc,
+    "Prices".monthly."EUR" AS price,
+    COALESCE("Hardware"."Storage"."Disks", []) AS hdd_arr,
+    {
+        'nvme': COALESCE("Hardware"."Storage"."Details".nvme, []),
+        'sata': COALESCE("Hardware"."Storage"."Details".sata, []),
+        'hdd': COALESCE("Hardware"."Storage"."Details".hdd, []),
+        'general': COALESCE("Hardware"."Storage"."Details".general, [])
+    } AS "serverDiskData",
+    "Details"."Datacenter"."Name" AS datacenter,
+    COALESCE("Details"."Specials", []) AS specials,
+    COALESCE("Prices".fixed, false) AS fixed_price,
+    COALESCE("Timer"."ReduceNextTimestamp", 0) AS next_reduce_timestamp,
+    COALESCE("Timer"."ReduceNext", 0) AS next_reduce
+FROM read_json('%s', format = 'array', columns = {
+    "Id": 'UBIGINT',
+    "Hardware": 'STRUCT(
+        "CPU" STRUCT("Name" VARCHAR, "CoreCount" INTEGER),
+        "RAM" STRUCT("Size" INTEGER, ecc BOOLEAN),
+        "Storage" STRUCT("Disks" VARCHAR[], "Details" STRUCT(nvme INTEGER[], sata INTEGER[], hdd INTEGER[], general INTEGER[]))
+    )',
+    "Prices": 'STRUCT(monthly STRUCT("EUR" DOUBLE), fixed BOOLEAN)',
+    "Details": 'STRUCT(
+        "Information" VARCHAR[], "Specials" VARCHAR[], "Traffic" VARCHAR, "Bandwidth" INTEGER,
+        "Datacenter" STRUCT("Name" VARCHAR)
+    )',
+    "Timer": 'STRUCT("ReduceNext" BIGINT, "ReduceNextTimestamp" BIGINT)'
+})
+"""
+
+# Columns an auction cannot lack: a NULL in any of them means the record
+# misses the key, i.e. the feed was reshaped
+AUCTION_FEED_REQUIRED = ('id', 'cpu', 'price', 'datacenter')
+
+# Transform and insert auction data from the fetched feed
 import_auction_query = """
 INSERT INTO server_incoming
 SELECT
@@ -160,7 +430,7 @@ SELECT
     information,
 
     datacenter,
-    CASE WHEN datacenter LIKE 'NBG%%' OR datacenter LIKE 'FSN%%'
+    CASE WHEN datacenter LIKE 'NBG%' OR datacenter LIKE 'FSN%'
         THEN 'Germany'
         ELSE 'Finland'
     END AS location,
@@ -211,59 +481,541 @@ SELECT
     NULL as cpu_score,
     NULL as cpu_multicore_score
 
-FROM read_json('%s', format = 'auto', columns = {
-    id: 'UBIGINT',
-    information: 'VARCHAR[]',
-    cpu: 'VARCHAR',
-    cpu_count: 'INTEGER',
-    is_highio: 'BOOLEAN',
-    traffic: 'VARCHAR',
-    bandwidth: 'INTEGER',
-    ram: 'VARCHAR',
-    ram_size: 'INTEGER',
-    price: 'INTEGER',
-    hdd_arr: 'VARCHAR[]',
-    serverDiskData: 'STRUCT(nvme INTEGER[], sata INTEGER[], hdd INTEGER[], general INTEGER[])',
-    is_ecc: 'BOOLEAN',
-    datacenter: 'VARCHAR',
-    specials: 'VARCHAR[]',
-    fixed_price: 'BOOLEAN',
-    next_reduce_timestamp: 'INTEGER',
-    next_reduce: 'INTEGER'
-})
+FROM (
+    -- auction_feed is the flattened feed (a DataFrame from the reference
+    -- transform works too); pin every column to the type the import has
+    -- always read it as.
+    SELECT
+        id::UBIGINT AS id,
+        information::VARCHAR[] AS information,
+        cpu::VARCHAR AS cpu,
+        cpu_count::INTEGER AS cpu_count,
+        is_highio::BOOLEAN AS is_highio,
+        traffic::VARCHAR AS traffic,
+        bandwidth::INTEGER AS bandwidth,
+        -- Stored as the JSON text of the RAM description lines
+        to_json(ram)::VARCHAR AS ram,
+        ram_size::INTEGER AS ram_size,
+        -- JSON number to INTEGER narrowing rounds half to even
+        round_even(price, 0)::INTEGER AS price,
+        hdd_arr::VARCHAR[] AS hdd_arr,
+        serverDiskData::STRUCT(nvme INTEGER[], sata INTEGER[], hdd INTEGER[], general INTEGER[]) AS serverDiskData,
+        is_ecc::BOOLEAN AS is_ecc,
+        datacenter::VARCHAR AS datacenter,
+        specials::VARCHAR[] AS specials,
+        fixed_price::BOOLEAN AS fixed_price,
+        next_reduce_timestamp::INTEGER AS next_reduce_timestamp,
+        next_reduce::INTEGER AS next_reduce
+    FROM auction_feed
+)
 """
 
-# Insert all incoming data (deduplication happens after)
-merge_query = """
-INSERT INTO server
-SELECT * FROM server_incoming
+# Collapse the incoming batch to the latest record per auction per day
+deduplicate_incoming_query = """
+CREATE TEMP TABLE server_merge AS
+WITH CTE AS (
+    SELECT
+        *,
+        ROW_NUMBER() OVER (PARTITION BY id, date_trunc('d', seen) ORDER BY seen DESC) as row_num
+    FROM
+        server_incoming
+)
+SELECT * EXCLUDE row_num
+FROM CTE
+WHERE row_num = 1
+"""
+
+# Drop incoming records that an existing record for the same auction and day
+# already supersedes (ties keep the stored row, so re-imports are no-ops).
+# The seen lower bound is the earliest day the batch touches and lets DuckDB
+# skip row groups that cannot collide.
+discard_superseded_query = """
+DELETE FROM server_merge m
+USING server_observation s
+WHERE s.id = m.id
+    AND date_trunc('d', s.seen) = date_trunc('d', m.seen)
+    AND s.seen >= m.seen
+    AND s.seen >= ?
+"""
+
+# Whatever survived is strictly newer than the stored record for its day, so
+# the stored record is replaced.
+replace_existing_query = """
+DELETE FROM server_observation s
+USING server_merge m
+WHERE s.id = m.id
+    AND date_trunc('d', s.seen) = date_trunc('d', m.seen)
+    AND s.seen >= ?
+"""
+
+merge_query = f"""
+INSERT INTO server_observation
+SELECT id, seen, price, fixed_price FROM server_merge
+ORDER BY {OBSERVATION_ORDER}
+"""
+
+# Ids whose hardware differs from the latest incoming row of their id (the
+# enrichment is derived, so it is not compared), ids without a config included.
+# Their configs are deleted, then re-added together with the new ones.
+changed_configs_query = f"""
+SELECT id FROM (
+    SELECT id, {HARDWARE_COLUMNS} FROM {{source}}
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY seen DESC) = 1
+    EXCEPT
+    SELECT id, {HARDWARE_COLUMNS} FROM server_config
+)
+"""
+
+insert_new_configs_query = f"""
+INSERT INTO server_config
+SELECT id, {HARDWARE_COLUMNS}, {ENRICHMENT_COLUMNS}, {CONFIG_KEY} AS config_key, {FEED_CPU} AS cpu_feed
+FROM {{source}}
+WHERE id NOT IN (SELECT id FROM server_config)
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY seen DESC) = 1
+ORDER BY {CONFIG_ORDER}
+"""
+
+# Ids the purge took observations from: the only configs a regular run can
+# leave without observations. A replaced observation is re-inserted for the
+# same id, and superseded standard products lose their configs explicitly.
+create_orphan_candidates_query = "CREATE OR REPLACE TEMP TABLE orphan_candidates (id UBIGINT)"
+
+# Configs of the candidates left without observations
+delete_orphaned_configs_query = """
+DELETE FROM server_config c
+WHERE c.id IN (SELECT id FROM orphan_candidates)
+    AND NOT EXISTS (
+        SELECT 1 FROM server_observation o
+        WHERE o.id = c.id AND o.id IN (SELECT id FROM orphan_candidates)
+    )
 """
 
-# Deduplicate: keep only the latest record per auction per day
-deduplicate_query = """
-CREATE OR REPLACE TABLE server AS
+# Full-table deduplication: keep only the latest record per auction per day.
+# The regular update merges incrementally; this rewrite is a maintenance step
+# (--dedup-full) for repairing a table that picked up duplicates some other way.
+deduplicate_query = f"""
+CREATE OR REPLACE TABLE server_observation AS
 WITH CTE AS (
     SELECT
         *,
         ROW_NUMBER() OVER (PARTITION BY id, date_trunc('d', seen) ORDER BY seen DESC) as row_num
     FROM
-        server
+        server_observation
 )
 SELECT * EXCLUDE row_num
 FROM CTE
 WHERE row_num = 1
+ORDER BY {OBSERVATION_ORDER}
+"""
+
+# Rewrite the tables in cluster order. Each run appends its rows already sorted,
+# so this only has to undo the drift of a day's worth of appends and deletes.
+cluster_queries = [
+    f"""
+    CREATE OR REPLACE TABLE server_observation AS
+    SELECT * FROM server_observation
+    ORDER BY {OBSERVATION_ORDER}
+    """,
+    f"""
+    CREATE OR REPLACE TABLE server_config AS
+    SELECT * FROM server_config
+    ORDER BY {CONFIG_ORDER}
+    """,
+    # Today's rollup rows are replaced on every run
+    "CREATE OR REPLACE TABLE stats_daily_volume AS SELECT * FROM stats_daily_volume ORDER BY day",
+    "CREATE OR REPLACE TABLE stats_daily_cpu_price AS SELECT * FROM stats_daily_cpu_price ORDER BY day",
+    "CREATE OR REPLACE TABLE stats_daily_price_index AS SELECT * FROM stats_daily_price_index ORDER BY day",
+]
+
+# Daily rollups for the statistics page, so its charts read a few thousand
+# pre-aggregated rows instead of grouping the whole history in the browser.
+# An id has a single config, hence a single datacenter and CPU: its listing
+# counts add up across datacenters, CPUs and server types. Per-config prices
+# are nearly one row per observation, so only the price index derived from
+# them is stored. listings counts distinct ids, records the observations
+# themselves (a standard product listed twice is one listing, two records).
+create_stats_tables_query = """
+CREATE TABLE IF NOT EXISTS stats_daily_volume (
+    day DATE,
+    server_type VARCHAR,
+    location VARCHAR,
+    datacenter VARCHAR,
+    listings INTEGER,
+    records INTEGER
+);
+CREATE TABLE IF NOT EXISTS stats_daily_cpu_price (
+    day DATE,
+    server_type VARCHAR,
+    cpu_vendor VARCHAR,
+    cpu VARCHAR,
+    listings INTEGER,
+    min_price INTEGER,
+    median_price DOUBLE,
+    p90_price DOUBLE
+);
+CREATE TABLE IF NOT EXISTS stats_daily_price_index (
+    day DATE,
+    price_index DOUBLE
+);
+"""
+
+# Days whose rollup rows are stale, collected while a run changes observations
+create_touched_days_query = "CREATE OR REPLACE TEMP TABLE touched_days (day DATE)"
+
+# What validate_database() reports: record counts and the auction date range.
+# The rollup holds one row per day and datacenter, so its records add up to
+# the observations.
+rollup_stats_query = """
+SELECT
+    COALESCE(SUM(records), 0) AS total,
+    COALESCE(SUM(records) FILTER (WHERE server_type = 'auction'), 0) AS auctions,
+    COALESCE(SUM(records) FILTER (WHERE server_type = 'standard'), 0) AS standard,
+    MIN(day) FILTER (WHERE server_type = 'auction') AS earliest,
+    MAX(day) FILTER (WHERE server_type = 'auction') AS latest,
+    COUNT(DISTINCT day) FILTER (WHERE server_type = 'auction') AS days
+FROM stats_daily_volume
+"""
+
+# The same from the records themselves, for --deep and databases without rollups
+full_stats_query = """
+SELECT
+    COUNT(*) as total,
+    COUNT(*) FILTER (WHERE server_type = 'auction') as auctions,
+    COUNT(*) FILTER (WHERE server_type = 'standard') as standard,
+    (MIN(seen) FILTER (WHERE server_type = 'auction'))::DATE as earliest,
+    (MAX(seen) FILTER (WHERE server_type = 'auction'))::DATE as latest,
+    COUNT(DISTINCT date_trunc('d', seen)) FILTER (WHERE server_type = 'auction') as days
+FROM server
+"""
+
+# Recompute the touched days of each rollup table
+stats_rollup_queries = {
+    'stats_daily_volume': """
+        INSERT INTO stats_daily_volume
+        SELECT
+            seen::DATE AS day, server_type, location, datacenter,
+            COUNT(DISTINCT id) AS listings,
+            COUNT(*) AS records
+        FROM server
+        WHERE seen::DATE IN (SELECT day FROM touched_days)
+        GROUP BY ALL
+        ORDER BY ALL
+    """,
+    'stats_daily_cpu_price': """
+        INSERT INTO stats_daily_cpu_price
+        SELECT
+            seen::DATE AS day, server_type, cpu_vendor, cpu,
+            COUNT(DISTINCT id) AS listings,
+            MIN(price) AS min_price,
+            MEDIAN(price) AS median_price,
+            QUANTILE_CONT(price, 0.9) AS p90_price
+        FROM server
+        WHERE seen::DATE IN (SELECT day FROM touched_days)
+        GROUP BY ALL
+        ORDER BY day, server_type, cpu_vendor, cpu
+    """,
+    # Each configuration's daily minimum against its rolling 90-day median,
+    # weighted by listings (see getPriceIndexStats in stats.ts). A day's value
+    # only depends on the 90 days before it, so it is computed once, when the
+    # day is written, from the configurations listed that day.
+    'stats_daily_price_index': """
+        INSERT INTO stats_daily_price_index
+        WITH touched_configs AS (
+            SELECT DISTINCT c.config_key
+            FROM server_observation o
+            JOIN server_config c ON c.id = o.id
+            WHERE o.seen::DATE IN (SELECT day FROM touched_days)
+        ),
+        config_daily_prices AS (
+            SELECT o.seen::DATE AS day, c.config_key, MIN(o.price) AS daily_min_price, COUNT(*) AS server_count
+            FROM server_observation o
+            JOIN (
+                SELECT id, config_key FROM server_config
+                WHERE config_key IN (SELECT config_key FROM touched_configs)
+            ) c ON c.id = o.id
+            WHERE o.seen >= (SELECT MIN(day) FROM touched_days) - INTERVAL 90 DAY
+            GROUP BY ALL
+        ),
+        config_with_baseline AS (
+            SELECT
+                t.day,
+                t.daily_min_price,
+                t.server_count,
+                (
+                    SELECT MEDIAN(h.daily_min_price) FROM config_daily_prices h
+                    WHERE h.config_key = t.config_key AND h.day BETWEEN t.day - INTERVAL 90 DAY AND t.day
+                ) AS baseline_price
+            FROM config_daily_prices t
+            WHERE t.day IN (SELECT day FROM touched_days)
+        )
+        SELECT
+            day,
+            SUM(daily_min_price / NULLIF(baseline_price, 0) * server_count) / NULLIF(SUM(server_count), 0) AS price_index
+        FROM config_with_baseline
+        GROUP BY day
+        ORDER BY day
+    """,
+}
+
+# The current-listings snapshot: the latest row per id inside the same
+# "recently seen" window filter.ts and console.ts anchor on max(seen), which
+# also takes in the standard servers (seen = time of the last run).
+export_current_query = f"""
+INSERT INTO server
+SELECT * FROM src.server
+WHERE seen > (SELECT max(seen) FROM src.server) - INTERVAL '{CURRENT_WINDOW}'
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY seen DESC) = 1
+ORDER BY {CLUSTER_ORDER}
+"""
+
+create_maintenance_query = """
+CREATE TABLE IF NOT EXISTS maintenance (
+    task VARCHAR PRIMARY KEY,
+    last_run TIMESTAMP
+);
+"""
+
+# Last known price per auction: the state price changes are detected against.
+# The primary key indexes it by id, so a run looks up just the ids it fetched.
+create_last_price_table_query = """
+CREATE TABLE IF NOT EXISTS server_last_price (
+    id UBIGINT PRIMARY KEY,
+    seen TIMESTAMP,
+    price INTEGER
+);
+"""
+
+# Every auction price change, at the time of the run that saw it. Observations
+# keep one row per auction per day, so this is where intra-day drops survive.
+create_price_event_table_query = """
+CREATE TABLE IF NOT EXISTS price_event (
+    id UBIGINT,
+    ts TIMESTAMP,
+    old_price INTEGER,
+    new_price INTEGER
+);
 """
 
-# Transform and insert standard (non-auction) server data directly into server table
+# First run: start from the latest observed price, and log the changes the
+# history still shows (at its one-row-per-day resolution)
+seed_last_price_query = """
+INSERT INTO server_last_price
+SELECT id, seen, price FROM server
+WHERE server_type = 'auction'
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY seen DESC) = 1
+"""
+
+seed_price_events_query = """
+INSERT INTO price_event
+SELECT id, seen AS ts, old_price, price AS new_price
+FROM (
+    SELECT id, seen, price, LAG(price) OVER (PARTITION BY id ORDER BY seen) AS old_price
+    FROM server
+    WHERE server_type = 'auction'
+)
+WHERE old_price <> price
+ORDER BY ts, id
+"""
+
+# Each incoming row against the previous price of its id: an earlier row of
+# the same batch, else the stored last price. Rows no newer than the stored
+# price (a re-served feed) are not changes.
+record_price_events_query = """
+INSERT INTO price_event
+SELECT id, seen AS ts, old_price, price AS new_price
+FROM (
+    SELECT
+        i.id,
+        i.seen,
+        i.price,
+        COALESCE(LAG(i.price) OVER (PARTITION BY i.id ORDER BY i.seen), l.price) AS old_price
+    FROM server_incoming i
+    LEFT JOIN server_last_price l ON l.id = i.id
+    WHERE l.seen IS NULL OR i.seen > l.seen
+)
+WHERE old_price <> price
+ORDER BY ts, id
+"""
+
+update_last_price_query = """
+INSERT INTO server_last_price
+SELECT id, seen, price FROM server_incoming
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY seen DESC) = 1
+ON CONFLICT (id) DO UPDATE
+SET seen = EXCLUDED.seen, price = EXCLUDED.price
+WHERE EXCLUDED.seen > server_last_price.seen
+"""
+
+# One row per auction: when it was listed and delisted, so questions like "how
+# long do these stay up" don't scan every observation. observations counts the
+# runs that listed it (one per stored day for history the builder derived).
+create_lifecycle_table_query = """
+CREATE TABLE IF NOT EXISTS server_lifecycle (
+    id UBIGINT PRIMARY KEY,
+    first_seen TIMESTAMP,
+    last_seen TIMESTAMP,
+    first_price INTEGER,
+    last_price INTEGER,
+    observations INTEGER,
+    gone_at TIMESTAMP
+);
+"""
+
+# One-shot derivation from the history. An auction the newest run no longer
+# lists is gone since the first run after its last sighting. The rows of one
+# run can differ in seen by a few seconds, while runs are minutes apart.
+build_lifecycle_query = """
+INSERT INTO server_lifecycle
+WITH lifecycle AS (
+    SELECT
+        id,
+        MIN(seen) AS first_seen,
+        MAX(seen) AS last_seen,
+        arg_min(price, seen) AS first_price,
+        arg_max(price, seen) AS last_price,
+        COUNT(*) AS observations
+    FROM server
+    WHERE server_type = 'auction'
+    GROUP BY id
+),
+runs AS (
+    SELECT DISTINCT seen FROM server WHERE server_type = 'auction'
+)
+SELECT l.*, r.seen AS gone_at
+FROM lifecycle l
+ASOF LEFT JOIN runs r ON r.seen > l.last_seen + INTERVAL 1 MINUTE
+ORDER BY l.id
+"""
+
+# The auctions of this run: new ones start a lifecycle, listed ones advance,
+# gone ones that are back are live again. Rows no newer than the stored
+# last_seen (a re-served feed) change nothing.
+update_lifecycle_query = """
+INSERT INTO server_lifecycle
+SELECT
+    i.id,
+    MIN(i.seen),
+    MAX(i.seen),
+    arg_min(i.price, i.seen),
+    arg_max(i.price, i.seen),
+    COUNT(*),
+    NULL
+FROM server_incoming i
+LEFT JOIN server_lifecycle l ON l.id = i.id
+WHERE l.last_seen IS NULL OR i.seen > l.last_seen
+GROUP BY i.id
+ON CONFLICT (id) DO UPDATE SET
+    last_seen = EXCLUDED.last_seen,
+    last_price = EXCLUDED.last_price,
+    observations = server_lifecycle.observations + EXCLUDED.observations,
+    gone_at = NULL
+"""
+
+# Live auctions the run no longer lists, gone as of the run
+mark_gone_query = """
+UPDATE server_lifecycle SET gone_at = (SELECT MAX(seen) FROM server_incoming)
+WHERE gone_at IS NULL AND id NOT IN (SELECT id FROM server_incoming)
+"""
+
+# Flatten the spooled standard-server products into the columns
+# transform_standard_server() builds per record: the base variation only, its
+# drives bucketed by type with RealSize repeated Amount times, and the
+# datacenter object turned into a list in feed order.
+standard_feed_query = """
+CREATE OR REPLACE TEMP TABLE standard_feed AS
+SELECT
+    id,
+    name,
+    cpu,
+    cores,
+    threads,
+    cpu_generation,
+    COALESCE(list_sum(list_transform(ram_modules, m -> m."Size"::DOUBLE * COALESCE(m."Amount", 1))), 0) AS ram,
+    array_to_string(list_transform(ram_modules, m ->
+        CASE WHEN COALESCE(m."Amount", 1) > 1 THEN m."Amount" || ' x ' ELSE '' END
+        || (m."Size" ->> '$') || ' ' || m."SizeUnit"
+        || CASE WHEN COALESCE(m."Generation", '') <> '' THEN ' ' || m."Generation" ELSE '' END
+        || CASE WHEN COALESCE(m."Type", '') <> '' THEN ' ' || m."Type" ELSE '' END
+    ), ', ') AS ram_hr,
+    is_ecc,
+    list_transform(drives, d ->
+        d."Amount" || ' x ' || (d."Size" ->> '$') || ' ' || d."SizeUnit" || ' ' || COALESCE(NULLIF(d."Type", ''), 'Drive')
+    ) AS hdd_arr,
+    {
+        'nvme': flatten(list_transform(list_filter(drives, d -> upper(d."Type") = 'NVME'), d -> list_transform(range(d."Amount"), i -> d."RealSize"))),
+        'sata': flatten(list_transform(list_filter(drives, d -> upper(d."Type") = 'SATA'), d -> list_transform(range(d."Amount"), i -> d."RealSize"))),
+        'hdd': flatten(list_transform(list_filter(drives, d -> upper(d."Type") = 'HDD'), d -> list_transform(range(d."Amount"), i -> d."RealSize"))),
+        'general': flatten(list_transform(drives, d -> list_transform(range(d."Amount"), i -> d."RealSize")))
+    } AS "serverDiskData",
+    price,
+    setup_price,
+    "Bandwidth",
+    traffic,
+    datacenter,
+    specials
+FROM (
+    SELECT
+        product.id ->> '$' AS id,
+        name,
+        trim(regexp_replace(replace(replace(COALESCE("cpuData".cpu, ''), '®', ''), '™', ''), '\\s+', ' ', 'g')) AS cpu,
+        "cpuData".cores AS cores,
+        "cpuData".threads AS threads,
+        "cpuData"."cpuGeneration" AS cpu_generation,
+        COALESCE(variations[1].ram, []) AS ram_modules,
+        COALESCE(variations[1].drive, []) AS drives,
+        COALESCE("filterData"."ramEcc", false) AS is_ecc,
+        -- Includes the IPv4 address, see transform_standard_server()
+        "priceData".price AS price,
+        COALESCE("priceData"."setupPrice", 0) AS setup_price,
+        details.bandwidth AS "Bandwidth",
+        details.traffic AS traffic,
+        list_transform(map_entries(COALESCE(details.datacenter, MAP {})), dc -> {
+            'datacenter': COALESCE(NULLIF(dc.value.datacenter, ''), dc.key),
+            'name': COALESCE(NULLIF(dc.value.datacenter, ''), dc.key),
+            'country': COALESCE(list_filter(COALESCE(details.countries, []), c -> c.shortcode = dc.value."countryShortCode")[-1].name, ''),
+            'country_shortcode': COALESCE(dc.value."countryShortCode", '')
+        }) AS datacenter,
+        -- A GPU only shows up as a populated gpuData block
+        CASE
+            WHEN "gpuData"::VARCHAR NOT IN ('null', 'false', '0', '0.0', '""', '[]', '{}')
+                AND NOT list_contains(COALESCE(specials, []), 'GPU')
+            THEN list_append(COALESCE(specials, []), 'GPU')
+            ELSE COALESCE(specials, [])
+        END AS specials
+    FROM read_json('%s', format = 'array', columns = {
+        name: 'VARCHAR',
+        product: 'STRUCT(id JSON)',
+        "cpuData": 'STRUCT(cpu VARCHAR, cores INTEGER, threads INTEGER, "cpuGeneration" VARCHAR)',
+        "priceData": 'STRUCT(price DOUBLE, "setupPrice" DOUBLE)',
+        "filterData": 'STRUCT("ramEcc" BOOLEAN)',
+        details: 'STRUCT(
+            countries STRUCT(shortcode VARCHAR, name VARCHAR)[],
+            datacenter MAP(VARCHAR, STRUCT(datacenter VARCHAR, "countryShortCode" VARCHAR)),
+            bandwidth INTEGER,
+            traffic VARCHAR
+        )',
+        variations: 'STRUCT(
+            ram STRUCT("Size" JSON, "SizeUnit" VARCHAR, "Amount" INTEGER, "Generation" VARCHAR, "Type" VARCHAR)[],
+            drive STRUCT("RealSize" INTEGER, "Amount" INTEGER, "Size" JSON, "SizeUnit" VARCHAR, "Type" VARCHAR)[]
+        )[]',
+        specials: 'VARCHAR[]',
+        "gpuData": 'JSON'
+    })
+)
+"""
+
+STANDARD_FEED_REQUIRED = ('id', 'name')
+
+# Transform standard (non-auction) server data into the incoming table
 # UNNEST creates one row per datacenter for each product
 import_standard_query = """
-INSERT INTO server
+INSERT INTO server_incoming
 SELECT
     hash(s.id || '-' || dc.datacenter) as id,  -- Hash string ID + datacenter for uniqueness
     [s.name] as information,  -- Store product name (e.g. "AX41-NVMe") for linking
 
     dc.datacenter as datacenter,  -- Full datacenter (e.g. "HEL1", "FSN1", "NBG1")
-    CASE WHEN dc.datacenter LIKE 'NBG%%' OR dc.datacenter LIKE 'FSN%%'
+    CASE WHEN dc.datacenter LIKE 'NBG%' OR dc.datacenter LIKE 'FSN%'
         THEN 'Germany'
         ELSE 'Finland'
     END AS location,
@@ -314,25 +1066,81 @@ SELECT
     NULL as cpu_score,
     NULL as cpu_multicore_score
 
-FROM read_json('%s', format = 'auto', columns = {
-    id: 'VARCHAR',
-    name: 'VARCHAR',
-    cpu: 'VARCHAR',
-    cores: 'INTEGER',
-    threads: 'INTEGER',
-    cpu_generation: 'VARCHAR',
-    ram: 'INTEGER',
-    ram_hr: 'VARCHAR',
-    is_ecc: 'BOOLEAN',
-    hdd_arr: 'VARCHAR[]',
-    serverDiskData: 'STRUCT(nvme INTEGER[], sata INTEGER[], hdd INTEGER[], general INTEGER[])',
-    price: 'FLOAT',
-    setup_price: 'INTEGER',
-    "Bandwidth": 'INTEGER',
-    traffic: 'VARCHAR',
-    datacenter: 'STRUCT(datacenter VARCHAR, name VARCHAR, country VARCHAR, country_shortcode VARCHAR)[]',
-    specials: 'VARCHAR[]'
-}) s, LATERAL (SELECT UNNEST(s.datacenter) as dc) t
+FROM (
+    SELECT
+        id::VARCHAR AS id,
+        name::VARCHAR AS name,
+        cpu::VARCHAR AS cpu,
+        cores::INTEGER AS cores,
+        threads::INTEGER AS threads,
+        cpu_generation::VARCHAR AS cpu_generation,
+        ram::INTEGER AS ram,
+        ram_hr::VARCHAR AS ram_hr,
+        is_ecc::BOOLEAN AS is_ecc,
+        hdd_arr::VARCHAR[] AS hdd_arr,
+        serverDiskData::STRUCT(nvme INTEGER[], sata INTEGER[], hdd INTEGER[], general INTEGER[]) AS serverDiskData,
+        price::FLOAT AS price,
+        setup_price::INTEGER AS setup_price,
+        "Bandwidth"::INTEGER AS "Bandwidth",
+        traffic::VARCHAR AS traffic,
+        datacenter::STRUCT(datacenter VARCHAR, name VARCHAR, country VARCHAR, country_shortcode VARCHAR)[] AS datacenter,
+        specials::VARCHAR[] AS specials
+    FROM standard_feed
+) s, LATERAL (SELECT UNNEST(s.datacenter) as dc) t
+ORDER BY s.cpu
+"""
+
+
+# CPU specs dimension, loaded from data/cpu-specs.json (keys are normalized names)
+create_cpu_specs_query = """
+CREATE TABLE IF NOT EXISTS cpu_specs (
+    name VARCHAR PRIMARY KEY,
+    cores INTEGER,
+    threads INTEGER,
+    score INTEGER,
+    multicore_score INTEGER,
+    family VARCHAR
+);
+"""
+
+# Raw CPU name as it appears in the feeds -> cpu_specs key and socket count
+create_cpu_alias_query = """
+CREATE TABLE IF NOT EXISTS cpu_alias (
+    cpu VARCHAR PRIMARY KEY,
+    spec_name VARCHAR,
+    sockets INTEGER
+);
+"""
+
+enrich_cpu_query = """
+UPDATE server_config SET
+    cpu_cores = COALESCE(server_config.cpu_cores, e.cores),
+    cpu_threads = COALESCE(server_config.cpu_threads, e.threads),
+    cpu_generation = COALESCE(server_config.cpu_generation, e.family),
+    cpu_score = e.score,
+    cpu_multicore_score = e.multicore_score
+FROM (
+    SELECT
+        a.cpu,
+        s.cores * a.sockets AS cores,
+        s.threads * a.sockets AS threads,
+        s.family,
+        s.score,
+        s.multicore_score * a.sockets AS multicore_score
+    FROM cpu_alias a
+    JOIN cpu_specs s ON s.name = a.spec_name
+) e
+WHERE server_config.cpu = e.cpu AND server_config.cpu_score IS NULL
+"""
+
+# Drop everything the enrichment derived: back to what the feed provided
+reset_cpu_enrichment_query = """
+UPDATE server_config SET
+    cpu_cores = cpu_feed.cores,
+    cpu_threads = cpu_feed.threads,
+    cpu_generation = cpu_feed.generation,
+    cpu_score = NULL,
+    cpu_multicore_score = NULL
 """
 
 
@@ -367,58 +1175,73 @@ def get_socket_count(raw_name: str) -> int:
     return int(match.group(1)) if match else 1
 
 
-def enrich_cpu_data(conn, cpu_specs: dict):
-    """Enrich server records with CPU cores, threads, generation, and scores from cpu-specs.json."""
+def enrich_cpu_data(conn, cpu_specs: dict) -> int:
+    """Enrich server records with CPU cores, threads, generation, and scores from cpu-specs.json.
+
+    The specs are loaded into the cpu_specs table and every raw CPU name is
+    mapped once, in cpu_alias, to its spec key and socket count. Enrichment is
+    then a single UPDATE joining the two for all rows still missing a score.
+    Returns the number of configs enriched.
+    """
     if not cpu_specs:
         print("Skipping CPU enrichment (no specs available)")
-        return
-
-    # Get distinct CPU names that need enrichment
-    rows = conn.execute("""
-        SELECT DISTINCT cpu FROM server WHERE cpu_score IS NULL AND cpu IS NOT NULL
+        return 0
+
+    conn.execute(create_cpu_specs_query)
+    conn.execute(create_cpu_alias_query)
+
+    # Refresh the dimension from the JSON; it is a few dozen rows
+    conn.execute("DELETE FROM cpu_specs")
+    conn.executemany("INSERT INTO cpu_specs VALUES (?, ?, ?, ?, ?, ?)", [
+        [name, specs['cores'], specs['threads'], specs['score'], specs['multicore_score'], specs.get('family', '')]
+        for name, specs in cpu_specs.items()
+    ])
+
+    # Map raw names not seen before. The normalization lives in Python (shared
+    # with generate_cpu_specs.py), but it only ever runs once per CPU model.
+    unmapped = conn.execute("""
+        SELECT DISTINCT cpu FROM server_config
+        WHERE cpu_score IS NULL AND cpu IS NOT NULL
+            AND cpu NOT IN (SELECT cpu FROM cpu_alias)
     """).fetchall()
-
-    if not rows:
-        print("No servers need CPU enrichment")
+    if unmapped:
+        conn.executemany("INSERT INTO cpu_alias VALUES (?, ?, ?)", [
+            [cpu_name, normalize_cpu_name(cpu_name), get_socket_count(cpu_name)]
+            for (cpu_name,) in unmapped
+        ])
+        print(f"Mapped {len(unmapped)} new CPU names")
+
+    # For multi-socket, the specs hold per-socket values, keyed by the
+    # normalized (non-2x) name, so cores, threads and the multicore score are
+    # multiplied by the socket count. Values the feed already provides (standard
+    # servers) win over the specs.
+    enriched = conn.execute(enrich_cpu_query).fetchone()[0]
+    print(f"CPU enrichment: updated {enriched} records")
+    return enriched
+
+
+def reenrich_database(db_path: str):
+    """Recompute the CPU enrichment of the whole history, e.g. after cpu-specs.json changed."""
+    cpu_specs = load_cpu_specs()
+    if not cpu_specs:
+        print("No CPU specs available, nothing to re-enrich")
         return
 
-    enriched = 0
-    for (cpu_name,) in rows:
-        normalized = normalize_cpu_name(cpu_name)
-        specs = cpu_specs.get(normalized)
-        if not specs:
-            continue
-
-        socket_count = get_socket_count(cpu_name)
-
-        cores = specs['cores']
-        threads = specs['threads']
-        # For multi-socket, specs already has per-socket values multiplied
-        # if the generator saw '2x' prefix. But if the raw name has '2x' and
-        # the specs key is the normalized (non-2x) name, we need to multiply.
-        # The generator stores already-multiplied values for 2x entries,
-        # but here we match by normalized name (without 2x), so we multiply.
-        if socket_count > 1:
-            cores = specs['cores'] * socket_count
-            threads = specs['threads'] * socket_count
-            multicore_score = specs['multicore_score'] * socket_count
-        else:
-            cores = specs['cores']
-            threads = specs['threads']
-            multicore_score = specs['multicore_score']
-
-        conn.execute("""
-            UPDATE server SET
-                cpu_cores = COALESCE(cpu_cores, ?),
-                cpu_threads = COALESCE(cpu_threads, ?),
-                cpu_generation = COALESCE(cpu_generation, ?),
-                cpu_score = ?,
-                cpu_multicore_score = ?
-            WHERE cpu = ? AND cpu_score IS NULL
-        """, [cores, threads, specs.get('family', ''), specs['score'], multicore_score, cpu_name])
-        enriched += 1
+    print(f"Opening database: {db_path}")
+    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
 
-    print(f"CPU enrichment: updated {enriched} distinct CPU models")
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        ensure_schema(conn)
+        print("Clearing existing CPU enrichment...")
+        conn.execute(reset_cpu_enrichment_query)
+        enrich_cpu_data(conn, cpu_specs)
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        raise e
+    finally:
+        conn.close()
 
 
 def strip_trademarks(name: str) -> str:
@@ -449,6 +1272,9 @@ def transform_standard_server(raw: dict) -> dict:
     product and no per-variation price is published. So only the base variation
     - always the first, and the one matching filterData.ramMin - is imported;
     pricing the upgraded variations off the base price would be a fabrication.
+
+    The update loads the feed with standard_feed_query instead; this is the
+    reference mapping it has to match (see bench_transform.py).
     """
     product = raw['product']
     cpu_data = raw.get('cpuData') or {}
@@ -518,6 +1344,9 @@ def transform_auction_server(raw: dict) -> dict:
     Mirrors the mapping Hetzner's own Serverbörse frontend applies to
     live_data_sb.json, so the import SQL keeps working against the field names
     the retired flat feed used to ship.
+
+    The update loads the feed with auction_feed_query instead; this is the
+    reference mapping it has to match (see bench_transform.py).
     """
     hardware = raw['Hardware']
     details = raw['Details']
@@ -562,37 +1391,343 @@ def transform_auction_server(raw: dict) -> dict:
     }
 
 
-def fetch_hetzner_data(url: str, output_path: str, label: str = "servers", transform=None) -> str:
-    """Fetch data from Hetzner API and save to temp file."""
+def read_response_chunks(response, deadline: float, chunk_size: int = FEED_CHUNK_SIZE):
+    """Read a (decompressed) response body in chunks, giving up at `deadline`."""
+    for chunk in response.iter_content(chunk_size):
+        if time.monotonic() > deadline:
+            raise TimeoutError("feed download exceeded its deadline")
+        yield chunk
+
+
+def create_http_session() -> requests.Session:
+    """HTTP session shared by the feed fetches: keep-alive pool, compression.
+
+    Retries are done per feed by fetch_hetzner_data(), which can also retry a
+    body that broke off mid-stream, so the adapter itself never retries.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (compatible; HetznerRadar/1.0)',
+        # gzip/deflate, plus br/zstd when the decoders are installed
+        'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding'],
+    })
+    return session
+
+
+def spool_feed(chunks, path: str) -> int:
+    """Write a feed body to `path` as a bare JSON array; return the body size in bytes.
+
+    The bytes are copied as received, never decoded: a document wrapping the
+    array as {"server": [...]} only has that wrapper cut off its ends, so
+    auction_feed_query and standard_feed_query parse each record once, in
+    DuckDB. A document of any other shape is refused.
+    """
+    size = 0
+    head = b''
+    wrapped = None
+    with open(path, 'w+b') as spool:
+        for chunk in chunks:
+            size += len(chunk)
+            if wrapped is None:
+                head += chunk
+                start = head.find(b'[')
+                if start < 0:
+                    continue
+                match = FEED_WRAPPER.fullmatch(head[:start])
+                if match is None:
+                    raise ValueError(f"Malformed feed: unexpected document start {head[:start + 1][:80]!r}")
+                wrapped = bool(match.group(1))
+                chunk = head[start:]
+            spool.write(chunk)
+
+        if wrapped is None:
+            raise ValueError("Malformed feed: no JSON array in the document")
+        if wrapped:
+            # Only whitespace and the closing brace may follow the array
+            tail_start = max(0, spool.tell() - 1024)
+            spool.seek(tail_start)
+            tail = spool.read().rstrip()
+            if not tail.endswith(b'}') or not tail[:-1].rstrip().endswith(b']'):
+                raise ValueError(f"Malformed feed: unexpected document end {tail[-80:]!r}")
+            spool.truncate(tail_start + len(tail[:-1].rstrip()))
+    return size
+
+
+def download_feed(session: requests.Session, url: str, headers: dict, spool_path: str, deadline: float):
+    """One attempt at downloading a feed into a spool file.
+
+    Returns:
+        tuple: (body size, response headers, body sha256) or None on 304
+    """
+    connect_timeout = max(1.0, min(FETCH_CONNECT_TIMEOUT, deadline - time.monotonic()))
+    with session.get(url, headers=headers, stream=True, timeout=(connect_timeout, FETCH_READ_TIMEOUT)) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        digest = hashlib.sha256()
+        size = spool_feed(hash_chunks(read_response_chunks(response, deadline), digest), spool_path)
+        return size, response.headers, digest.hexdigest()
+
+
+def hash_chunks(chunks, digest):
+    """Pass chunks through while feeding them to a hashlib digest."""
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def load_feed_state(db_path: str) -> dict:
+    """Read the stored validators per feed, or {} if the database has none."""
+    try:
+        conn = duckdb.connect(db_path, read_only=True)
+        try:
+            tables = [row[0] for row in conn.execute("SHOW TABLES").fetchall()]
+            if 'feed_state' not in tables:
+                return {}
+            rows = conn.execute("SELECT feed, etag, last_modified, content_hash FROM feed_state").fetchall()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"WARNING: Could not read feed state, fetching in full: {e}")
+        return {}
+
+    return {
+        feed: {'etag': etag, 'last_modified': last_modified, 'content_hash': content_hash}
+        for feed, etag, last_modified, content_hash in rows
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS but kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class RunMetrics:
+    """Stage timings and row counts of one run, kept as one JSON record.
+
+    Stages nest: a stage opened inside another is recorded under both names
+    joined by '/', e.g. 'update/merge'. Row counts are the change counts
+    DuckDB returns for INSERT, UPDATE and DELETE, so they cost no scans.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.status = 'ok'
+        self.stages = {}
+        self.rows = {}
+        self._open = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        self._open.append(name)
+        path = "/".join(self._open)
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.stages[path] = self.stages.get(path, 0.0) + time.perf_counter() - started
+            self._open.pop()
+
+    def count(self, name: str, rows: int) -> int:
+        """Add `rows` to the counter `name` and return it."""
+        self.rows[name] = self.rows.get(name, 0) + rows
+        return rows
+
+    def summary(self) -> str:
+        """The top-level stages, for the log."""
+        return ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stages.items() if "/" not in stage)
+
+    def record(self, **fields) -> dict:
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'status': self.status,
+            'seconds': (datetime.now(timezone.utc) - self.started_at).total_seconds(),
+            'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            'rows': self.rows,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            **fields,
+        }
+
+    def write(self, path: str, **fields):
+        """Append the run's record as one line of JSON to `path`."""
+        with open(path, 'a') as f:
+            f.write(json.dumps(self.record(**fields), default=str) + "\n")
+
+
+def fetch_hetzner_data(url: str, label: str = "servers", validators: dict = None,
+                       session: requests.Session = None) -> tuple[str | None, dict]:
+    """Stream a feed from the Hetzner API into a spool file.
+
+    The body is written to a temporary file as it arrives, never decoded in
+    Python; the import parses and flattens it once in SQL (see load_feed). The
+    caller owns the returned file and removes it once the update is done.
+
+    With `validators` from a previous run the request is conditional, and a
+    304 or a body hashing to the stored content hash counts as unchanged.
+
+    Request errors (connection failures, timeouts, a body that broke off
+    mid-stream) and 429/5xx responses are retried with exponential backoff,
+    within a FETCH_DEADLINE budget for the whole feed. Other HTTP errors are
+    raised right away.
+
+    Returns:
+        tuple: (spool file path, or None if the feed is unchanged; validators to store)
+    """
     print(f"Fetching {label} from Hetzner API...")
+    started = time.perf_counter()
+    deadline = time.monotonic() + FETCH_DEADLINE
+    validators = validators or {}
+    session = session or create_http_session()
+
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    fd, spool_path = tempfile.mkstemp(prefix='hetzner-feed-', suffix='.json')
+    os.close(fd)
+    try:
+        for attempt in range(1, FETCH_ATTEMPTS + 1):
+            try:
+                result = download_feed(session, url, headers, spool_path, deadline)
+                break
+            except (requests.RequestException, TimeoutError) as e:
+                status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+                delay = FETCH_BACKOFF * 2 ** (attempt - 1)
+                retryable = status is None or status in RETRY_STATUSES
+                if not retryable or attempt == FETCH_ATTEMPTS or time.monotonic() + delay >= deadline:
+                    raise
+                print(f"Fetching {label} failed ({e}), retrying in {delay}s...")
+                time.sleep(delay)
+
+        if result is None:
+            print(f"{label} not modified since last run ({time.perf_counter() - started:.2f}s)")
+            os.remove(spool_path)
+            return None, validators
+
+        size, response_headers, content_hash = result
+        fetched = {
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'content_hash': content_hash,
+        }
+        if fetched['content_hash'] == validators.get('content_hash'):
+            print(f"{label} unchanged since last run ({time.perf_counter() - started:.2f}s)")
+            os.remove(spool_path)
+            return None, fetched
+    except BaseException:
+        os.remove(spool_path)
+        raise
 
-    req = urllib.request.Request(
-        url,
-        headers={'User-Agent': 'Mozilla/5.0 (compatible; HetznerRadar/1.0)'}
-    )
+    elapsed = time.perf_counter() - started
+    print(f"Fetched {label} from API ({size / 1024:.0f} KiB) in {elapsed:.2f}s (peak RSS {peak_rss_mb():.0f} MiB)")
+    return spool_path, fetched
+
+
+def read_feed_file(path: str, label: str = "servers", validators: dict = None) -> tuple[str | None, dict]:
+    """Spool a captured feed from disk, the offline stand-in for fetch_hetzner_data().
 
-    with urllib.request.urlopen(req, timeout=30) as response:
-        data = json.loads(response.read().decode('utf-8'))
+    A missing file counts as not modified, like a 304; otherwise the content
+    hash decides whether the feed changed, as it does for a download.
+
+    Returns:
+        tuple: (spool file path, or None if the feed is unchanged; validators to store)
+    """
+    validators = validators or {}
+    if not os.path.exists(path):
+        print(f"No {os.path.basename(path)} in the snapshot, {label} not modified")
+        return None, validators
+
+    started = time.perf_counter()
+    fd, spool_path = tempfile.mkstemp(prefix='hetzner-feed-', suffix='.json')
+    os.close(fd)
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            chunks = iter(lambda: f.read(FEED_CHUNK_SIZE), b'')
+            size = spool_feed(hash_chunks(chunks, digest), spool_path)
+
+        fetched = {'etag': None, 'last_modified': None, 'content_hash': digest.hexdigest()}
+        if fetched['content_hash'] == validators.get('content_hash'):
+            print(f"{label} unchanged since last run ({time.perf_counter() - started:.2f}s)")
+            os.remove(spool_path)
+            return None, fetched
+    except BaseException:
+        os.remove(spool_path)
+        raise
+
+    print(f"Read {label} from {path} ({size / 1024:.0f} KiB) in {time.perf_counter() - started:.2f}s")
+    return spool_path, fetched
+
+
+def load_feed(conn, table: str, query: str, path: str, required: tuple) -> int:
+    """Flatten a spooled feed into the temp table `table`; return its record count.
+
+    A feed without records is refused, as is a NULL in a `required` column:
+    records lacking that key, which the per-record transforms would have
+    failed on with a KeyError.
+    """
+    conn.execute(query % path.replace("'", "''"))
+    missing = " OR ".join(f"{column} IS NULL" for column in required)
+    count, malformed = conn.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE {missing}) FROM {table}").fetchone()
+    if not count:
+        raise ValueError(f"{table} holds no records - refusing to import an empty feed")
+    if malformed:
+        raise ValueError(f"{malformed} of {count} records in {table} lack one of {', '.join(required)} "
+                         f"- the feed shape has likely changed")
+    return count
 
-    # Extract server array
-    servers = data.get('server', data) if isinstance(data, dict) else data
-    if not servers:
-        raise ValueError(f"Hetzner API returned no {label} ({url}) - refusing to import an empty feed")
-    if transform is not None:
-        servers = [transform(server) for server in servers]
-    print(f"Fetched {len(servers)} {label} from API")
 
-    # Save to temp file for DuckDB to read
-    with open(output_path, 'w') as f:
-        json.dump(servers, f)
+def allocated_size(conn, tables: list) -> int:
+    """Bytes up to the end of the highest block holding the catalog or data of `tables`.
 
-    return output_path
+    Free blocks past it are cut off the file, so the file may end right there.
+    """
+    block_size = conn.execute("""
+        SELECT block_size FROM pragma_database_size() WHERE database_name = current_database()
+    """).fetchone()[0]
+    highest = conn.execute("SELECT COALESCE(MAX(block_id), -1) FROM pragma_metadata_info()").fetchone()[0]
+    for table in tables:
+        highest = max(highest, conn.execute(f"""
+            SELECT COALESCE(MAX(GREATEST(block_id, COALESCE(list_max(additional_block_ids), -1))), -1)
+            FROM pragma_storage_info('{table}')
+            WHERE persistent
+        """).fetchone()[0])
+    return FILE_HEADER_SIZE + (highest + 1) * block_size
+
+
+def verify_blocks(conn, tables: list):
+    """Read every row of `tables`; DuckDB checks each block's checksum as it loads it.
+
+    Hashing whole rows keeps every column (list children included) from being
+    skipped. A mismatch or a block past the end of the file raises an IO error.
+    """
+    for table in tables:
+        conn.execute(f'SELECT bit_xor(hash(t)) FROM "{table}" t').fetchone()
 
 
-def validate_database(db_path: str) -> tuple[bool, str, dict]:
+def validate_database(db_path: str, deep: bool = False) -> tuple[bool, str, dict]:
     """
     Validate that a database file is readable and contains expected data.
 
+    The counts come from the stats_daily_volume rollup, which the update
+    keeps current, after checking that it covers every record. With `deep`,
+    or when the rollup is missing or disagrees, they come from a full scan of
+    the server view instead.
+
+    The integrity part checks that the file reaches the highest block any
+    table or the catalog occupies, from storage metadata alone. `deep` also
+    reads every row of every table once, which makes DuckDB verify the
+    checksum of each block it loads; that read is the only step whose cost
+    grows with the history, so regular runs skip it.
+
     Returns:
         tuple: (is_valid, error_message, stats_dict)
     """
@@ -605,26 +1740,38 @@ def validate_database(db_path: str) -> tuple[bool, str, dict]:
 
     try:
         conn = duckdb.connect(db_path, read_only=True)
-
-        # Check if server table exists
-        tables = [row[0] for row in conn.execute("SHOW TABLES").fetchall()]
-        if 'server' not in tables:
+        try:
+            # Check if server table exists
+            tables = [row[0] for row in conn.execute("SHOW TABLES").fetchall()]
+            if 'server' not in tables:
+                return False, "Database missing 'server' table", {}
+
+            # A truncated download still opens as long as its headers and
+            # catalog survived; its last blocks are simply missing
+            base_tables = [row[0] for row in conn.execute("""
+                SELECT table_name FROM duckdb_tables() WHERE database_name = current_database()
+            """).fetchall()]
+            expected_size = allocated_size(conn, base_tables)
+            if file_size < expected_size:
+                return False, f"Database file truncated ({file_size} of {expected_size} bytes)", {}
+            if deep:
+                verify_blocks(conn, base_tables)
+
+            # One row per record: the observations behind the view, or the
+            # flat table of a database from before the split
+            records_table = 'server_observation' if 'server_observation' in tables else 'server'
+            stats = None
+            if not deep and has_rollup_records(conn):
+                stats = conn.execute(rollup_stats_query).fetchone()
+                observations = conn.execute(f"SELECT COUNT(*) FROM {records_table}").fetchone()[0]
+                if stats[0] != observations:
+                    print(f"Statistics rollups cover {stats[0]} of {observations} records, "
+                          f"validating with a full scan")
+                    stats = None
+            if stats is None:
+                stats = conn.execute(full_stats_query).fetchone()
+        finally:
             conn.close()
-            return False, "Database missing 'server' table", {}
-
-        # Get record counts and date range
-        stats = conn.execute("""
-            SELECT
-                COUNT(*) as total,
-                COUNT(*) FILTER (WHERE server_type = 'auction') as auctions,
-                COUNT(*) FILTER (WHERE server_type = 'standard') as standard,
-                MIN(seen) FILTER (WHERE server_type = 'auction') as earliest,
-                MAX(seen) FILTER (WHERE server_type = 'auction') as latest,
-                COUNT(DISTINCT date_trunc('d', seen)) FILTER (WHERE server_type = 'auction') as days
-            FROM server
-        """).fetchone()
-
-        conn.close()
 
         stats_dict = {
             'total': stats[0],
@@ -673,24 +1820,21 @@ def check_data_integrity(stats: dict, skip_threshold_check: bool = False) -> tup
     return True, ""
 
 
-def update_database(db_path: str, auction_json_path: str, standard_json_path: str = None, retention_days: int = 90):
-    """Incrementally update the DuckDB database with new data."""
-    print(f"Opening database: {db_path}")
-
-    # Check if database exists
-    db_exists = os.path.exists(db_path)
-
-    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
-    conn.execute("PRAGMA force_compression='dictionary'")
+def ensure_schema(conn):
+    """Create the server_config and server_observation tables behind the server view.
 
-    try:
-        conn.execute("BEGIN TRANSACTION")
-
-        # Create main table if it doesn't exist
-        if not db_exists:
-            print("Creating new database...")
-        conn.execute(create_table_query)
+    A database that still holds a flat server table (every observation
+    repeating its hardware and enrichment columns) is first brought up to the
+    current column set, then split: each id's latest row becomes its config
+    and every row an observation. The view replaces the table under the same
+    name, so readers notice nothing.
+    """
+    legacy_table = conn.execute("""
+        SELECT COUNT(*) > 0 FROM duckdb_tables()
+        WHERE database_name = current_database() AND schema_name = 'main' AND table_name = 'server'
+    """).fetchone()[0]
 
+    if legacy_table:
         # Migration: Add new columns if they don't exist (for existing databases)
         existing_columns = [row[0] for row in conn.execute("SELECT column_name FROM duckdb_columns() WHERE table_name = 'server'").fetchall()]
 
@@ -709,99 +1853,480 @@ def update_database(db_path: str, auction_json_path: str, standard_json_path: st
                 print(f"Migrating: Adding {col_name} column...")
                 conn.execute(sql)
 
-        if any(col not in existing_columns for col, _ in migrations):
-            print("Migration complete.")
+    conn.execute(create_config_table_query)
+    conn.execute(create_observation_table_query)
+
+    # Add every missing column before filling any: DuckDB fails the commit when
+    # a table is altered after rows of it were updated in the same transaction
+    config_columns = {row[0] for row in conn.execute("""
+        SELECT column_name FROM duckdb_columns() WHERE table_name = 'server_config'
+    """).fetchall()}
+    config_migrations = [
+        ('config_key', 'UBIGINT', f"UPDATE server_config SET config_key = {CONFIG_KEY}"),
+        # What the enrichment filled in can't be told apart any more; the next
+        # standard snapshot brings the feed's own values
+        ('cpu_feed', 'STRUCT(cores INTEGER, threads INTEGER, generation VARCHAR)',
+         f"UPDATE server_config SET cpu_feed = {FEED_CPU} WHERE server_type = 'standard'"),
+    ]
+    config_migrations = [m for m in config_migrations if m[0] not in config_columns]
+    for col_name, col_type, _ in config_migrations:
+        print(f"Migrating: Adding {col_name} column...")
+        conn.execute(f"ALTER TABLE server_config ADD COLUMN {col_name} {col_type}")
+    for _, _, fill in config_migrations:
+        conn.execute(fill)
+
+    if legacy_table:
+        print("Migrating: Splitting server into server_config and server_observation...")
+        conn.execute(normalize_config_query)
+        conn.execute(normalize_observation_query)
+        conn.execute("DROP TABLE server")
+        configs = conn.execute("SELECT COUNT(*) FROM server_config").fetchone()[0]
+        observations = conn.execute("SELECT COUNT(*) FROM server_observation").fetchone()[0]
+        print(f"Migration complete: {configs} configs, {observations} observations.")
+
+    conn.execute(create_server_view_query)
+
+
+def upsert_configs(conn, source: str):
+    """Add configs for new ids in `source` and replace those whose hardware changed."""
+    changed = changed_configs_query.format(source=source)
+    # Every day an id was observed is grouped under its old hardware
+    touch_days(conn, f"server_observation WHERE id IN ({changed})")
+    conn.execute(f"DELETE FROM server_config WHERE id IN ({changed})")
+    return conn.execute(insert_new_configs_query.format(source=source)).fetchone()[0]
+
+
+def touch_days(conn, source: str):
+    """Mark the days of the rows in `source` (a table or view, optionally with
+    a WHERE clause) for the next refresh_stats()."""
+    conn.execute(f"INSERT INTO touched_days SELECT DISTINCT seen::DATE FROM {source}")
+
+
+def has_rollup_records(conn) -> bool:
+    """Whether stats_daily_volume exists with its records column."""
+    return conn.execute("""
+        SELECT COUNT(*) > 0 FROM duckdb_columns()
+        WHERE database_name = current_database()
+            AND table_name = 'stats_daily_volume' AND column_name = 'records'
+    """).fetchone()[0]
+
+
+def refresh_stats(conn, full: bool = False):
+    """Recompute the statistics rollups for the days marked by touch_days().
+
+    With `full`, or when the rollup tables don't exist yet or predate the
+    records column, every observed day is recomputed.
+    """
+    missing = conn.execute("""
+        SELECT COUNT(*) < 3 FROM duckdb_tables()
+        WHERE database_name = current_database() AND table_name LIKE 'stats_daily_%'
+    """).fetchone()[0]
+    conn.execute(create_stats_tables_query)
+    outdated = not has_rollup_records(conn)
+    if outdated:
+        print("Migrating: Adding records column to stats_daily_volume...")
+        conn.execute("ALTER TABLE stats_daily_volume ADD COLUMN records INTEGER")
+    if full or missing or outdated:
+        conn.execute(create_touched_days_query)
+        touch_days(conn, "server_observation")
+
+    days = conn.execute("SELECT COUNT(DISTINCT day) FROM touched_days").fetchone()[0]
+    for table, query in stats_rollup_queries.items():
+        conn.execute(f"DELETE FROM {table} WHERE day IN (SELECT day FROM touched_days)")
+        conn.execute(query)
+    print(f"Refreshed statistics rollups for {days} day(s)")
+
+
+def ensure_price_events(conn):
+    """Create the price event log and its last-price state, seeding both from history."""
+    seeded = conn.execute("""
+        SELECT COUNT(*) > 0 FROM duckdb_tables()
+        WHERE database_name = current_database() AND table_name = 'server_last_price'
+    """).fetchone()[0]
+    conn.execute(create_last_price_table_query)
+    conn.execute(create_price_event_table_query)
+    if not seeded:
+        print("Seeding price events from history...")
+        conn.execute(seed_last_price_query)
+        events = conn.execute(seed_price_events_query).fetchone()[0]
+        print(f"Seeded {events} day-level price changes")
+
+
+def record_price_events(conn) -> int:
+    """Log the price changes in server_incoming and advance the last known prices."""
+    events = conn.execute(record_price_events_query).fetchone()[0]
+    conn.execute(update_last_price_query)
+    return events
+
+
+def ensure_lifecycle(conn):
+    """Create server_lifecycle, building it from the history the first time."""
+    built = conn.execute("""
+        SELECT COUNT(*) > 0 FROM duckdb_tables()
+        WHERE database_name = current_database() AND table_name = 'server_lifecycle'
+    """).fetchone()[0]
+    conn.execute(create_lifecycle_table_query)
+    if not built:
+        build_lifecycle(conn)
+
+
+def build_lifecycle(conn):
+    """Derive server_lifecycle from the stored history, replacing its contents."""
+    print("Building auction lifecycles from history...")
+    conn.execute("DELETE FROM server_lifecycle")
+    auctions = conn.execute(build_lifecycle_query).fetchone()[0]
+    live = conn.execute("SELECT COUNT(*) FROM server_lifecycle WHERE gone_at IS NULL").fetchone()[0]
+    print(f"Built lifecycles of {auctions} auctions ({live} live)")
+
+
+def update_lifecycle(conn) -> tuple[int, int]:
+    """Advance server_lifecycle by the auctions in server_incoming.
+
+    Only the fetched ids and the previously live ones are touched.
+
+    Returns:
+        tuple: (auctions listed by this run, auctions gone since the last one)
+    """
+    listed = conn.execute(update_lifecycle_query).fetchone()[0]
+    gone = conn.execute(mark_gone_query).fetchone()[0]
+    return listed, gone
+
+
+def rebuild_lifecycle_database(db_path: str):
+    """Rebuild server_lifecycle from the history, e.g. after a backfill."""
+    print(f"Opening database: {db_path}")
+    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
+
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        ensure_schema(conn)
+        conn.execute(create_lifecycle_table_query)
+        build_lifecycle(conn)
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        raise e
+    finally:
+        conn.close()
+
+
+def merge_incoming(conn, metrics: RunMetrics = None):
+    """Merge server_incoming into the server tables, keeping the latest record per auction per day.
+
+    Only the (id, day) partitions present in the batch are compared and
+    rewritten, so the cost scales with the feed rather than with the history.
+    Timed and counted as the 'dedup' and 'merge' stages of `metrics`.
+    """
+    metrics = metrics or RunMetrics()
+    with metrics.stage('dedup'):
+        conn.execute(deduplicate_incoming_query)
+        touched_from = conn.execute("SELECT MIN(date_trunc('d', seen)) FROM server_merge").fetchone()[0]
+        if touched_from is not None:
+            metrics.count('superseded', conn.execute(discard_superseded_query, [touched_from]).fetchone()[0])
+            replaced = metrics.count('replaced', conn.execute(replace_existing_query, [touched_from]).fetchone()[0])
+            if replaced:
+                print(f"Replacing {replaced} older same-day records")
+    with metrics.stage('merge'):
+        metrics.count('inserted', conn.execute(merge_query).fetchone()[0])
+        configs = metrics.count('configs', upsert_configs(conn, 'server_merge'))
+        if configs:
+            print(f"Stored {configs} new or changed server configs")
+        conn.execute("DROP TABLE server_merge")
+
+
+def current_database_path(db_path: str) -> str:
+    """Path of the current-listings artifact next to a database, e.g. sb-current.duckdb.wasm."""
+    directory, name = os.path.split(db_path)
+    stem, dot, extensions = name.partition('.')
+    return os.path.join(directory, f"{stem}-current{dot}{extensions}")
+
+
+def export_current_database(db_path: str, current_path: str):
+    """Write the current listings into a small database with the same server schema.
+
+    Pages that only need the latest snapshot can attach this file first and
+    fetch the full history lazily; their SQL runs unchanged against either.
+    """
+    print(f"Exporting current listings to {current_path}")
+    tmp_path = current_path + '.tmp'
+    for stale in (tmp_path, tmp_path + '.wal'):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    conn = duckdb.connect(tmp_path)
+    try:
+        conn.execute(f"ATTACH '{db_path}' AS src (READ_ONLY)")
+        conn.execute(create_table_query)
+        exported = conn.execute(export_current_query).fetchone()[0]
+        conn.execute("DETACH src")
+    finally:
+        conn.close()
+    os.replace(tmp_path, current_path)
+
+    full_size = os.path.getsize(db_path)
+    current_size = os.path.getsize(current_path)
+    print(f"Current listings: {exported} records, {current_size / 1024:.0f} KiB "
+          f"({current_size / full_size:.1%} of the full database)")
 
-        # Get current record count
-        before_count = conn.execute("SELECT COUNT(*) FROM server").fetchone()[0]
-        print(f"Existing records: {before_count}")
 
-        # Create temp table for incoming data
-        conn.execute(create_temp_table_query)
+def compact_database(db_path: str) -> bool:
+    """Rewrite the database into a fresh file once COMPACT_FREE_RATIO of its blocks are free.
 
-        # Import new auction data into temp table
-        print("Importing new auction data...")
-        conn.execute(import_auction_query % auction_json_path)
+    DuckDB reuses freed blocks but never shrinks the file, and the file is
+    what every visitor downloads. Each tick replaces the day's rows and the
+    daily re-cluster rewrites whole tables, so free blocks pile up between
+    compactions.
+    """
+    conn = duckdb.connect(db_path, read_only=True)
+    total_blocks, free_blocks = conn.execute("""
+        SELECT total_blocks, free_blocks FROM pragma_database_size()
+        WHERE database_name = current_database()
+    """).fetchone()
+    conn.close()
+    if free_blocks <= total_blocks * COMPACT_FREE_RATIO:
+        return False
+
+    before = os.path.getsize(db_path)
+    tmp_path = db_path + '.compact'
+    for stale in (tmp_path, tmp_path + '.wal'):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    conn = duckdb.connect()
+    try:
+        conn.execute(f"ATTACH '{db_path}' AS src (READ_ONLY)")
+        conn.execute(f"ATTACH '{tmp_path}' AS dst")
+        conn.execute("COPY FROM DATABASE src TO dst")
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+    print(f"Compacted database: {before / (1024 * 1024):.1f} MiB -> "
+          f"{os.path.getsize(db_path) / (1024 * 1024):.1f} MiB")
+    return True
 
-        incoming_count = conn.execute("SELECT COUNT(*) FROM server_incoming").fetchone()[0]
-        print(f"Incoming records: {incoming_count}")
 
-        # read_json() fills columns the feed no longer has with NULL rather than
-        # failing, so a reshaped feed turns into an import of nothing instead of
-        # an error. Fetching servers but importing none can only mean that.
-        if incoming_count == 0:
-            raise ValueError("Auction feed produced 0 importable records - the feed shape has likely changed")
+def cluster_if_due(conn):
+    """Rewrite the server tables in OBSERVATION_ORDER and CONFIG_ORDER once per day."""
+    conn.execute(create_maintenance_query)
+    clustered_today = conn.execute("""
+        SELECT COUNT(*) > 0 FROM maintenance
+        WHERE task = 'cluster' AND last_run::DATE >= current_date
+    """).fetchone()[0]
+    if clustered_today:
+        return
 
-        # Merge new data (only insert if not already exists for this day)
-        print("Merging new data...")
-        conn.execute(merge_query)
+    print("Re-clustering server tables...")
+    for query in cluster_queries:
+        conn.execute(query)
+    conn.execute("INSERT OR REPLACE INTO maintenance VALUES ('cluster', NOW())")
 
-        after_merge = conn.execute("SELECT COUNT(*) FROM server").fetchone()[0]
-        new_records = after_merge - before_count
-        print(f"New records added: {new_records}")
 
-        # Deduplicate (in case of overlapping timestamps)
-        print("Deduplicating...")
+def deduplicate_database(db_path: str):
+    """Rebuild the observations keeping only the latest record per auction per day."""
+    print(f"Opening database: {db_path}")
+    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
+
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        ensure_schema(conn)
+        before_count = conn.execute("SELECT COUNT(*) FROM server_observation").fetchone()[0]
+        print("Deduplicating full table...")
         conn.execute(deduplicate_query)
+        after_count = conn.execute("SELECT COUNT(*) FROM server_observation").fetchone()[0]
+        refresh_stats(conn, full=True)
+        conn.execute("COMMIT")
+        print(f"Removed {before_count - after_count} duplicate records ({after_count} remaining)")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        raise e
+    finally:
+        conn.close()
 
-        after_dedup = conn.execute("SELECT COUNT(*) FROM server").fetchone()[0]
-        print(f"Records after deduplication: {after_dedup}")
+
+def update_database(db_path: str, auction_feed: str = None, standard_feed: str = None,
+                    retention_days: int = 90, feed_state: dict = None, metrics: RunMetrics = None,
+                    archive_dir: str = None):
+    """Incrementally update the DuckDB database with new data.
+
+    The feeds are the spool files fetch_hetzner_data() returns; load_feed()
+    flattens them into the auction_feed and standard_feed temp tables the
+    import queries read. A feed of
+    None is unchanged since the last run: no auctions are merged, and the
+    stored standard snapshot is kept but marked as seen now. `feed_state`
+    (feed name -> validators) is stored in the same transaction.
+
+    Each step is timed as a stage of `metrics`, and the rows it changed are
+    counted from the statements' own results. With `archive_dir`, the
+    flattened auction feed is also appended to that snapshot archive (see
+    snapshot_archive.py).
+
+    Returns the days whose rows the run changed, so exports can skip the rest.
+    """
+    metrics = metrics or RunMetrics()
+    print(f"Opening database: {db_path}")
+
+    # Check if database exists
+    db_exists = os.path.exists(db_path)
+
+    conn = duckdb.connect(db_path, config={'threads': multiprocessing.cpu_count()})
+
+    try:
+        conn.execute("BEGIN TRANSACTION")
+
+        # Create the tables and view if they don't exist, or migrate a flat table
+        with metrics.stage('schema'):
+            if not db_exists:
+                print("Creating new database...")
+            ensure_schema(conn)
+            ensure_price_events(conn)
+            ensure_lifecycle(conn)
+
+            conn.execute(create_touched_days_query)
+            conn.execute(create_orphan_candidates_query)
+
+        if auction_feed is not None:
+            # Flatten the spooled feed into the auction_feed temp table
+            print("Importing new auction data...")
+            with metrics.stage('transform'):
+                records = metrics.count('auction records', load_feed(
+                    conn, 'auction_feed', auction_feed_query, auction_feed, AUCTION_FEED_REQUIRED))
+
+            # Keep the snapshot itself before it is folded into the day's records
+            if archive_dir:
+                with metrics.stage('archive'):
+                    archived = metrics.count('archived', archive_snapshot(conn, archive_dir))
+                print(f"Archived the snapshot to {archive_dir} ({archived} new or changed auctions)")
+
+            # Map it into the incoming batch
+            with metrics.stage('load'):
+                conn.execute(create_temp_table_query)
+                incoming_count = metrics.count('incoming', conn.execute(import_auction_query).fetchone()[0])
+                conn.execute("DROP TABLE auction_feed")
+            print(f"Incoming records: {incoming_count} of {records}")
+
+            # Fetching servers but importing none can only mean the feed was
+            # reshaped in a way the transform no longer maps.
+            if incoming_count == 0:
+                raise ValueError("Auction feed produced 0 importable records - the feed shape has likely changed")
+
+            # Before the merge replaces same-day rows with the latest
+            with metrics.stage('events'):
+                events = metrics.count('price events', record_price_events(conn))
+                print(f"Price changes: {events}")
+                listed, gone = update_lifecycle(conn)
+                metrics.count('listed', listed)
+                metrics.count('gone', gone)
+                print(f"Lifecycles: {listed} listed, {gone} gone since the last run")
+
+            # Merge new data against only the day partitions the batch touches
+            print("Merging new data...")
+            merge_incoming(conn, metrics)
+            with metrics.stage('merge'):
+                touch_days(conn, "server_incoming")
+            print(f"New records added: {metrics.rows.get('inserted', 0) - metrics.rows.get('replaced', 0)}")
+        else:
+            print("Auction feed unchanged, nothing to merge")
 
         # Purge old auction data (standard servers don't have history)
-        if retention_days > 0:
-            print(f"Purging auction records older than {retention_days} days...")
-            conn.execute(f"""
-                DELETE FROM server
-                WHERE server_type = 'auction' AND seen < NOW() - INTERVAL '{retention_days} days'
-            """)
-
-            final_count = conn.execute("SELECT COUNT(*) FROM server").fetchone()[0]
-            purged = after_dedup - final_count
-            if purged > 0:
-                print(f"Purged {purged} old records")
-
-        # Update standard servers if path provided (fresh snapshot each time)
-        if standard_json_path:
-            print("\n--- Updating standard servers ---")
-            # Delete existing standard servers (snapshot replacement)
-            conn.execute("DELETE FROM server WHERE server_type = 'standard'")
-
-            # Import fresh standard server data
-            print("Importing standard server data...")
-            conn.execute(import_standard_query % standard_json_path)
-
-            standard_count = conn.execute("SELECT COUNT(*) FROM server WHERE server_type = 'standard'").fetchone()[0]
-            print(f"Standard servers imported: {standard_count}")
-
-            # Same silent-NULL trap as above, and the one that hid the standard
-            # import being dead for months: a reshaped feed unnests to no rows.
-            if standard_count == 0:
-                raise ValueError("Standard feed produced 0 importable records - the feed shape has likely changed")
+        with metrics.stage('purge'):
+            if retention_days > 0:
+                print(f"Purging auction records older than {retention_days} days...")
+                touch_days(conn, f"server WHERE server_type = 'auction' AND seen < NOW() - INTERVAL '{retention_days} days'")
+                conn.execute(f"""
+                    INSERT INTO orphan_candidates
+                    SELECT DISTINCT id FROM server
+                    WHERE server_type = 'auction' AND seen < NOW() - INTERVAL '{retention_days} days'
+                """)
+                purged = metrics.count('purged', conn.execute(f"""
+                    DELETE FROM server_observation o
+                    USING server_config c
+                    WHERE o.id = c.id
+                        AND c.server_type = 'auction' AND o.seen < NOW() - INTERVAL '{retention_days} days'
+                """).fetchone()[0])
+
+                conn.execute(f"DELETE FROM price_event WHERE ts < NOW() - INTERVAL '{retention_days} days'")
+                conn.execute(f"DELETE FROM server_last_price WHERE seen < NOW() - INTERVAL '{retention_days} days'")
+                conn.execute(f"DELETE FROM server_lifecycle WHERE last_seen < NOW() - INTERVAL '{retention_days} days'")
+
+                if purged > 0:
+                    print(f"Purged {purged} old records")
+
+        # Update standard servers if a feed was fetched (fresh snapshot each time)
+        with metrics.stage('standard refresh'):
+            if standard_feed is not None:
+                print("\n--- Updating standard servers ---")
+                # Delete existing standard servers (snapshot replacement)
+                touch_days(conn, "server WHERE server_type = 'standard'")
+                conn.execute("""
+                    DELETE FROM server_observation
+                    WHERE id IN (SELECT id FROM server_config WHERE server_type = 'standard')
+                """)
+                conn.execute("DELETE FROM server_config WHERE server_type = 'standard'")
+
+                # Import fresh standard server data
+                print("Importing standard server data...")
+                conn.execute(create_temp_table_query)
+                metrics.count('standard records', load_feed(
+                    conn, 'standard_feed', standard_feed_query, standard_feed, STANDARD_FEED_REQUIRED))
+                conn.execute(import_standard_query)
+                conn.execute("DROP TABLE standard_feed")
+                upsert_configs(conn, 'server_incoming')
+                touch_days(conn, "server_incoming")
+                standard_count = metrics.count('standard', conn.execute(f"""
+                    INSERT INTO server_observation
+                    SELECT id, seen, price, fixed_price FROM server_incoming
+                    ORDER BY {OBSERVATION_ORDER}
+                """).fetchone()[0])
+                print(f"Standard servers imported: {standard_count}")
+
+                # Same silent-NULL trap as above, and the one that hid the standard
+                # import being dead for months: a reshaped feed unnests to no rows.
+                if standard_count == 0:
+                    raise ValueError("Standard feed produced 0 importable records - the feed shape has likely changed")
+            else:
+                # The snapshot is still current; keep it inside the "recently seen"
+                # window the frontend anchors on max(seen).
+                print("\nStandard feed unchanged, refreshing seen")
+                touch_days(conn, "server WHERE server_type = 'standard'")
+                conn.execute("""
+                    UPDATE server_observation SET seen = NOW()
+                    WHERE id IN (SELECT id FROM server_config WHERE server_type = 'standard')
+                """)
+                touch_days(conn, "server WHERE server_type = 'standard'")
+
+        # Configs whose last observation was purged
+        with metrics.stage('purge'):
+            if conn.execute("SELECT COUNT(*) > 0 FROM orphan_candidates").fetchone()[0]:
+                metrics.count('orphaned configs', conn.execute(delete_orphaned_configs_query).fetchone()[0])
 
         # Enrich all servers with CPU specs (cores, threads, generation, scores)
         print("\n--- Enriching CPU data ---")
-        cpu_specs = load_cpu_specs()
-        enrich_cpu_data(conn, cpu_specs)
+        with metrics.stage('enrich'):
+            cpu_specs = load_cpu_specs()
+            metrics.count('enriched', enrich_cpu_data(conn, cpu_specs))
 
-        conn.execute("COMMIT")
+        with metrics.stage('stats'):
+            refresh_stats(conn)
+            touched = [row[0] for row in conn.execute("SELECT DISTINCT day FROM touched_days ORDER BY day").fetchall()]
 
-        # Final stats
-        final_count = conn.execute("SELECT COUNT(*) FROM server").fetchone()[0]
-        auction_count = conn.execute("SELECT COUNT(*) FROM server WHERE server_type = 'auction'").fetchone()[0]
-        standard_count = conn.execute("SELECT COUNT(*) FROM server WHERE server_type = 'standard'").fetchone()[0]
-        date_range = conn.execute("""
-            SELECT
-                MIN(seen)::DATE as earliest,
-                MAX(seen)::DATE as latest,
-                COUNT(DISTINCT date_trunc('d', seen)) as days
-            FROM server
-            WHERE server_type = 'auction'
-        """).fetchone()
+        # Keep the published layout clustered for the browser's zone maps
+        with metrics.stage('cluster'):
+            cluster_if_due(conn)
+
+        with metrics.stage('commit'):
+            if feed_state:
+                conn.execute(create_feed_state_query)
+                for feed, validators in feed_state.items():
+                    conn.execute(
+                        "INSERT OR REPLACE INTO feed_state VALUES (?, ?, ?, ?, NOW())",
+                        [feed, validators.get('etag'), validators.get('last_modified'), validators.get('content_hash')],
+                    )
+
+            conn.execute("COMMIT")
 
         print(f"\nDatabase updated successfully!")
-        print(f"Total records: {final_count} (auctions: {auction_count}, standard: {standard_count})")
-        if date_range[0]:
-            print(f"Auction date range: {date_range[0]} to {date_range[1]} ({date_range[2]} days)")
+        return touched
 
     except Exception as e:
         conn.execute("ROLLBACK")
@@ -812,11 +2337,38 @@ def update_database(db_path: str, auction_json_path: str, standard_json_path: st
 
 def print_usage():
     print("Usage: python update_incremental.py <database_path> [retention_days] [--skip-threshold-check]")
+    print("       python update_incremental.py <database_path> --dedup-full")
+    print("       python update_incremental.py <database_path> --reenrich")
+    print("       python update_incremental.py <database_path> --rebuild-lifecycle")
     print("")
     print("Arguments:")
     print("  database_path          Path to the DuckDB database file")
     print("  retention_days         Number of days to keep (default: 90)")
     print("  --skip-threshold-check Skip minimum data checks (for initial setup)")
+    print("  --dedup-full           Maintenance: rebuild the whole table keeping the latest")
+    print("                         record per auction per day, then exit without fetching")
+    print("  --force                Import even if neither feed changed since the last run")
+    print("  --reenrich             Maintenance: recompute the CPU enrichment of all records")
+    print("                         from data/cpu-specs.json, then exit without fetching")
+    print("  --rebuild-lifecycle    Maintenance: derive the auction lifecycle table from the")
+    print("                         stored history, then exit without fetching")
+    print("  --parquet-dir DIR      Also export auction history as day-partitioned Parquet")
+    print("                         to DIR (only changed days are rewritten)")
+    print(f"  --feed-dir DIR         Replay: read the feeds from {AUCTION_FEED_FILE} and")
+    print(f"                         {STANDARD_FEED_FILE} in DIR instead of the Hetzner API")
+    print("                         (a missing file counts as not modified)")
+    print("  --archive-dir DIR      Also append each imported auction feed to the hourly")
+    print("                         Parquet snapshot archive in DIR (see snapshot_archive.py)")
+    print("  --deep                 Validate with full scans instead of the statistics rollups,")
+    print("                         and read every block to verify its checksum")
+    print("  --metrics PATH         Append the run's stage timings and row counts to PATH")
+    print("                         as one line of JSON")
+    print("")
+    print("Also writes the current listings to <name>-current.<ext> next to the database.")
+    print("")
+    print("Exit codes:")
+    print("  2  Validation failed, do not upload")
+    print(f"  {EXIT_UNCHANGED}  Neither feed changed, nothing to upload")
     print("")
     print("Example:")
     print("  python update_incremental.py ../static/sb.duckdb.wasm 90")
@@ -830,16 +2382,98 @@ def main():
     db_path = sys.argv[1]
     retention_days = int(sys.argv[2]) if len(sys.argv) > 2 and not sys.argv[2].startswith('--') else 90
     skip_threshold_check = '--skip-threshold-check' in sys.argv
+    force = '--force' in sys.argv
+    parquet_dir = None
+    if '--parquet-dir' in sys.argv:
+        idx = sys.argv.index('--parquet-dir')
+        if idx + 1 < len(sys.argv):
+            parquet_dir = sys.argv[idx + 1]
+    feed_dir = None
+    if '--feed-dir' in sys.argv:
+        idx = sys.argv.index('--feed-dir')
+        if idx + 1 < len(sys.argv):
+            feed_dir = sys.argv[idx + 1]
+    archive_dir = None
+    if '--archive-dir' in sys.argv:
+        idx = sys.argv.index('--archive-dir')
+        if idx + 1 < len(sys.argv):
+            archive_dir = sys.argv[idx + 1]
+    deep = '--deep' in sys.argv
+    metrics_path = None
+    if '--metrics' in sys.argv:
+        idx = sys.argv.index('--metrics')
+        if idx + 1 < len(sys.argv):
+            metrics_path = sys.argv[idx + 1]
+
+    if '--dedup-full' in sys.argv:
+        if not os.path.exists(db_path):
+            print(f"No database at {db_path}")
+            sys.exit(1)
+        deduplicate_database(db_path)
+        return
+
+    if '--reenrich' in sys.argv:
+        if not os.path.exists(db_path):
+            print(f"No database at {db_path}")
+            sys.exit(1)
+        reenrich_database(db_path)
+        return
 
-    # Create temp files for JSON data
-    temp_auction_json = "/tmp/hetzner_auction_data.json"
-    temp_standard_json = "/tmp/hetzner_standard_data.json"
+    if '--rebuild-lifecycle' in sys.argv:
+        if not os.path.exists(db_path):
+            print(f"No database at {db_path}")
+            sys.exit(1)
+        rebuild_lifecycle_database(db_path)
+        return
 
+    metrics = RunMetrics()
     try:
-        # Pre-flight validation: check if existing database is readable
+        run_update(db_path, metrics, retention_days, skip_threshold_check, force, parquet_dir, feed_dir, deep,
+                   archive_dir)
+    except Exception:
+        metrics.status = 'failed'
+        raise
+    finally:
+        if metrics_path:
+            size = os.path.getsize(db_path) if os.path.exists(db_path) else None
+            metrics.write(metrics_path, database=db_path, size_bytes=size)
+
+
+def run_update(db_path: str, metrics: RunMetrics, retention_days: int, skip_threshold_check: bool,
+               force: bool, parquet_dir: str = None, feed_dir: str = None, deep: bool = False,
+               archive_dir: str = None):
+    """One scheduled run: a single update_tick, turned into the process exit code.
+
+    `db_path` is updated in place and is itself the file that gets uploaded.
+    Exits with 2 when the result must not be uploaded and with EXIT_UNCHANGED
+    when neither feed changed; `metrics.status` says which.
+    """
+    status = update_tick(db_path, metrics, retention_days, skip_threshold_check, force, parquet_dir,
+                         feed_dir, deep, archive_dir)
+    if status == 'unchanged':
+        sys.exit(EXIT_UNCHANGED)
+    if status == 'invalid':
+        sys.exit(2)  # Exit code 2 = validation failure
+
+
+def update_tick(db_path: str, metrics: RunMetrics, retention_days: int, skip_threshold_check: bool = False,
+                force: bool = False, parquet_dir: str = None, feed_dir: str = None, deep: bool = False,
+                archive_dir: str = None, feed_urls: tuple = (HETZNER_AUCTION_API_URL, HETZNER_LIVE_API_URL),
+                session: requests.Session = None) -> str:
+    """Validate, fetch, update, compact, validate again and publish, once.
+
+    Feeds come from `feed_dir` when given, otherwise from `feed_urls` (auction,
+    standard) over `session` or a session of its own. Returns the run's status,
+    also kept in `metrics.status`: 'ok', 'unchanged' when neither feed changed,
+    or 'invalid' when the database must not be uploaded.
+    """
+    feed_state = {}
+
+    # Pre-flight validation: check if existing database is readable
+    with metrics.stage('pre-flight validation'):
         if os.path.exists(db_path):
             print("\n=== Pre-flight database validation ===")
-            is_valid, error_msg, stats = validate_database(db_path)
+            is_valid, error_msg, stats = validate_database(db_path, deep)
 
             if not is_valid:
                 print(f"WARNING: Existing database failed validation: {error_msg}")
@@ -847,51 +2481,111 @@ def main():
                 # Don't exit - we'll create/update and validate after
             else:
                 print(f"Existing database OK: {stats['auctions']} auctions, {stats['days']} days of data")
+                # Only trust the stored validators if the data they describe is intact
+                if not force:
+                    feed_state = load_feed_state(db_path)
         else:
             print(f"No existing database at {db_path}, will create new one")
 
-        # Fetch fresh data from Hetzner
-        fetch_hetzner_data(
-            HETZNER_AUCTION_API_URL,
-            temp_auction_json,
-            "auction servers",
-            transform=transform_auction_server,
-        )
-        fetch_hetzner_data(
-            HETZNER_LIVE_API_URL,
-            temp_standard_json,
-            "standard servers",
-            transform=transform_standard_server,
-        )
-
-        # Update database incrementally
-        update_database(db_path, temp_auction_json, temp_standard_json, retention_days)
-
-        # Post-update validation: verify database integrity before upload
-        print("\n=== Post-update validation ===")
-        is_valid, error_msg, stats = validate_database(db_path)
-
-        if not is_valid:
-            print(f"CRITICAL: Database validation failed after update: {error_msg}")
-            print("Database may be corrupted. DO NOT UPLOAD.")
-            sys.exit(2)  # Exit code 2 = validation failure
-
-        passes_check, warning = check_data_integrity(stats, skip_threshold_check)
-
-        if not passes_check:
-            print(f"CRITICAL: Data integrity check failed: {warning}")
-            print("Database has insufficient data. DO NOT UPLOAD.")
-            print("Use --skip-threshold-check to override (for initial setup only)")
-            sys.exit(2)  # Exit code 2 = validation failure
-
-        print(f"Validation PASSED: {stats['auctions']} auctions, {stats['days']} days")
-        print("Database is safe to upload.")
-
-    finally:
-        # Cleanup temp files
-        for temp_file in [temp_auction_json, temp_standard_json]:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+    with metrics.stage('fetch'):
+        if feed_dir:
+            # Replay a captured snapshot
+            auction_feed, auction_validators = read_feed_file(
+                os.path.join(feed_dir, AUCTION_FEED_FILE), "auction servers", feed_state.get('auction'))
+            standard_feed, standard_validators = read_feed_file(
+                os.path.join(feed_dir, STANDARD_FEED_FILE), "standard servers", feed_state.get('standard'))
+        else:
+            # Fetch fresh data from Hetzner, both feeds at once over one session
+            auction_url, standard_url = feed_urls
+            own_session = session is None
+            if own_session:
+                session = create_http_session()
+            try:
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    auction_fetch = pool.submit(
+                        fetch_hetzner_data,
+                        auction_url,
+                        "auction servers",
+                        validators=feed_state.get('auction'),
+                        session=session,
+                    )
+                    standard_fetch = pool.submit(
+                        fetch_hetzner_data,
+                        standard_url,
+                        "standard servers",
+                        validators=feed_state.get('standard'),
+                        session=session,
+                    )
+                    auction_feed, auction_validators = auction_fetch.result()
+                    standard_feed, standard_validators = standard_fetch.result()
+            finally:
+                if own_session:
+                    session.close()
+
+    if auction_feed is None and standard_feed is None:
+        print("\nNeither feed changed since the last run, nothing to update.")
+        print("\nStage timings: " + metrics.summary())
+        metrics.status = 'unchanged'
+        return metrics.status
+
+    # Update database incrementally
+    with metrics.stage('update'):
+        try:
+            touched_days = update_database(
+                db_path,
+                auction_feed,
+                standard_feed,
+                retention_days,
+                feed_state={'auction': auction_validators, 'standard': standard_validators},
+                metrics=metrics,
+                archive_dir=archive_dir,
+            )
+        finally:
+            for spool_path in (auction_feed, standard_feed):
+                if spool_path is not None:
+                    os.remove(spool_path)
+
+    with metrics.stage('compact'):
+        compact_database(db_path)
+
+    # Post-update validation: verify database integrity before upload
+    print("\n=== Post-update validation ===")
+    with metrics.stage('post-update validation'):
+        is_valid, error_msg, stats = validate_database(db_path, deep)
+
+    print("\nStage timings: " + metrics.summary())
+    print(f"Peak RSS: {peak_rss_mb():.0f} MiB")
+
+    if not is_valid:
+        print(f"CRITICAL: Database validation failed after update: {error_msg}")
+        print("Database may be corrupted. DO NOT UPLOAD.")
+        metrics.status = 'invalid'
+        return metrics.status
+
+    passes_check, warning = check_data_integrity(stats, skip_threshold_check)
+
+    if not passes_check:
+        print(f"CRITICAL: Data integrity check failed: {warning}")
+        print("Database has insufficient data. DO NOT UPLOAD.")
+        print("Use --skip-threshold-check to override (for initial setup only)")
+        metrics.status = 'invalid'
+        return metrics.status
+
+    print(f"Validation PASSED: {stats['auctions']} auctions, {stats['days']} days")
+    print(f"Total records: {stats['total']} (auctions: {stats['auctions']}, standard: {stats['standard']})")
+    if stats['earliest']:
+        print(f"Auction date range: {stats['earliest']:%Y-%m-%d} to {stats['latest']:%Y-%m-%d} ({stats['days']} days)")
+
+    print("Database is safe to upload.")
+
+    # Only a validated database gets a current-listings artifact
+    print("\n=== Publishing ===")
+    with metrics.stage('publish'):
+        export_current_database(db_path, current_database_path(db_path))
+        if parquet_dir:
+            export_parquet(db_path, parquet_dir, days=touched_days)
+
+    return metrics.status
 
 
 if __name__ == "__main__":
@@ -77,7 +77,7 @@ export type ServerConfiguration = {
 };
 
 // Check if a column exists in the database
-async function hasColumn(
+export async function hasColumn(
   conn: AsyncDuckDBConnection,
   columnName: string,
 ): Promise<boolean> {
@@ -107,6 +107,7 @@ export async function getConfigurations(
   const hasServerType = await hasServerTypeColumn(conn);
   const hasNewColumns = await hasColumn(conn, "setup_price");
   const hasCpuScoreColumns = await hasColumn(conn, "cpu_score");
+  const hasConfigKey = await hasColumn(conn, "config_key");
 
   const configurations_filter_query = generateFilterQuery(
     filter,
@@ -144,33 +145,63 @@ export async function getConfigurations(
             NULL AS cpu_score,
             NULL AS cpu_multicore_score,`;
 
-  const configurations_query = SQL`
-    SELECT
-        * exclude(last_seen),
-        extract('epoch' from last_seen) as last_seen
-    FROM (
-        SELECT
-            `
-    .append(serverTypeSelect)
-    .append(newColumnsSelect).append(SQL`
-            ANY_VALUE(information)::JSON AS information,
+  // Databases with a precomputed config_key (a hash of the hardware columns
+  // below) group on that one integer; the hardware columns are then constant
+  // per group, so they are picked once instead of cast to JSON on every row.
+  const hw = hasConfigKey
+    ? (column: string) => `ANY_VALUE(${column})`
+    : (column: string) => column;
+  const hardwareSelect = `
+            ${hw("cpu")} AS cpu,
+            ${hw("ram_size")} AS ram_size,
+            ${hw("is_ecc")} AS is_ecc,
+            ${hw("hdd_arr")}::JSON AS hdd_arr,
+            ${hw("nvme_size")} AS nvme_size,
+            ${hw("nvme_drives")}::JSON AS nvme_drives,
+            ${hw("sata_size")} AS sata_size,
+            ${hw("sata_drives")}::JSON AS sata_drives,
+            ${hw("hdd_size")} AS hdd_size,
+            ${hw("hdd_drives")}::JSON AS hdd_drives,
+            ${hw("with_gpu")} AS with_gpu,
+            ${hw("with_inic")} AS with_inic,
+            ${hw("with_hwr")} AS with_hwr,
+            ${hw("with_rps")} AS with_rps,
+            ${hw("nvme_count")} AS nvme_count,
+            ${hw("sata_count")} AS sata_count,
+            ${hw("hdd_count")} AS hdd_count,`;
+  const hardwareGroupBy = hasConfigKey
+    ? `
+            config_key`
+    : `
             cpu,
             ram_size,
             is_ecc,
-            hdd_arr::JSON AS hdd_arr,
+            hdd_arr::JSON,
             nvme_size,
-            nvme_drives::JSON AS nvme_drives,
+            nvme_drives::JSON,
             sata_size,
-            sata_drives::JSON AS sata_drives,
+            sata_drives::JSON,
             hdd_size,
-            hdd_drives::JSON AS hdd_drives,
+            hdd_drives::JSON,
             with_gpu,
             with_inic,
             with_hwr,
             with_rps,
             nvme_count,
             sata_count,
-            hdd_count,
+            hdd_count`;
+
+  const configurations_query = SQL`
+    SELECT
+        * exclude(last_seen),
+        extract('epoch' from last_seen) as last_seen
+    FROM (
+        SELECT
+            `
+    .append(serverTypeSelect)
+    .append(newColumnsSelect).append(SQL`
+            ANY_VALUE(information)::JSON AS information,`)
+    .append(hardwareSelect).append(SQL`
             MAX(seen) AS last_seen,
             MIN(price + ${HETZNER_IPV4_COST_CENTS / 100}) AS min_price,
             MAX_BY(price + ${HETZNER_IPV4_COST_CENTS / 100}, seen) AS price,
@@ -188,24 +219,8 @@ export async function getConfigurations(
         GROUP BY
             `,
     )
-    .append(serverTypeGroupBy).append(`
-            cpu,
-            ram_size,
-            is_ecc,
-            hdd_arr::JSON,
-            nvme_size,
-            nvme_drives::JSON,
-            sata_size,
-            sata_drives::JSON,
-            hdd_size,
-            hdd_drives::JSON,
-            with_gpu,
-            with_inic,
-            with_hwr,
-            with_rps,
-            nvme_count,
-            sata_count,
-            hdd_count
+    .append(serverTypeGroupBy)
+    .append(hardwareGroupBy).append(`
     )`);
   if (filter.recentlySeen) {
     configurations_query.append(
@@ -4,7 +4,7 @@
 
 import { CITY_PREFIXES } from "@server-radar/filter-spec/constants";
 import { getData } from "$lib/api/frontend/dbapi";
-import { generateFilterQuery } from "$lib/api/frontend/filter";
+import { generateFilterQuery, hasColumn } from "$lib/api/frontend/filter";
 import type { ServerFilter } from "$lib/filter";
 import type { AsyncDuckDBConnection } from "@duckdb/duckdb-wasm";
 import SQL from "sql-template-strings";
@@ -84,6 +84,27 @@ export type TemporalStat = {
   y: number;
 };
 
+/**
+ * Whether the database carries the daily rollups `update_incremental.py`
+ * maintains (stats_daily_volume, stats_daily_cpu_price,
+ * stats_daily_price_index). Older database files don't; the queries below
+ * then aggregate the server table as before.
+ */
+async function hasRollups(conn: AsyncDuckDBConnection): Promise<boolean> {
+  try {
+    const result = await getData<{ count: number }>(
+      conn,
+      SQL`SELECT count(*)::int as count FROM duckdb_tables() WHERE table_name IN ('stats_daily_volume', 'stats_daily_cpu_price', 'stats_daily_price_index')`,
+    );
+    return result.length > 0 && result[0].count === 3;
+  } catch {
+    return false;
+  }
+}
+
+// Epoch seconds of a rollup's day, matching date_trunc('d', seen) on the raw rows
+const ROLLUP_DAY = "EXTRACT(epoch FROM day::TIMESTAMP)::int";
+
 /**
  * The days the crawler has observations for, as epoch seconds at UTC midnight.
  *
@@ -94,7 +115,10 @@ export type TemporalStat = {
 export async function getObservedDays(
   conn: AsyncDuckDBConnection,
 ): Promise<number[]> {
-  const query = SQL`
+  const query = (await hasRollups(conn))
+    ? SQL`select distinct `.append(ROLLUP_DAY).append(`
+			as day from stats_daily_volume order by day`)
+    : SQL`
 		select distinct
 			EXTRACT(epoch FROM date_trunc('d', seen))::int as day
 		from
@@ -188,6 +212,13 @@ export async function getDiskPriceStats(
 export async function getMinPriceStats(
   conn: AsyncDuckDBConnection,
 ): Promise<TemporalStat[]> {
+  if (await hasRollups(conn)) {
+    const query = SQL`select `.append(ROLLUP_DAY).append(` as x, min(min_price) as y
+		from stats_daily_cpu_price
+		group by x
+		order by x`);
+    return getData<TemporalStat>(conn, query);
+  }
   const query = SQL`
 		select
 			EXTRACT(epoch FROM date_trunc('d', seen))::int as x,
@@ -258,6 +289,16 @@ export async function getVolumeStats(
   conn: AsyncDuckDBConnection,
   country?: string,
 ): Promise<TemporalStat[]> {
+  if (await hasRollups(conn)) {
+    const query = SQL`select `.append(ROLLUP_DAY).append(
+      ` as x, sum(listings)::int as y from stats_daily_volume`,
+    );
+    if (country) {
+      query.append(SQL` where location = ${country}`);
+    }
+    query.append(` group by x order by x`);
+    return getData<TemporalStat>(conn, query);
+  }
   const query = SQL`
 		select
 			x, count(distinct id)::int as y
@@ -318,7 +359,20 @@ export async function getVolumeByCountryDatacenters(
   conn: AsyncDuckDBConnection,
   country: string,
 ): Promise<{ [datacenter: string]: TemporalStat[] }> {
-  const query = SQL`
+  const query = (await hasRollups(conn))
+    ? SQL`select datacenter, `.append(ROLLUP_DAY).append(SQL` as x,
+			sum(listings)::int as y
+		from stats_daily_volume
+		where
+			location = ${country}
+			and datacenter is not null
+			and datacenter != ''
+		group by
+			datacenter, x
+		order by
+			datacenter, x
+	`)
+    : SQL`
 		select
 			datacenter,
 			EXTRACT(epoch FROM date_trunc('d', seen))::int as x,
@@ -347,59 +401,46 @@ export async function getVolumeByCountryDatacenters(
   return result;
 }
 
+/**
+ * Daily listing volume per datacenter and country, in one round trip rather
+ * than one query per datacenter × country pair.
+ */
 export async function getVolumeByDatacenterByCountryStats(
   conn: AsyncDuckDBConnection,
 ): Promise<{ [datacenter: string]: { [country: string]: TemporalStat[] } }> {
-  // Get all datacenters and countries
-  const datacentersQuery = SQL`
-		select distinct datacenter
-		from server
-		where datacenter is not null and datacenter != ''
-		order by datacenter
-	`;
-
-  const countriesQuery = SQL`
-		select distinct location as country
-		from server
-		where location is not null and location != ''
-		order by location
-	`;
+  const query = (await hasRollups(conn))
+    ? SQL`select datacenter, location as country, `.append(ROLLUP_DAY)
+        .append(` as x,
+			sum(listings)::int as y
+		from stats_daily_volume`)
+    : SQL`
+		select
+			datacenter,
+			location as country,
+			EXTRACT(epoch FROM date_trunc('d', seen))::int as x,
+			count(distinct id)::int as y
+		from
+			server`;
+  query.append(`
+		where
+			datacenter is not null and datacenter != ''
+			and location is not null and location != ''
+		group by
+			datacenter, country, x
+		order by
+			datacenter, country, x
+	`);
 
-  const [datacenters, countries] = await Promise.all([
-    getData<{ datacenter: string }>(conn, datacentersQuery),
-    getData<{ country: string }>(conn, countriesQuery),
-  ]);
+  const rows = await getData<
+    { datacenter: string; country: string } & TemporalStat
+  >(conn, query);
 
   const result: {
     [datacenter: string]: { [country: string]: TemporalStat[] };
   } = {};
-
-  // Initialize the result structure
-  for (const dc of datacenters) {
-    result[dc.datacenter] = {};
+  for (const { datacenter, country, x, y } of rows) {
+    ((result[datacenter] ??= {})[country] ??= []).push({ x, y });
   }
-
-  // Query for each datacenter and country combination
-  const promises = [];
-
-  for (const dc of datacenters) {
-    for (const country of countries) {
-      const promise = getVolumeByDatacenterStats(
-        conn,
-        dc.datacenter,
-        country.country,
-      ).then((stats) => {
-        if (!result[dc.datacenter]) {
-          result[dc.datacenter] = {};
-        }
-        result[dc.datacenter][country.country] = stats;
-      });
-      promises.push(promise);
-    }
-  }
-
-  await Promise.all(promises);
-
   return result;
 }
 
@@ -427,6 +468,16 @@ export async function getVolumeByCPUVendorStats(
   conn: AsyncDuckDBConnection,
   vendor: string,
 ): Promise<TemporalStat[]> {
+  if (await hasRollups(conn)) {
+    const query = SQL`select `.append(ROLLUP_DAY).append(SQL` as x,
+			sum(listings)::int as y
+		from stats_daily_cpu_price
+		where cpu_vendor = ${vendor}
+		group by x
+		order by x
+	`);
+    return getData<TemporalStat>(conn, query);
+  }
   const query = SQL`
 		select
 			x, count(distinct id)::int as y
@@ -450,25 +501,33 @@ export async function getVolumeByCPUVendorStats(
 export async function getPriceIndexStats(
   conn: AsyncDuckDBConnection,
 ): Promise<TemporalStat[]> {
+  if (await hasRollups(conn)) {
+    const query = SQL`select `.append(ROLLUP_DAY).append(` as x, price_index as y
+		from stats_daily_price_index
+		order by x`);
+    return getData<TemporalStat>(conn, query);
+  }
+  // A configuration is one hardware tuple; newer databases carry it hashed
+  // into config_key, which is far cheaper to group and partition by than the
+  // drive lists.
+  const configColumns = (await hasColumn(conn, "config_key"))
+    ? "config_key"
+    : `cpu, ram_size, is_ecc, hdd_arr,
+						nvme_size, nvme_drives,
+						sata_size, sata_drives,
+						hdd_size, hdd_drives,
+						with_gpu, with_inic, with_hwr, with_rps`;
   const query = SQL`
 		WITH config_daily_prices AS (
 				-- Calculate the daily min price for each configuration
 				SELECT
 						date_trunc('d', seen) AS date,
-						cpu, ram_size, is_ecc, hdd_arr,
-						nvme_size, nvme_drives,
-						sata_size, sata_drives,
-						hdd_size, hdd_drives,
-						with_gpu, with_inic, with_hwr, with_rps,
+						`.append(configColumns).append(SQL`,
 						min(price) AS daily_min_price,
 						COUNT(*) AS server_count
 				FROM server
 				GROUP BY
-						cpu, ram_size, is_ecc, hdd_arr,
-						nvme_size, nvme_drives,
-						sata_size, sata_drives,
-						hdd_size, hdd_drives,
-						with_gpu, with_inic, with_hwr, with_rps,
+						`).append(configColumns).append(SQL`,
 						date_trunc('d', seen)
 		),
 		-- Per-day rolling 90-day median baseline for each configuration
@@ -478,11 +537,7 @@ export async function getPriceIndexStats(
 						daily_min_price,
 						server_count,
 						MEDIAN(daily_min_price) OVER (
-								PARTITION BY cpu, ram_size, is_ecc, hdd_arr,
-										nvme_size, nvme_drives,
-										sata_size, sata_drives,
-										hdd_size, hdd_drives,
-										with_gpu, with_inic, with_hwr, with_rps
+								PARTITION BY `).append(configColumns).append(SQL`
 								ORDER BY date
 								RANGE BETWEEN INTERVAL '90' DAY PRECEDING AND CURRENT ROW
 						) AS baseline_price
@@ -510,7 +565,7 @@ export async function getPriceIndexStats(
 				weighted_sum / NULLIF(total_servers, 0) as y
 		FROM daily_price_index
 		ORDER BY date;
-	`;
+	`);
   return getData<TemporalStat>(conn, query);
 }
 
@@ -578,9 +633,19 @@ export async function getVolumeByCPUModelStats(
   model?: string,
   limit?: number,
 ): Promise<{ [model: string]: TemporalStat[] }> {
-  // If a specific model is requested, get volume data for just that model
-  if (model) {
-    const query = SQL`
+  const rollups = await hasRollups(conn);
+  const modelVolumeQuery = (model: string) =>
+    rollups
+      ? SQL`select `.append(ROLLUP_DAY).append(SQL` as x,
+        sum(listings)::int as y
+      from stats_daily_cpu_price
+      where
+        cpu_vendor = ${vendor}
+        and cpu = ${model}
+      group by x
+      order by x
+    `)
+      : SQL`
       select
         EXTRACT(epoch FROM date_trunc('d', seen))::int as x,
         count(distinct id)::int as y
@@ -595,6 +660,10 @@ export async function getVolumeByCPUModelStats(
         x
     `;
 
+  // If a specific model is requested, get volume data for just that model
+  if (model) {
+    const query = modelVolumeQuery(model);
+
     const result = await getData<TemporalStat>(conn, query);
     return { [model]: result };
   }
@@ -630,20 +699,7 @@ export async function getVolumeByCPUModelStats(
 
   // Query volume data for each top model
   const promises = topModels.map(async ({ model }) => {
-    const modelQuery = SQL`
-      select
-        EXTRACT(epoch FROM date_trunc('d', seen))::int as x,
-        count(distinct id)::int as y
-      from
-        server
-      where
-        cpu_vendor = ${vendor}
-        and cpu = ${model}
-      group by
-        x
-      order by
-        x
-    `;
+    const modelQuery = modelVolumeQuery(model);
 
     const modelStats = await getData<TemporalStat>(conn, modelQuery);
     result[model] = modelStats;